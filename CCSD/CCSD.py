@@ -1,15 +1,18 @@
 # %%
 import logging
+import os
 from datetime import datetime
 import sys
 
 from CCSD.models import ProjectPaths
 
 from .project_configs import execute_project_conf_from_file
-from .git_util import checkout_repo
+from .git_util import checkout_repo, update_repo
 from .indexing import execute_intitial_indexing
 from .repository_mining import analyse_source_repository_data
-from .utils_sql import create_db_tables
+from .utils_sql import create_analytics_indexes, create_db_tables
+from .utils_sql_compact import compact_project_db, expand_project_db
+from .utils_sql_shard import get_commit_data_db_path
 
 
 # error messages
@@ -39,7 +42,27 @@ def main() -> None:
     print("proj_paths")
     print(proj_paths)
 
-    if "--no-init-db" in args:
+    # resume skips the commits in the processed_commit checkpoint and adds the new commits
+    resume = "--resume" in args
+
+    nr_workers = 1
+    if "--workers" in args:
+        nr_workers = int(args[args.index("--workers") + 1])
+    use_celery = "--celery" in args
+    mode = "full"
+    if "--mode" in args:
+        mode = args[args.index("--mode") + 1]
+    if mode not in ("full", "files"):
+        raise Exception(f"invalid mode {mode}, expected full or files")
+
+    # the mining writes to the text tables of a compacted database
+    expand_project_db(
+        proj_paths["path_to_project_db"], keep_rows=resume or "--no-init-db" in args
+    )
+    if resume:
+        logging.info("Resume on existing database...")
+        create_db_tables(proj_paths, drop=False)
+    elif "--no-init-db" in args:
         logging.info("Not re-initialized database...")
     else:
         init_db(proj_paths)
@@ -50,9 +73,22 @@ def main() -> None:
         proj_paths["path_to_cache_src_dir"],
         proj_config["only_in_branch"],
     )
+    if resume:
+        update_repo(proj_paths["path_to_cache_src_dir"], proj_config["only_in_branch"])
     execute_intitial_indexing(proj_paths, proj_config["proj_lang"])
 
-    analyse_source_repository_data(proj_config=proj_config, proj_paths=proj_paths)
+    analyse_source_repository_data(
+        proj_config=proj_config,
+        proj_paths=proj_paths,
+        resume=resume,
+        nr_workers=nr_workers,
+        use_celery=use_celery,
+        mode=mode,
+    )
+    if proj_config["db_schema"] == "compact":
+        compact_project_db(proj_paths["path_to_project_db"])
+    else:
+        create_analytics_indexes(proj_paths["path_to_project_db"])
 
     logging.info("Finished App ---------- %s", datetime.now())
     print(f"Finished App ------------- {datetime.now()}")
@@ -62,6 +98,10 @@ def init_db(proj_paths: ProjectPaths) -> None:
     logging.info("Initialize the db.")
     print("Initialize the db.")
     create_db_tables(proj_paths, drop=True)
+    # a new run extracts the commits again
+    path_to_commit_data_db = get_commit_data_db_path(proj_paths["path_to_project_db"])
+    if os.path.exists(path_to_commit_data_db):
+        os.remove(path_to_commit_data_db)
 
 
 # %%
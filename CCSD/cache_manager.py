@@ -0,0 +1,138 @@
+"""
+Compressed cache files within a byte budget, evicting the least recently used files.
+"""
+import gzip
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+
+    _HAS_ZSTANDARD = True
+except ImportError:
+    _HAS_ZSTANDARD = False
+
+from .models import ProjectConfig, ProjectPaths
+
+# share of the budget that is kept after an eviction, to not evict on every write
+_EVICTION_TARGET = 0.9
+
+
+class CacheManager:
+    """
+    Stores text files compressed with zstd, or gzip if zstandard is not installed, under the
+    cache directories. Reading a file marks it as recently used, and when the files under the
+    cache directories exceed max_bytes the least recently used ones are deleted.
+    """
+
+    def __init__(self, cache_dirs: List[str], max_bytes: int) -> None:
+        self.cache_dirs = cache_dirs
+        self.max_bytes = max_bytes
+        self.suffix = ".zst" if _HAS_ZSTANDARD else ".gz"
+        self._nr_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def read(self, path: str) -> Optional[str]:
+        """
+        Returns the text of the file written with write, None if not cached.
+        """
+        compressed_path = path + self.suffix
+        try:
+            with open(compressed_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(compressed_path)
+        except FileNotFoundError:
+            pass
+        return self._decompress(data).decode("utf-8")
+
+    def write(self, path: str, content: str) -> None:
+        data = self._compress(content.encode("utf-8"))
+        compressed_path = path + self.suffix
+        os.makedirs(os.path.dirname(compressed_path), exist_ok=True)
+        # an overwritten file is replaced in the budget by the new one
+        try:
+            nr_replaced_bytes = os.path.getsize(compressed_path)
+        except FileNotFoundError:
+            nr_replaced_bytes = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(compressed_path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, compressed_path)
+        self._add_bytes(len(data) - nr_replaced_bytes)
+
+    def _compress(self, data: bytes) -> bytes:
+        if _HAS_ZSTANDARD:
+            return zstandard.ZstdCompressor().compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _decompress(self, data: bytes) -> bytes:
+        if _HAS_ZSTANDARD:
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def _add_bytes(self, nr_bytes: int) -> None:
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            if self._nr_bytes is None:
+                self._nr_bytes = sum(size for _, size, _ in self._list_files())
+            self._nr_bytes += nr_bytes
+            if self._nr_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # the files are listed again, other processes may share the cache directories
+        files = sorted(self._list_files())
+        self._nr_bytes = sum(size for _, size, _ in files)
+        nr_evicted = 0
+        for _, size, path in files:
+            if self._nr_bytes <= self.max_bytes * _EVICTION_TARGET:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._nr_bytes -= size
+            nr_evicted += 1
+        logging.info("Evicted %d cache files, %d bytes cached", nr_evicted, self._nr_bytes)
+
+    def _list_files(self) -> List[Tuple[float, int, str]]:
+        """
+        Returns the last use time, size and path of the compressed files under the cache
+        directories, without the temporary files of the writes in progress.
+        """
+        files = []
+        for cache_dir in self.cache_dirs:
+            for dir_path, _, file_names in os.walk(cache_dir):
+                for file_name in file_names:
+                    if not file_name.endswith(self.suffix):
+                        continue
+                    path = os.path.join(dir_path, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+
+_CACHE_MANAGERS: Dict[str, CacheManager] = {}
+
+
+def get_cache_manager(proj_config: ProjectConfig, proj_paths: ProjectPaths) -> CacheManager:
+    """
+    The cache manager of the parse cache of the project.
+    """
+    path_to_cache_dir = proj_paths["path_to_cache_dir"]
+    if path_to_cache_dir not in _CACHE_MANAGERS:
+        _CACHE_MANAGERS[path_to_cache_dir] = CacheManager(
+            [os.path.join(path_to_cache_dir, "parse_cache")],
+            proj_config["cache_max_mb"] * 1024 * 1024,
+        )
+    return _CACHE_MANAGERS[path_to_cache_dir]
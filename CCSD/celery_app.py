@@ -1,5 +1,5 @@
 from celery import Celery
 
 celery_app = Celery(
-    include=['changeAnalyzerSD.git_repository_mining_util'],
+    include=['CCSD.git_repository_mining_util_redis'],
 )
@@ -0,0 +1,157 @@
+"""
+Reading of file contents by blob SHA through one long-lived git cat-file --batch process,
+instead of an object read per source_code and source_code_before access of pydriller.
+"""
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from pydriller.domain.commit import ModifiedFile
+
+from .subprocess_util import LongLivedProcess, get_command_timeout
+
+# the source of a file is read again as the previous source of its next change, which is
+# usually a few commits later
+_MAX_CACHED_BYTES = 64 * 1024 * 1024
+
+
+class GitBlobReader:  # pylint: disable=too-many-instance-attributes
+    """
+    Client of a git cat-file --batch process of the repository. The recently read blobs are
+    kept in an LRU cache of at most max_cached_bytes.
+    """
+
+    def __init__(self, path_to_repo: str, max_cached_bytes: int = _MAX_CACHED_BYTES) -> None:
+        self.path_to_repo = path_to_repo
+        self.max_cached_bytes = max_cached_bytes
+        self.nr_hits = 0
+        self.nr_misses = 0
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._nr_cached_bytes = 0
+        self._process = LongLivedProcess(["git", "-C", path_to_repo, "cat-file", "--batch"])
+        self._lock = threading.Lock()
+
+    def read(self, blob_sha: str) -> Optional[bytes]:
+        """
+        Returns the content of the blob, None if the blob does not exist or git failed.
+        """
+        with self._lock:
+            data = self._cache.get(blob_sha)
+            if data is not None:
+                self._cache.move_to_end(blob_sha)
+                self.nr_hits += 1
+                return data
+            self.nr_misses += 1
+            try:
+                data = self._request(blob_sha)
+            except (OSError, ValueError) as err:
+                logging.warning("git cat-file of %s failed. Error: %s", self.path_to_repo, str(err))
+                self._process.stop()
+                return None
+            if data is not None:
+                self._put(blob_sha, data)
+            return data
+
+    def close(self) -> None:
+        with self._lock:
+            self._process.stop()
+
+    def _request(self, blob_sha: str) -> Optional[bytes]:
+        process = self._process.get()
+        assert process.stdin is not None and process.stdout is not None
+        # a hung git is killed
+        timer = threading.Timer(get_command_timeout(), process.kill)
+        timer.start()
+        try:
+            process.stdin.write(blob_sha.encode("ascii") + b"\n")
+            process.stdin.flush()
+            header = process.stdout.readline()
+            if header == b"":
+                raise OSError(f"git cat-file exited with {process.wait()}")
+            fields = header.split()
+            if fields[-1] == b"missing":
+                return None
+            size = int(fields[2])
+            data = process.stdout.read(size)
+            # the content is followed by a newline
+            if len(data) != size or process.stdout.read(1) != b"\n":
+                raise OSError("git cat-file closed its output")
+            return data
+        finally:
+            timer.cancel()
+
+    def _put(self, blob_sha: str, data: bytes) -> None:
+        if len(data) > self.max_cached_bytes:
+            return
+        self._cache[blob_sha] = data
+        self._nr_cached_bytes += len(data)
+        while self._nr_cached_bytes > self.max_cached_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._nr_cached_bytes -= len(evicted)
+
+
+_BLOB_READERS: Dict[str, GitBlobReader] = {}
+
+
+def get_blob_reader(path_to_repo: str) -> GitBlobReader:
+    if path_to_repo not in _BLOB_READERS:
+        _BLOB_READERS[path_to_repo] = GitBlobReader(path_to_repo)
+    return _BLOB_READERS[path_to_repo]
+
+
+@atexit.register
+def close_blob_readers() -> None:
+    for blob_reader in _BLOB_READERS.values():
+        if blob_reader.nr_hits or blob_reader.nr_misses:
+            logging.info(
+                "Blob reader %s: %d hits, %d misses",
+                blob_reader.path_to_repo,
+                blob_reader.nr_hits,
+                blob_reader.nr_misses,
+            )
+        blob_reader.close()
+
+
+def get_source_code(path_to_repo: str, mod_file: ModifiedFile) -> Optional[str]:
+    """
+    Same as ModifiedFile.source_code of pydriller.
+    """
+    # pylint: disable=protected-access
+    # the blob SHAs are parsed from the diff by GitPython, pydriller does not expose them
+    blob = mod_file._c_diff.b_blob
+    if blob is None:
+        return None
+    data = get_blob_reader(path_to_repo).read(blob.hexsha)
+    return mod_file.source_code if data is None else _decode(data)
+
+
+def get_source_code_before(path_to_repo: str, mod_file: ModifiedFile) -> Optional[str]:
+    """
+    Same as ModifiedFile.source_code_before of pydriller.
+    """
+    # pylint: disable=protected-access
+    blob = mod_file._c_diff.a_blob
+    if blob is None:
+        return None
+    data = get_blob_reader(path_to_repo).read(blob.hexsha)
+    return mod_file.source_code_before if data is None else _decode(data)
+
+
+def get_diff_blob_shas(mod_file: ModifiedFile) -> Tuple[Optional[str], Optional[str]]:
+    """
+    The blob SHAs of the previous and the current source of the file in its diff, None for the
+    side without a blob.
+    """
+    # pylint: disable=protected-access
+    a_blob, b_blob = mod_file._c_diff.a_blob, mod_file._c_diff.b_blob
+    return (
+        a_blob.hexsha if a_blob is not None else None,
+        b_blob.hexsha if b_blob is not None else None,
+    )
+
+
+def _decode(data: bytes) -> Optional[str]:
+    # pydriller ignores decoding errors and has no source for empty files
+    return data.decode("utf-8", "ignore") if data else None
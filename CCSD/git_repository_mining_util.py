@@ -1,32 +1,48 @@
-from datetime import datetime
+import atexit
 import os
 import logging
-from typing import Callable, Dict, List, Optional
-
-from pydriller.repository import Repository
-from pydriller.domain.commit import Commit, ModificationType, ModifiedFile
+import multiprocessing
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import lizard
+import lizard_languages
+from pydriller.domain.commit import ModificationType, ModifiedFile
 from git.config import GitConfigParser
 from git.util import BlockingLockFile
 from git.types import PathLike
 
-from .models import FunctionCall, ProjectConfig, ProjectPaths, FileData, CommitDates
+from .models import (
+    ExtendedFunctionCall,
+    FileChangeData,
+    FileSources,
+    FunctionCall,
+    GitCommitData,
+    MethodData,
+    ProjectConfig,
+    ProjectPaths,
+    FileData,
+    CommitDates,
+)
 from .repository_mining_util import (
+    get_file_change_sets,
     get_file_type_validation_function,
     save_source_code,
+    save_source_code_xml_batch,
     get_file_imports,
     save_compact_xml_parsed_code,
-    jar_wrapper,
+    get_jar_service,
+    get_scratch_dir,
+    remove_scratch_dir,
     set_hashes_to_function_calls,
 )
-from .utils_sql import (
-    insert_git_commit,
-    insert_file_commit,
-    update_file_imports,
-    insert_function_commit,
-    update_function_to_file,
-    save_raw_function_call_curr_rows,
-    save_raw_function_call_deleted_rows,
-)
+from .git_blob_reader import get_diff_blob_shas
+from .repository_backend import BackendCommit, RepositoryBackend, get_repository_backend
+from .parse_cache import ParseCache, get_blob_sha, get_parse_cache
+from .subprocess_util import configure_commands, log_command_stats
+from .utils_sql import AnalyticsDbWriter, get_processed_commit_hashes
+from .utils_sql_shard import CommitDataDb, get_commit_data_db_path
 
 
 class _LimitedBlockingLockFile(BlockingLockFile):
@@ -39,111 +55,253 @@ class _LimitedBlockingLockFile(BlockingLockFile):
 # set the lock behaviour to a blocking lock file with timeout
 GitConfigParser.t_lock = _LimitedBlockingLockFile
 
+# sources of a commit missing in the parse cache at least, to parse them with the
+# lizard_workers processes, for fewer the process hand-over costs more than it saves
+_MIN_PARALLEL_LIZARD_SOURCES = 32
 
-def git_traverse(proj_config: ProjectConfig, proj_paths: ProjectPaths) -> None:
-    repository = _git_repository_from_config(proj_config, proj_paths)
-    is_valid_file_type = get_file_type_validation_function(proj_config["proj_lang"])
-    for commit in repository.traverse_commits():
-        process_git_commit(
-            proj_config=proj_config,
-            proj_paths=proj_paths,
-            commit=commit,
-            is_valid_file_type=is_valid_file_type,
-        )
-
-
-def _git_repository_from_config(
-    proj_config: ProjectConfig, proj_paths: ProjectPaths
-) -> Repository:
-    filters: Dict[str, str | datetime] = {}
-    if (
-        proj_config["start_repo_date"] is not None
-        and proj_config["end_repo_date"] is not None
-    ):
-        filters = dict(
-            since=proj_config["start_repo_date"],
-            to=proj_config["end_repo_date"],
-        )
-    elif proj_config["start_repo_date"] is not None:
-        filters = dict(since=proj_config["start_repo_date"])
-    elif (
-        proj_config["repo_from_tag"] is not None
-        and proj_config["repo_to_tag"] is not None
-    ):
-        filters = dict(
-            from_tag=proj_config["repo_from_tag"],
-            to_tag=proj_config["repo_to_tag"],
-        )
-    elif (
-        proj_config["repo_from_commit"] is not None
-        and proj_config["repo_to_commit"] is not None
-    ):
-        filters = dict(
-            from_commit=proj_config["repo_from_commit"],
-            to_commit=proj_config["repo_to_commit"],
-        )
 
-    r = Repository(
-        path_to_repo=proj_paths["path_to_cache_src_dir"],
-        only_modifications_with_file_types=proj_config["commit_file_types"],
-        order="reverse",
-        only_no_merge=True,
-        only_in_branch=proj_config["only_in_branch"],
-        **filters,  # type: ignore[arg-type]
+def git_traverse(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths, resume: bool = False
+) -> None:
+    """
+    With resume, the commits recorded in the processed_commit checkpoint are skipped.
+    The commits in the commit data db of the project are written without extracting them.
+    """
+    backend = get_repository_backend(proj_config, proj_paths)
+    is_valid_file_type = get_file_type_validation_function(proj_config["proj_lang"])
+    configure_commands(
+        proj_config["command_timeout_s"], proj_config["max_concurrent_commands"]
+    )
+    processed_commit_hashes = (
+        get_processed_commit_hashes(proj_paths["path_to_project_db"])
+        if resume
+        else set()
     )
+    logging.info("Skip %d processed commits", len(processed_commit_hashes))
+    try:
+        with AnalyticsDbWriter(
+            proj_paths["path_to_project_db"], proj_config["db_commit_interval"]
+        ) as writer, CommitDataDb(
+            get_commit_data_db_path(proj_paths["path_to_project_db"])
+        ) as commit_data_db:
+            for commit in backend.traverse_commits():
+                if commit.hash in processed_commit_hashes:
+                    continue
+                process_git_commit(
+                    proj_config=proj_config,
+                    proj_paths=proj_paths,
+                    backend=backend,
+                    writer=writer,
+                    commit_data_db=commit_data_db,
+                    commit=commit,
+                    is_valid_file_type=is_valid_file_type,
+                )
+    finally:
+        release_scratch_dir(proj_config, proj_paths)
+    log_command_stats()
+
+
+def get_traversal_commit_hashes(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths, resume: bool
+) -> List[str]:
+    """
+    The hashes of the commits to write in traversal order. With resume, the commits recorded in
+    the processed_commit checkpoint are skipped.
+    """
+    processed_commit_hashes = (
+        get_processed_commit_hashes(proj_paths["path_to_project_db"])
+        if resume
+        else set()
+    )
+    return [
+        commit.hash
+        for commit in get_repository_backend(proj_config, proj_paths).traverse_commits()
+        if commit.hash not in processed_commit_hashes
+    ]
 
-    print("_git_repository_from_config r")
-    print(r)
 
-    return r
+def process_git_commit(  # pylint: disable=too-many-arguments
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    backend: RepositoryBackend,
+    writer: AnalyticsDbWriter,
+    commit_data_db: CommitDataDb,
+    commit: BackendCommit,
+    is_valid_file_type: Callable[[str], bool],
+) -> None:
+    """
+    The commit is only extracted if it is not in the commit data db of the project.
+    """
+    commit_data = commit_data_db.get(commit.hash)
+    if commit_data is None:
+        commit_data = extract_git_commit(
+            proj_config, proj_paths, backend, commit, is_valid_file_type
+        )
+        commit_data_db.put(commit_data)
+    write_git_commit(writer, commit_data)
 
 
-def process_git_commit(
+def extract_git_commit(
     proj_config: ProjectConfig,
     proj_paths: ProjectPaths,
-    commit: Commit,
+    backend: RepositoryBackend,
+    commit: BackendCommit,
     is_valid_file_type: Callable[[str], bool],
-):
-    # insert git_commit
-    insert_git_commit(
-        proj_paths["path_to_project_db"],
-        commit_hash=commit.hash,
-        commit_commiter_datetime=str(commit.committer_date),
-        author=commit.author.name,
-        in_main_branch=True,  # commit.in_main_branch,
+) -> GitCommitData:
+    """
+    Runs the diffing and parsing of a commit, without touching the analytics database.
+    """
+    mod_files = [
+        mod_file
+        for mod_file in commit.modified_files
+        if is_valid_file_type(str(mod_file.new_path))
+        or is_valid_file_type(str(mod_file.old_path))
+    ]
+
+    # the sources of a file and their blob hashes are read once for all parsing steps
+    file_sources = [read_file_sources(backend, mod_file) for mod_file in mod_files]
+
+    # the sources are converted to srcml xml before the parsing, which replaces
+    # the saved sources with their compact xml
+    source_paths = get_source_paths(proj_config, proj_paths)
+    saved_source_files: Dict[str, str] = {}
+    for mod_file, sources in zip(mod_files, file_sources):
+        save_file_sources(proj_config, source_paths, mod_file, sources, saved_source_files)
+    save_sources_xml(proj_config, source_paths, saved_source_files)
+    prefetch_file_methods(proj_config, proj_paths, mod_files, file_sources)
+
+    file_changes = []
+    for mod_file, sources in zip(mod_files, file_sources):
+        file_change = process_file_git_commit(
+            proj_config, source_paths, commit, mod_file, sources
+        )
+        if file_change is not None:
+            file_changes.append(file_change)
+    release_file_sources(proj_config, proj_paths, source_paths, mod_files)
+
+    return GitCommitData(
+        hash=commit.hash,
+        committer_date=commit.committer_date,
+        author_name=commit.author.name,
         merge=commit.merge,
         nr_modified_files=len(commit.modified_files),
         nr_deletions=commit.deletions,
         nr_insertions=commit.insertions,
         nr_lines=commit.lines,
+        file_changes=file_changes,
     )
 
-    for mod_file in commit.modified_files:
-        if is_valid_file_type(str(mod_file.new_path)) or is_valid_file_type(
-            str(mod_file.old_path)
-        ):
-            process_file_git_commit(proj_config, proj_paths, commit, mod_file)
 
+def write_git_commit(writer: AnalyticsDbWriter, commit_data: GitCommitData) -> None:
+    writer.begin_git_commit(commit_data.hash)
+    # insert git_commit
+    writer.insert_git_commit(
+        commit_hash=commit_data.hash,
+        commit_commiter_datetime=str(commit_data.committer_date),
+        author=commit_data.author_name,
+        in_main_branch=True,  # commit.in_main_branch,
+        merge=commit_data.merge,
+        nr_modified_files=commit_data.nr_modified_files,
+        nr_deletions=commit_data.nr_deletions,
+        nr_insertions=commit_data.nr_insertions,
+        nr_lines=commit_data.nr_lines,
+    )
 
-def process_file_git_commit(
-    proj_config: ProjectConfig,
-    proj_paths: ProjectPaths,
-    commit: Commit,
-    mod_file: ModifiedFile,
-):
+    for file_change in commit_data.file_changes:
+        mod_file_data = FileData(str(file_change.new_path))
+
+        # insert file_commit
+        writer.insert_file_commit(
+            mod_file_data=mod_file_data,
+            commit_hash=commit_data.hash,
+            commit_commiter_datetime=commit_data.committer_date,
+            commit_file_name=file_change.filename,
+            commit_new_path=file_change.new_path,
+            commit_old_path=file_change.old_path,
+            change_type=file_change.change_type,
+        )
 
-    _process_file_git_commit_astdiff_parsing(proj_config, proj_paths, commit, mod_file)
+        # update file imports
+        writer.update_file_imports(
+            mod_file_data,
+            file_change.file_imports,
+            file_change.change_sets,
+            commit_hash=commit_data.hash,
+            commit_datetime=str(commit_data.committer_date),
+        )
 
+        # function_commit
+        writer.insert_function_commit(file_change, commit_data)
 
-def _process_file_git_commit_astdiff_parsing(
+        # update function_to_file
+        writer.update_function_to_file(file_change, commit_data)
+
+        # update function_call
+        writer.save_raw_function_call_curr_rows(
+            file_change.function_call_rows_curr, mod_file_data
+        )
+        writer.save_raw_function_call_deleted_rows(
+            file_change.function_call_rows_deleted, mod_file_data
+        )
+    writer.end_git_commit()
+
+
+def write_git_commits(
+    writer: AnalyticsDbWriter,
+    commit_data_db: CommitDataDb,
+    commit_hashes: Iterable[str],
+    extracted_commits: Iterator[GitCommitData],
+) -> None:
+    """
+    Writes the commits in traversal order. The commits in the commit data db of the project
+    are read from it, the others are taken from extracted_commits, which yields them in the
+    same order, and are put into the commit data db.
+    """
+    for commit_hash in commit_hashes:
+        commit_data = commit_data_db.get(commit_hash)
+        if commit_data is None:
+            commit_data = next(extracted_commits)
+            if commit_data.hash != commit_hash:
+                raise RuntimeError(
+                    f"Extracted commit {commit_data.hash} instead of {commit_hash}"
+                )
+            commit_data_db.put(commit_data)
+        write_git_commit(writer, commit_data)
+
+
+def read_file_sources(backend: RepositoryBackend, mod_file: ModifiedFile) -> FileSources:
+    """
+    The sources of the file with the blob hashes of its diff. A source without a blob in the
+    diff is hashed.
+    """
+    source_code = backend.get_source_code(mod_file)
+    source_code_before = backend.get_source_code_before(mod_file)
+    blob_sha_before, blob_sha = get_diff_blob_shas(mod_file)
+    return FileSources(
+        source_code=source_code,
+        source_code_before=source_code_before,
+        blob_sha=_get_source_blob_sha(source_code, blob_sha),
+        blob_sha_before=_get_source_blob_sha(source_code_before, blob_sha_before),
+    )
+
+
+def _get_source_blob_sha(source_code: Optional[str], blob_sha: Optional[str]) -> Optional[str]:
+    if source_code is None:
+        return None
+    return blob_sha if blob_sha is not None else get_blob_sha(source_code)
+
+
+def save_file_sources(
     proj_config: ProjectConfig,
     proj_paths: ProjectPaths,
-    commit: Commit,
     mod_file: ModifiedFile,
+    file_sources: FileSources,
+    saved_source_files: Dict[str, str],
 ) -> None:
-    mod_file_data = FileData(str(mod_file.new_path))
-    mod_file_data_prev = FileData(str(mod_file.old_path))
-
+    """
+    Saves the current and previous source of the file without srcml conversion,
+    their paths and blob hashes are added to saved_source_files.
+    """
     # Create sourcediff directory
     if proj_config["save_cache_files"]:
         file_path_sourcediff = os.path.join(
@@ -152,7 +310,135 @@ def _process_file_git_commit_astdiff_parsing(
         if not os.path.exists(os.path.dirname(file_path_sourcediff)):
             os.makedirs(os.path.dirname(file_path_sourcediff))
 
+    file_path_current, file_path_previous = _get_source_file_paths(proj_paths, mod_file)
+
     # Save new source code
+    if file_path_current is not None:
+        save_source_code(file_path_current, file_sources.source_code, to_xml=False)
+        if file_sources.blob_sha is not None:
+            saved_source_files[file_path_current] = file_sources.blob_sha
+
+    if file_path_previous is not None:
+        save_source_code(file_path_previous, file_sources.source_code_before, to_xml=False)
+        if file_sources.blob_sha_before is not None:
+            saved_source_files[file_path_previous] = file_sources.blob_sha_before
+
+
+def save_sources_xml(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    saved_source_files: Dict[str, str],
+) -> None:
+    """
+    One srcml call for all saved sources of the commit that are not in the parse cache.
+    """
+    parse_cache = get_parse_cache(proj_config, proj_paths)
+    files_to_convert = [
+        file_path
+        for file_path, blob_sha in saved_source_files.items()
+        if not parse_cache.restore_srcml_xml(blob_sha, file_path)
+    ]
+    save_source_code_xml_batch(files_to_convert)
+    for file_path in files_to_convert:
+        parse_cache.store_srcml_xml(saved_source_files[file_path], file_path)
+
+
+def get_source_paths(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths
+) -> ProjectPaths:
+    """
+    The paths the sources of a commit are saved to for the parsing, with in_memory_sources
+    the astparsing cache directories are mirrored on a tmpfs scratch area.
+    """
+    if not proj_config["in_memory_sources"]:
+        return proj_paths
+    scratch_dir = get_scratch_dir(proj_paths["path_to_cache_dir"])
+    source_paths = proj_paths.copy()
+    source_paths["path_to_cache_current"] = os.path.join(
+        scratch_dir,
+        os.path.relpath(
+            proj_paths["path_to_cache_current"], proj_paths["path_to_cache_dir"]
+        ),
+    )
+    source_paths["path_to_cache_previous"] = os.path.join(
+        scratch_dir,
+        os.path.relpath(
+            proj_paths["path_to_cache_previous"], proj_paths["path_to_cache_dir"]
+        ),
+    )
+    return source_paths
+
+
+def release_file_sources(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    source_paths: ProjectPaths,
+    mod_files: List[ModifiedFile],
+) -> None:
+    """
+    After the parsing, the saved sources and xml files of the commit are deleted with
+    delete_cache_files, else kept as they are in the astparsing cache. The files on the scratch
+    area of in_memory_sources are always removed, with save_cache_files they are moved into
+    the astparsing cache.
+    """
+    scratch_dir = (
+        get_scratch_dir(proj_paths["path_to_cache_dir"])
+        if proj_config["in_memory_sources"]
+        else None
+    )
+    if scratch_dir is None and not proj_config["delete_cache_files"]:
+        return
+    for mod_file in mod_files:
+        file_path_current, file_path_previous = _get_source_file_paths(
+            source_paths, mod_file
+        )
+        # the compact xml of the previous source is saved under the new path
+        file_path_previous_compact_xml = os.path.join(
+            source_paths["path_to_cache_previous"], str(mod_file.new_path)
+        )
+        file_paths = [
+            file_path
+            for file_path in (
+                file_path_current,
+                file_path_previous,
+                file_path_previous_compact_xml,
+            )
+            if file_path is not None
+        ]
+        for file_path in file_paths:
+            for path in (file_path, f"{file_path}.xml"):
+                if not os.path.isfile(path):
+                    continue
+                if (
+                    scratch_dir is not None
+                    and proj_config["save_cache_files"]
+                    and not proj_config["delete_cache_files"]
+                ):
+                    cache_path = os.path.join(
+                        proj_paths["path_to_cache_dir"], os.path.relpath(path, scratch_dir)
+                    )
+                    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                    shutil.move(path, cache_path)
+                else:
+                    os.remove(path)
+
+    if scratch_dir is not None:
+        # the scratch area only holds the files of the commit being parsed
+        shutil.rmtree(source_paths["path_to_cache_current"], ignore_errors=True)
+        shutil.rmtree(source_paths["path_to_cache_previous"], ignore_errors=True)
+
+
+def release_scratch_dir(proj_config: ProjectConfig, proj_paths: ProjectPaths) -> None:
+    """
+    Removes the scratch area of in_memory_sources when the mining is finished or failed.
+    """
+    if proj_config["in_memory_sources"]:
+        remove_scratch_dir(proj_paths["path_to_cache_dir"])
+
+
+def _get_source_file_paths(
+    proj_paths: ProjectPaths, mod_file: ModifiedFile
+) -> Tuple[Optional[str], Optional[str]]:
     file_path_current = None
     if (
         mod_file.change_type != ModificationType.DELETE
@@ -161,7 +447,6 @@ def _process_file_git_commit_astdiff_parsing(
         file_path_current = os.path.join(
             proj_paths["path_to_cache_current"], str(mod_file.new_path)
         )
-        save_source_code(file_path_current, mod_file.source_code)
 
     file_path_previous = None
     if (
@@ -171,7 +456,35 @@ def _process_file_git_commit_astdiff_parsing(
         file_path_previous = os.path.join(
             proj_paths["path_to_cache_previous"], str(mod_file.old_path)
         )
-        save_source_code(file_path_previous, mod_file.source_code_before)
+    return file_path_current, file_path_previous
+
+
+def process_file_git_commit(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    commit: BackendCommit,
+    mod_file: ModifiedFile,
+    file_sources: FileSources,
+) -> Optional[FileChangeData]:
+
+    return _process_file_git_commit_astdiff_parsing(
+        proj_config, proj_paths, commit, mod_file, file_sources
+    )
+
+
+def _process_file_git_commit_astdiff_parsing(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    commit: BackendCommit,
+    mod_file: ModifiedFile,
+    file_sources: FileSources,
+) -> Optional[FileChangeData]:
+    """
+    The sources must have been saved with save_file_sources.
+    """
+    mod_file_data = FileData(str(mod_file.new_path))
+    mod_file_data_prev = FileData(str(mod_file.old_path))
+    file_path_current, file_path_previous = _get_source_file_paths(proj_paths, mod_file)
 
     if mod_file.change_type == ModificationType.RENAME:
         print(
@@ -184,67 +497,229 @@ def _process_file_git_commit_astdiff_parsing(
                 mod_file.filename, mod_file.new_path, mod_file.old_path
             )
         )
-        return
-
-    # insert file_commit
-    insert_file_commit(
-        proj_paths["path_to_project_db"],
-        mod_file_data=mod_file_data,
-        commit_hash=commit.hash,
-        commit_commiter_datetime=commit.committer_date,
-        commit_file_name=mod_file.filename,
-        commit_new_path=mod_file.new_path,
-        commit_old_path=mod_file.old_path,
-        change_type=mod_file.change_type,
-    )
+        return None
 
-    # update file imports
+    # file imports
     fis = get_file_imports(
         proj_lang=proj_config["proj_lang"],
         path_to_src_files=proj_paths["path_to_src_files"],
-        source_code=mod_file.source_code,
+        source_code=file_sources.source_code,
         mod_file_data=mod_file_data,
     )
     fis_prev = get_file_imports(
         proj_lang=proj_config["proj_lang"],
         path_to_src_files=proj_paths["path_to_src_files"],
-        source_code=mod_file.source_code_before,
+        source_code=file_sources.source_code_before,
         mod_file_data=mod_file_data_prev,
     )
 
-    update_file_imports(
-        mod_file_data,
-        fis,
-        fis_prev,
-        proj_paths["path_to_project_db"],
-        commit_hash=commit.hash,
-        commit_datetime=str(commit.committer_date),
+    # function calls
+    rows_curr, rows_deleted = get_function_call_rows(
+        proj_config,
+        proj_paths,
+        mod_file,
+        commit,
+        file_sources,
+        file_path_current,
+        file_path_previous,
+    )
+
+    # lizard methods, from the parse cache if the sources were already parsed
+    methods, methods_before, changed_methods = _get_file_methods(
+        get_parse_cache(proj_config, proj_paths), mod_file, file_sources
+    )
+
+    return FileChangeData(
+        filename=mod_file.filename,
+        old_path=mod_file.old_path,
+        new_path=mod_file.new_path,
+        change_type=mod_file.change_type,
+        methods_before=methods_before,
+        methods=methods,
+        changed_methods=changed_methods,
+        file_imports=fis,
+        file_imports_prev=fis_prev,
+        function_call_rows_curr=rows_curr,
+        function_call_rows_deleted=rows_deleted,
+        change_sets=get_file_change_sets(
+            methods_before, methods, changed_methods, fis, fis_prev
+        ),
+    )
+
+
+def _get_file_methods(
+    parse_cache: ParseCache,
+    mod_file: ModifiedFile,
+    file_sources: FileSources,
+) -> Tuple[List[MethodData], List[MethodData], List[MethodData]]:
+    """
+    The methods, previous methods and changed methods of the modified file. The changed
+    methods are memoized by the blob pair, which repeats in cherry-picks and reverts.
+    """
+    blob_sha = file_sources.blob_sha if file_sources.source_code else None
+    blob_sha_before = file_sources.blob_sha_before if file_sources.source_code_before else None
+    methods = _get_methods(parse_cache, mod_file.filename, file_sources.source_code, blob_sha)
+    methods_before = _get_methods(
+        parse_cache, mod_file.filename, file_sources.source_code_before, blob_sha_before
+    )
+    if not methods and not methods_before:
+        return methods, methods_before, []
+    changed_methods = parse_cache.get_changed_methods(
+        blob_sha_before, blob_sha, mod_file.filename
+    )
+    if changed_methods is None:
+        changed_methods = _get_changed_methods(mod_file, methods, methods_before)
+        parse_cache.put_changed_methods(
+            blob_sha_before, blob_sha, mod_file.filename, changed_methods
+        )
+    return methods, methods_before, changed_methods
+
+
+def _get_methods(
+    parse_cache: ParseCache,
+    file_name: str,
+    source_code: Optional[str],
+    blob_sha: Optional[str],
+) -> List[MethodData]:
+    """
+    Same methods as ModifiedFile.methods and methods_before of pydriller.
+    """
+    if (
+        not source_code
+        or blob_sha is None
+        or lizard_languages.get_reader_for(file_name) is None
+    ):
+        return []
+    methods = parse_cache.get_methods(blob_sha, file_name)
+    if methods is None:
+        methods = _analyze_methods(file_name, source_code)
+        parse_cache.put_methods(blob_sha, file_name, methods)
+    return methods
+
+
+def _analyze_methods(file_name: str, source_code: str) -> List[MethodData]:
+    analysis = lizard.analyze_file.analyze_source_code(file_name, source_code)
+    return [
+        MethodData(f.name, f.long_name, f.parameters, f.nloc, f.start_line, f.end_line)
+        for f in analysis.function_list
+    ]
+
+
+def prefetch_file_methods(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    mod_files: List[ModifiedFile],
+    file_sources: List[FileSources],
+) -> None:
+    """
+    With lizard_workers, the lizard methods of the sources of a large commit that are not in
+    the parse cache are extracted by a process pool and put into the parse cache, from
+    which the parsing of the files reads them in file order.
+    """
+    nr_workers = proj_config["lizard_workers"] or os.cpu_count() or 1
+    # the workers of the pool traversal are daemon processes, which cannot have children
+    if nr_workers <= 1 or multiprocessing.current_process().daemon:
+        return
+    parse_cache = get_parse_cache(proj_config, proj_paths)
+    # the file name and source to parse by blob sha and file extension
+    sources: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for mod_file, file_source in zip(mod_files, file_sources):
+        if lizard_languages.get_reader_for(mod_file.filename) is None:
+            continue
+        for source_code, blob_sha in (
+            (file_source.source_code, file_source.blob_sha),
+            (file_source.source_code_before, file_source.blob_sha_before),
+        ):
+            if not source_code or blob_sha is None:
+                continue
+            key = (blob_sha, os.path.splitext(mod_file.filename)[1])
+            if key not in sources and parse_cache.get_methods(blob_sha, mod_file.filename) is None:
+                sources[key] = (mod_file.filename, source_code)
+    if len(sources) < _MIN_PARALLEL_LIZARD_SOURCES:
+        return
+
+    file_names = [file_name for file_name, _ in sources.values()]
+    source_codes = [source_code for _, source_code in sources.values()]
+    results = _get_lizard_executor(nr_workers).map(
+        _analyze_methods,
+        file_names,
+        source_codes,
+        chunksize=max(1, len(sources) // (nr_workers * 4)),
     )
+    for (blob_sha, _), file_name, methods in zip(sources, file_names, results):
+        parse_cache.put_methods(blob_sha, file_name, methods)
+    logging.debug("Parsed %d sources with %d lizard workers", len(sources), nr_workers)
+
 
-    # function_commit
-    insert_function_commit(proj_paths["path_to_project_db"], mod_file, commit)
+_LIZARD_EXECUTORS: Dict[int, ProcessPoolExecutor] = {}
 
-    # update function_to_file
-    update_function_to_file(proj_paths["path_to_project_db"], mod_file, commit)
 
-    # update function_call
-    update_function_calls(
-        proj_config, proj_paths, mod_file, commit, file_path_current, file_path_previous
+def _get_lizard_executor(nr_workers: int) -> ProcessPoolExecutor:
+    if nr_workers not in _LIZARD_EXECUTORS:
+        _LIZARD_EXECUTORS[nr_workers] = ProcessPoolExecutor(nr_workers)
+    return _LIZARD_EXECUTORS[nr_workers]
+
+
+@atexit.register
+def close_lizard_executors() -> None:
+    for executor in _LIZARD_EXECUTORS.values():
+        executor.shutdown()
+
+
+def _get_changed_methods(
+    mod_file: ModifiedFile,
+    methods: List[MethodData],
+    methods_before: List[MethodData],
+) -> List[MethodData]:
+    """
+    Same methods as ModifiedFile.changed_methods of pydriller: the methods containing an added
+    line and the previous methods containing a deleted line, unique by name and parameters.
+    """
+    diff_parsed = mod_file.diff_parsed
+    changed_methods: Dict[Tuple[str, Tuple[str, ...]], MethodData] = {}
+    for lines, file_methods in (
+        (diff_parsed["added"], methods),
+        (diff_parsed["deleted"], methods_before),
+    ):
+        for line_nr, _ in lines:
+            for m in file_methods:
+                if m.start_line <= line_nr <= m.end_line:
+                    changed_methods.setdefault((m.name, tuple(m.parameters)), m)
+    return list(changed_methods.values())
+
+
+def _get_compact_xml(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    file_path: str,
+    blob_sha: Optional[str],
+) -> str:
+    parse_cache = get_parse_cache(proj_config, proj_paths)
+    if blob_sha is not None:
+        compact_xml = parse_cache.get_compact_xml(blob_sha, file_path)
+        if compact_xml is not None:
+            return compact_xml
+    result = get_jar_service(proj_config["path_to_src_compact_xml_parsing"]).run(
+        file_path
     )
+    # convert to string -> xml
+    compact_xml = b"".join(result).decode("utf-8")
+    if blob_sha is not None and compact_xml:
+        parse_cache.put_compact_xml(blob_sha, file_path, compact_xml)
+    return compact_xml
 
 
 # TODO list to array, maybe
 # TODO handle mod_file._old_path != mod_file._new_path
-def update_function_calls(
+def get_function_call_rows(
     proj_config: ProjectConfig,
     proj_paths: ProjectPaths,
     mod_file: ModifiedFile,
-    commit: Commit,
-    file_path_current: str,
+    commit: BackendCommit,
+    file_sources: FileSources,
+    file_path_current: Optional[str],
     file_path_previous: Optional[str] = None,
-):
-
-    mod_file_data = FileData(str(mod_file.new_path))
+) -> Tuple[List[ExtendedFunctionCall], List[ExtendedFunctionCall]]:
 
     if proj_config["proj_lang"] == "java" or proj_config["proj_lang"] == "cpp":
         # Current source code
@@ -256,13 +731,12 @@ def update_function_calls(
                     "file_path_current does not exist {0}".format(file_path_current)
                 )
             # get compact xml parsed source
-            curr_src_args = [
-                proj_config["path_to_src_compact_xml_parsing"],
+            curr_src_str = _get_compact_xml(
+                proj_config,
+                proj_paths,
                 file_path_current,
-            ]
-            result = jar_wrapper(*curr_src_args)
-            # convert to string -> xml
-            curr_src_str = b"".join(result).decode("utf-8")
+                file_sources.blob_sha,
+            )
 
             save_compact_xml_parsed_code(
                 path_to_cache_dir=proj_paths["path_to_cache_current"],
@@ -273,7 +747,7 @@ def update_function_calls(
             """
             calling_function_unqualified_name,
             calling_function_nr_parameters,
-            called_function_unqualified_name       
+            called_function_unqualified_name
             """
             if proj_config["proj_lang"] == "java":
                 # curr_src_xml = BeautifulSoup(curr_src_str, "xml")
@@ -296,13 +770,12 @@ def update_function_calls(
                     "file_path_previous does not exist {0}".format(file_path_previous)
                 )
             # get compact xml parsed source
-            prev_src_args = [
-                proj_config["path_to_src_compact_xml_parsing"],
+            prev_src_str = _get_compact_xml(
+                proj_config,
+                proj_paths,
                 file_path_previous,
-            ]
-            result = jar_wrapper(*prev_src_args)
-            # convert to string -> xml
-            prev_src_str = b"".join(result).decode("utf-8")
+                file_sources.blob_sha_before,
+            )
 
             save_compact_xml_parsed_code(
                 path_to_cache_dir=proj_paths["path_to_cache_previous"],
@@ -344,14 +817,8 @@ def update_function_calls(
         commit_end_datetime
         closed
         """
-        save_raw_function_call_curr_rows(
-            proj_paths["path_to_project_db"], rows_curr, mod_file_data
-        )
-        save_raw_function_call_deleted_rows(
-            proj_paths["path_to_project_db"], rows_deleted, mod_file_data
-        )
-
         # save_call_commit_rows() # MIGHT NOT NEED THEM
+        return rows_curr, rows_deleted
 
-    else:
-        print("No current parser for the project language.")
+    print("No current parser for the project language.")
+    return [], []
@@ -0,0 +1,132 @@
+"""
+Metadata only variant of git_repository_mining_util.git_traverse, for the analyses that only
+need the git_commit and file_commit tables.
+
+Instead of diffing every commit with pydriller, the commits are read by the git backend from
+one streamed git log --raw --numstat process, and their modified files are never diffed.
+No sources are read, so no methods, imports or calls are mined. The rows are the same as
+the ones of the full traversal.
+"""
+import logging
+import os
+from typing import Callable, Iterator, Set
+
+from pydriller.domain.commit import ModificationType
+
+from .models import FileChangeData, GitCommitData, ProjectConfig, ProjectPaths
+from .repository_backend import GitBackend, GitLogCommit
+from .repository_mining_util import get_file_change_sets, get_file_type_validation_function
+from .utils_sql import AnalyticsDbWriter, get_processed_commit_hashes
+
+# git commits written per transaction at least, the rows of a git commit are few
+_MIN_COMMIT_INTERVAL = 1000
+
+_CHANGE_TYPES = {
+    "A": ModificationType.ADD,
+    "D": ModificationType.DELETE,
+    "R": ModificationType.RENAME,
+    "M": ModificationType.MODIFY,
+    "T": ModificationType.MODIFY,
+}
+
+
+def git_traverse(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths, resume: bool = False
+) -> None:
+    """
+    Fills git_commit and file_commit in the order of the full traversal, newest commit first.
+    With resume, the commits recorded in the processed_commit checkpoint are skipped.
+    """
+    is_valid_file_type = get_file_type_validation_function(proj_config["proj_lang"])
+    processed_commit_hashes: Set[str] = (
+        get_processed_commit_hashes(proj_paths["path_to_project_db"])
+        if resume
+        else set()
+    )
+    logging.info("Skip %d processed commits", len(processed_commit_hashes))
+    nr_commits = 0
+    with AnalyticsDbWriter(
+        proj_paths["path_to_project_db"],
+        max(proj_config["db_commit_interval"], _MIN_COMMIT_INTERVAL),
+    ) as writer:
+        for commit_data in get_git_log_commits(proj_config, proj_paths, is_valid_file_type):
+            if commit_data.hash in processed_commit_hashes:
+                continue
+            write_git_commit_files(writer, commit_data)
+            nr_commits += 1
+    logging.info("Mined the files of %d commits", nr_commits)
+
+
+def write_git_commit_files(writer: AnalyticsDbWriter, commit_data: GitCommitData) -> None:
+    writer.begin_git_commit(commit_data.hash)
+    writer.insert_git_commit(
+        commit_hash=commit_data.hash,
+        commit_commiter_datetime=str(commit_data.committer_date),
+        author=commit_data.author_name,
+        in_main_branch=True,
+        merge=commit_data.merge,
+        nr_modified_files=commit_data.nr_modified_files,
+        nr_deletions=commit_data.nr_deletions,
+        nr_insertions=commit_data.nr_insertions,
+        nr_lines=commit_data.nr_lines,
+    )
+    writer.insert_file_commits(
+        commit_data.hash, commit_data.committer_date, commit_data.file_changes
+    )
+    writer.end_git_commit()
+
+
+def get_git_log_commits(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    is_valid_file_type: Callable[[str], bool],
+) -> Iterator[GitCommitData]:
+    """
+    The commits of the full traversal with their valid, not renamed files, as the full
+    traversal writes them to file_commit.
+    """
+    for commit in GitBackend(proj_config, proj_paths).traverse_git_log_commits():
+        yield _to_git_commit_data(commit, is_valid_file_type)
+
+
+def _to_git_commit_data(
+    commit: GitLogCommit, is_valid_file_type: Callable[[str], bool]
+) -> GitCommitData:
+    file_changes = []
+    for status, old_path, new_path in commit.changes:
+        change_type = _CHANGE_TYPES.get(status, ModificationType.UNKNOWN)
+        # the full traversal skips the renames
+        if change_type == ModificationType.RENAME or not (
+            is_valid_file_type(str(new_path)) or is_valid_file_type(str(old_path))
+        ):
+            continue
+        # pydriller takes both paths from the diff header of a diff without text
+        if new_path in commit.paths_without_text_diff or old_path in commit.paths_without_text_diff:
+            old_path = new_path = new_path or old_path
+        file_changes.append(
+            FileChangeData(
+                filename=os.path.basename(new_path or str(old_path)),
+                old_path=old_path,
+                new_path=new_path,
+                change_type=change_type,
+                methods_before=[],
+                methods=[],
+                changed_methods=[],
+                file_imports=[],
+                file_imports_prev=[],
+                function_call_rows_curr=[],
+                function_call_rows_deleted=[],
+                change_sets=get_file_change_sets([], [], [], [], []),
+            )
+        )
+    return GitCommitData(
+        hash=commit.hash,
+        committer_date=commit.committer_date,
+        author_name=commit.author.name,
+        merge=commit.merge,
+        nr_modified_files=len(commit.changes),
+        nr_deletions=commit.deletions,
+        nr_insertions=commit.insertions,
+        nr_lines=commit.lines,
+        file_changes=file_changes,
+    )
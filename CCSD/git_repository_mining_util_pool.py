@@ -0,0 +1,127 @@
+"""
+Local multiprocessing variant of git_repository_mining_util.git_traverse.
+
+The worker processes look up the commits by hash and run the pydriller diffing, the lizard
+method extraction, the import parsing and the jar parsing. They return plain GitCommitData
+tuples, which the parent process, the only one owning the analytics database, writes in
+traversal order.
+"""
+import os
+import logging
+from multiprocessing import Pool, Value
+from multiprocessing.sharedctypes import Synchronized
+from typing import Callable, Optional
+
+from .models import GitCommitData, ProjectConfig, ProjectPaths
+from .repository_mining_util import get_file_type_validation_function
+from .git_repository_mining_util import (
+    extract_git_commit,
+    get_traversal_commit_hashes,
+    release_scratch_dir,
+    write_git_commits,
+)
+from .repository_backend import get_repository_backend
+from .subprocess_util import configure_commands
+from .utils_sql import AnalyticsDbWriter
+from .utils_sql_shard import CommitDataDb, get_commit_data_db_path
+
+# commits handed to a worker at once
+_CHUNK_SIZE = 4
+
+
+class _Worker:
+    """
+    State of a pool worker process, created once by the pool initializer.
+    """
+
+    instance: Optional["_Worker"] = None
+
+    def __init__(
+        self, proj_config: ProjectConfig, proj_paths: ProjectPaths, worker_index: int
+    ) -> None:
+        self.proj_config = proj_config
+        self.proj_paths = _worker_proj_paths(proj_paths, worker_index)
+        self.backend = get_repository_backend(proj_config, proj_paths)
+        self.is_valid_file_type: Callable[[str], bool] = (
+            get_file_type_validation_function(proj_config["proj_lang"])
+        )
+        configure_commands(
+            proj_config["command_timeout_s"], proj_config["max_concurrent_commands"]
+        )
+
+
+def git_traverse(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    nr_workers: int,
+    resume: bool = False,
+) -> None:
+    commit_hashes = get_traversal_commit_hashes(proj_config, proj_paths, resume)
+
+    nr_started_workers = Value("i", 0)
+    try:
+        with Pool(
+            nr_workers,
+            initializer=_init_worker,
+            initargs=(proj_config, proj_paths, nr_started_workers),
+        ) as pool, AnalyticsDbWriter(
+            proj_paths["path_to_project_db"], proj_config["db_commit_interval"]
+        ) as writer, CommitDataDb(
+            get_commit_data_db_path(proj_paths["path_to_project_db"])
+        ) as commit_data_db:
+            new_commit_hashes = commit_data_db.get_missing_commit_hashes(commit_hashes)
+            logging.info(
+                "Mine %d commits with %d workers", len(new_commit_hashes), nr_workers
+            )
+            # imap returns the results in traversal order, which the interval tables rely on
+            write_git_commits(
+                writer,
+                commit_data_db,
+                commit_hashes,
+                pool.imap(_extract_git_commit, new_commit_hashes, chunksize=_CHUNK_SIZE),
+            )
+    finally:
+        release_scratch_dir(proj_config, proj_paths)
+
+
+def _init_worker(
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    nr_started_workers: "Synchronized[int]",
+) -> None:
+    with nr_started_workers.get_lock():
+        nr_started_workers.value += 1
+        worker_index = nr_started_workers.value
+    _Worker.instance = _Worker(proj_config, proj_paths, worker_index)
+
+
+def _extract_git_commit(commit_hash: str) -> GitCommitData:
+    worker = _Worker.instance
+    assert worker is not None
+    return extract_git_commit(
+        worker.proj_config,
+        worker.proj_paths,
+        worker.backend,
+        worker.backend.get_commit(commit_hash),
+        worker.is_valid_file_type,
+    )
+
+
+def _worker_proj_paths(proj_paths: ProjectPaths, worker_index: int) -> ProjectPaths:
+    """
+    The source snapshots are cached under their relative file path, so every worker gets its
+    own cache directories to not overwrite the files another worker is parsing. The directories
+    are numbered by the start order of the workers, the next run reuses them.
+    """
+    worker_dir = f"worker_{worker_index}"
+    worker_paths = proj_paths.copy()
+    worker_paths["path_to_cache_current"] = os.path.join(
+        proj_paths["path_to_cache_current"], worker_dir
+    )
+    worker_paths["path_to_cache_previous"] = os.path.join(
+        proj_paths["path_to_cache_previous"], worker_dir
+    )
+    worker_paths["path_to_cache_sourcediff"] = os.path.join(
+        proj_paths["path_to_cache_sourcediff"], worker_dir
+    )
+    return worker_paths
@@ -1,34 +1,30 @@
-from datetime import datetime
 import os
 import logging
-from typing import Callable, Dict, List, Optional
+from collections import deque
+from typing import Deque, Generator, Iterator, List, Tuple
 
-from pydriller.repository import Repository
-from pydriller.domain.commit import Commit, ModificationType, ModifiedFile
+from pydriller.domain.commit import ModificationType, ModifiedFile
 from git.config import GitConfigParser
 from git.util import BlockingLockFile
 from git.types import PathLike
-from celery import group
+from celery.result import AsyncResult
 
-from .models import FunctionCall, ProjectConfig, ProjectPaths, FileData, CommitDates
+from .models import GitCommitData, ProjectConfig, ProjectPaths
 from .repository_mining_util import (
     get_file_type_validation_function,
     save_source_code,
     delete_source_code,
-    get_file_imports,
-    save_compact_xml_parsed_code,
-    jar_wrapper,
-    set_hashes_to_function_calls,
 )
-from .utils_sql import (
-    insert_git_commit,
-    insert_file_commit,
-    update_file_imports,
-    insert_function_commit,
-    update_function_to_file,
-    save_raw_function_call_curr_rows,
-    save_raw_function_call_deleted_rows,
+from .git_repository_mining_util import (
+    extract_git_commit,
+    get_traversal_commit_hashes,
+    release_scratch_dir,
+    write_git_commits,
 )
+from .repository_backend import get_repository_backend
+from .subprocess_util import configure_commands, log_command_stats
+from .utils_sql import AnalyticsDbWriter
+from .utils_sql_shard import CommitDataDb, get_commit_data_db_path, get_shard_db_path
 from .celery_app import celery_app
 
 
@@ -43,131 +39,119 @@ class _LimitedBlockingLockFile(BlockingLockFile):
 GitConfigParser.t_lock = _LimitedBlockingLockFile
 
 
-def git_traverse(proj_config: ProjectConfig, proj_paths: ProjectPaths) -> None:
-    repository = _git_repository_from_config(proj_config, proj_paths)
-    results = group(
-        [
-            _process_git_commit_task.signature((proj_config, proj_paths, commit.hash))
-            for commit in repository.traverse_commits()
-        ]
-    ).apply_async()
-    results.join()
-
-
-def _git_repository_from_config(
-    proj_config: ProjectConfig, proj_paths: ProjectPaths
-) -> Repository:
-    filters: Dict[str, str | datetime] = {}
-    if (
-        proj_config["start_repo_date"] is not None
-        and proj_config["end_repo_date"] is not None
-    ):
-        filters = dict(
-            since=proj_config["start_repo_date"],
-            to=proj_config["end_repo_date"],
-        )
-    elif proj_config["start_repo_date"] is not None:
-        filters = dict(since=proj_config["start_repo_date"])
-    elif (
-        proj_config["repo_from_tag"] is not None
-        and proj_config["repo_to_tag"] is not None
-    ):
-        filters = dict(
-            from_tag=proj_config["repo_from_tag"],
-            to_tag=proj_config["repo_to_tag"],
-        )
-    elif (
-        proj_config["repo_from_commit"] is not None
-        and proj_config["repo_to_commit"] is not None
-    ):
-        filters = dict(
-            from_commit=proj_config["repo_from_commit"],
-            to_commit=proj_config["repo_to_commit"],
+def git_traverse(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths, resume: bool = False
+) -> None:
+    """
+    The commits that are not in the commit data db of the project are submitted in chunks of
+    consecutive commits, and a new chunk is only submitted when less than
+    celery_max_chunks_in_flight chunks are unfinished. Every chunk is mined into its own shard
+    db. The only writer of the project db writes the commits in traversal order, the commits of
+    a chunk as soon as it and all newer chunks are finished.
+    """
+    commit_hashes = get_traversal_commit_hashes(proj_config, proj_paths, resume)
+    with AnalyticsDbWriter(
+        proj_paths["path_to_project_db"], proj_config["db_commit_interval"]
+    ) as writer, CommitDataDb(
+        get_commit_data_db_path(proj_paths["path_to_project_db"])
+    ) as commit_data_db:
+        write_git_commits(
+            writer,
+            commit_data_db,
+            commit_hashes,
+            _mine_chunks(
+                proj_config,
+                proj_paths,
+                commit_data_db.get_missing_commit_hashes(commit_hashes),
+            ),
+        )
+
+
+def _mine_chunks(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths, commit_hashes: List[str]
+) -> Iterator[GitCommitData]:
+    """
+    Yields the mined commits in traversal order.
+    """
+    chunk_size = proj_config["celery_chunk_size"]
+    chunks = [
+        commit_hashes[start:start + chunk_size]
+        for start in range(0, len(commit_hashes), chunk_size)
+    ]
+
+    in_flight: Deque[Tuple[str, AsyncResult[int]]] = deque()
+    nr_mined_commits = 0
+    for nr_chunk, chunk in enumerate(chunks, start=1):
+        if len(in_flight) >= proj_config["celery_max_chunks_in_flight"]:
+            nr_mined_commits += yield from _read_chunk(*in_flight.popleft())
+            _report_progress(nr_chunk - 1 - len(in_flight), len(chunks), nr_mined_commits)
+        in_flight.append(
+            (
+                _get_chunk_shard_db_path(proj_paths, chunk),
+                _process_git_commits_task.apply_async((proj_config, proj_paths, chunk)),
+            )
         )
+    while in_flight:
+        nr_mined_commits += yield from _read_chunk(*in_flight.popleft())
+        _report_progress(len(chunks) - len(in_flight), len(chunks), nr_mined_commits)
 
-    r = Repository(
-        path_to_repo=proj_paths["path_to_cache_src_dir"],
-        only_modifications_with_file_types=proj_config["commit_file_types"],
-        order="reverse",
-        only_no_merge=True,
-        only_in_branch=proj_config["only_in_branch"],
-        **filters,  # type: ignore[arg-type]
-    )
 
-    print("_git_repository_from_config r")
-    print(r)
+def _get_chunk_shard_db_path(proj_paths: ProjectPaths, chunk: List[str]) -> str:
+    # a chunk is named after its newest commit
+    return get_shard_db_path(proj_paths["path_to_project_db"], chunk[0])
 
-    return r
 
+def _read_chunk(
+    path_to_shard_db: str, result: "AsyncResult[int]"
+) -> Generator[GitCommitData, None, int]:
+    """
+    Yields the commits of a finished chunk from its shard db, which is deleted afterwards.
+    Returns the number of commits of the chunk.
+    """
+    nr_commits = result.get()
+    with CommitDataDb(path_to_shard_db) as shard:
+        yield from shard.get_commits()
+    os.remove(path_to_shard_db)
+    return nr_commits
 
-@celery_app.task()
-def _process_git_commit_task(
-    proj_config: ProjectConfig, proj_paths: ProjectPaths, commit_hash: str
-) -> None:
-    is_valid_file_type = get_file_type_validation_function(proj_config["proj_lang"])
-    logging.info("task repo config")
-    print("_process_git_commit_task")
-    repository = _git_repository_from_config(proj_config, proj_paths)
-    commits = [c for c in repository.traverse_commits() if c.hash == commit_hash]
-    if len(commits) > 1:
-        raise RuntimeError(f"Found multiple commits for hash not {commit_hash}")
-    if len(commits) == 0:
-        raise RuntimeError(f"Could not find commit with hash {commit_hash}")
-    commit = commits[0]
-    process_git_commit(proj_config, proj_paths, is_valid_file_type, commit)
 
-
-def process_git_commit(
-    proj_config: ProjectConfig,
-    proj_paths: ProjectPaths,
-    is_valid_file_type: Callable[[str], bool],
-    commit: Commit,
-) -> None:
-    # insert git_commit
-    insert_git_commit(
-        proj_paths["path_to_project_db"],
-        commit_hash=commit.hash,
-        commit_commiter_datetime=str(commit.committer_date),
-        author=commit.author.name,
-        in_main_branch=True,  # commit.in_main_branch,
-        merge=commit.merge,
-        nr_modified_files=len(commit.modified_files),
-        nr_deletions=commit.deletions,
-        nr_insertions=commit.insertions,
-        nr_lines=commit.lines,
+def _report_progress(nr_finished_chunks: int, nr_chunks: int, nr_commits: int) -> None:
+    print(f"Mined chunk {nr_finished_chunks}/{nr_chunks}, {nr_commits} commits")
+    logging.info(
+        "Mined chunk %d/%d, %d commits", nr_finished_chunks, nr_chunks, nr_commits
     )
 
-    # dir_deleted_files = set([])
-
-    for mod_file in commit.modified_files:
-        if is_valid_file_type(str(mod_file.new_path)) or is_valid_file_type(
-            str(mod_file.old_path)
-        ):
-            process_file_git_commit(proj_config, proj_paths, commit, mod_file)
-
-    #         dir_deleted_file = process_file_git_commit(proj_config, proj_paths,
-    #                                                    commit, mod_file)
-    #         if dir_deleted_file != '':
-    #             dir_deleted_files.add(dir_deleted_file)
-
-    # for d in dir_deleted_files:
-    #     delete_empty_dir(d)
-
-    # TODO delete
-    # if parse_cg:
-    #     checkout_repo(proj_config['repo_url'], proj_paths['path_to_cache_src_dir'], commit.hash)
-
-
-def process_file_git_commit(
-    proj_config: ProjectConfig,
-    proj_paths: ProjectPaths,
-    commit: Commit,
-    mod_file: ModifiedFile,
-) -> None:
-
-    process_file_git_commit_astdiff_parsing(proj_config, proj_paths, commit, mod_file)
 
-    # return dir_deleted_file
+@celery_app.task()
+def _process_git_commits_task(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths, commit_hashes: List[str]
+) -> int:
+    is_valid_file_type = get_file_type_validation_function(proj_config["proj_lang"])
+    backend = get_repository_backend(proj_config, proj_paths)
+    configure_commands(
+        proj_config["command_timeout_s"], proj_config["max_concurrent_commands"]
+    )
+    path_to_shard_db = _get_chunk_shard_db_path(proj_paths, commit_hashes)
+    os.makedirs(os.path.dirname(path_to_shard_db), exist_ok=True)
+    # the shard of a retried task is mined again
+    if os.path.exists(path_to_shard_db):
+        os.remove(path_to_shard_db)
+    try:
+        with CommitDataDb(path_to_shard_db) as shard:
+            for commit_hash in commit_hashes:
+                shard.put(
+                    extract_git_commit(
+                        proj_config,
+                        proj_paths,
+                        backend,
+                        backend.get_commit(commit_hash),
+                        is_valid_file_type,
+                    )
+                )
+    finally:
+        release_scratch_dir(proj_config, proj_paths)
+    log_command_stats()
+    return len(commit_hashes)
 
 
 def process_file_git_commit_cg_parsing(
@@ -249,212 +233,3 @@ def process_file_git_commit_cg_parsing(
         return ""
 
     raise Exception(f"unhandled modifiaction type: {mod_file.change_type}")
-
-
-def process_file_git_commit_astdiff_parsing(
-    proj_config: ProjectConfig,
-    proj_paths: ProjectPaths,
-    commit: Commit,
-    mod_file: ModifiedFile,
-) -> None:
-    mod_file_data = FileData(str(mod_file.new_path))
-    mod_file_data_prev = FileData(str(mod_file.old_path))
-
-    # Create sourcediff directory
-    if proj_config["save_cache_files"]:
-        file_path_sourcediff = os.path.join(
-            proj_paths["path_to_cache_sourcediff"], str(mod_file.new_path)
-        )
-        if not os.path.exists(os.path.dirname(file_path_sourcediff)):
-            os.makedirs(os.path.dirname(file_path_sourcediff))
-
-    # Save new source code
-    file_path_current = None
-    if mod_file.change_type not in (ModificationType.DELETE, ModificationType.RENAME):
-        file_path_current = os.path.join(
-            proj_paths["path_to_cache_current"], str(mod_file.new_path)
-        )
-        save_source_code(file_path_current, mod_file.source_code)
-
-    file_path_previous = None
-    if mod_file.change_type not in (ModificationType.ADD, ModificationType.RENAME):
-        file_path_previous = os.path.join(
-            proj_paths["path_to_cache_previous"], str(mod_file.old_path)
-        )
-        save_source_code(file_path_previous, mod_file.source_code_before)
-
-    if mod_file.change_type == ModificationType.RENAME:
-        print(
-            f"RENAME. File {mod_file.filename} old path: {mod_file.new_path}, new path: {mod_file.old_path}. TODO"
-        )
-        logging.info(
-            "RENAME. File %s old path: %s, new path: %s. TODO",
-            mod_file.filename,
-            mod_file.new_path,
-            mod_file.old_path,
-        )
-        return
-
-    # insert file_commit
-    insert_file_commit(
-        proj_paths["path_to_project_db"],
-        mod_file_data=mod_file_data,
-        commit_hash=commit.hash,
-        commit_commiter_datetime=commit.committer_date,
-        commit_file_name=mod_file.filename,
-        commit_new_path=mod_file.new_path,
-        commit_old_path=mod_file.old_path,
-        change_type=mod_file.change_type,
-    )
-
-    # update file imports
-    fis = get_file_imports(
-        proj_lang=proj_config["proj_lang"],
-        path_to_src_files=proj_paths["path_to_src_files"],
-        source_code=mod_file.source_code,
-        mod_file_data=mod_file_data,
-    )
-    fis_prev = get_file_imports(
-        proj_lang=proj_config["proj_lang"],
-        path_to_src_files=proj_paths["path_to_src_files"],
-        source_code=mod_file.source_code_before,
-        mod_file_data=mod_file_data_prev,
-    )
-
-    update_file_imports(
-        mod_file_data,
-        fis,
-        fis_prev,
-        proj_paths["path_to_project_db"],
-        commit_hash=commit.hash,
-        commit_datetime=str(commit.committer_date),
-    )
-
-    # function_commit
-    insert_function_commit(proj_paths["path_to_project_db"], mod_file, commit)
-
-    # update function_to_file
-    update_function_to_file(proj_paths["path_to_project_db"], mod_file, commit)
-
-    # update function_call
-    update_function_calls(
-        proj_config, proj_paths, mod_file, commit, file_path_current, file_path_previous
-    )
-
-
-# TODO list to array, maybe
-# TODO handle mod_file.old_path != mod_file.new_path
-def update_function_calls(
-    proj_config: ProjectConfig,
-    proj_paths: ProjectPaths,
-    mod_file: ModifiedFile,
-    commit: Commit,
-    file_path_current: Optional[str],
-    file_path_previous: Optional[str] = None,
-) -> None:
-
-    mod_file_data = FileData(str(mod_file.new_path))
-
-    if proj_config["proj_lang"] == "java" or proj_config["proj_lang"] == "cpp":
-        # Current source code
-        curr_function_calls: List[FunctionCall] = []
-        if file_path_current is not None:
-            logging.debug(file_path_current)
-            if not os.path.exists(file_path_current):
-                logging.warning(
-                    "file_path_current does not exist %s", file_path_current
-                )
-            # get compact xml parsed source
-            curr_src_args = [
-                proj_config["path_to_src_compact_xml_parsing"],
-                file_path_current,
-            ]
-            result = jar_wrapper(*curr_src_args)
-            # convert to string -> xml
-            curr_src_str = b"".join(result).decode("utf-8")
-
-            save_compact_xml_parsed_code(
-                path_to_cache_dir=proj_paths["path_to_cache_current"],
-                relative_file_path=str(mod_file.new_path),
-                source_text=curr_src_str,
-            )
-
-            # calling_function_unqualified_name,
-            # calling_function_nr_parameters,
-            # called_function_unqualified_name
-            if proj_config["proj_lang"] == "java":
-                # curr_function_calls = get_function_calls_java(curr_src_xml)
-                print("WOULD BE get_function_calls_java")
-            else:
-                curr_function_calls = []
-                logging.info("TODO")
-                print("TODO")
-
-        # Previous source code
-        prev_function_calls: List[FunctionCall] = []
-        if (
-            mod_file.change_type != ModificationType.ADD
-            and file_path_previous is not None
-        ):
-            logging.debug(file_path_previous)
-            if not os.path.exists(file_path_previous):
-                logging.warning(
-                    "file_path_previous does not exist %s", file_path_previous
-                )
-            # get compact xml parsed source
-            prev_src_args = [
-                proj_config["path_to_src_compact_xml_parsing"],
-                file_path_previous,
-            ]
-            result = jar_wrapper(*prev_src_args)
-            # convert to string -> xml
-            prev_src_str = b"".join(result).decode("utf-8")
-
-            save_compact_xml_parsed_code(
-                path_to_cache_dir=proj_paths["path_to_cache_previous"],
-                relative_file_path=str(mod_file.new_path),
-                source_text=prev_src_str,
-            )
-
-            if proj_config["proj_lang"] == "java":
-                # prev_function_calls = get_function_calls_java(prev_src_xml)
-                print("WOULD BE get_function_calls_java")
-            else:
-                curr_function_calls = []
-                print("TODO")
-                logging.info("TODO")
-
-        cm_dates = CommitDates(commit.hash, commit.committer_date)
-        rows_curr, rows_deleted = set_hashes_to_function_calls(
-            curr_function_calls, prev_function_calls, cm_dates
-        )
-        logging.debug("Deleted: ")
-        logging.debug(rows_deleted)
-        # arr_all_function_calls = complete_function_calls_data(arr_all_function_calls)
-
-        # FUNCTION_CALL
-        # file_name
-        # file_dir_path
-        # file_path
-        # calling_function_unqualified_name
-        # calling_function_nr_parameters
-        # called_function_unqualified_name
-        # called_function_nr_parameters
-        # commit_hash_start
-        # commit_start_datetime
-        # commit_hash_oldest
-        # commit_oldest_datetime
-        # commit_hash_end
-        # commit_end_datetime
-        # closed
-        save_raw_function_call_curr_rows(
-            proj_paths["path_to_project_db"], rows_curr, mod_file_data
-        )
-        save_raw_function_call_deleted_rows(
-            proj_paths["path_to_project_db"], rows_deleted, mod_file_data
-        )
-
-        # save_call_commit_rows() # MIGHT NOT NEED THEM
-
-    else:
-        print("No current parser for the project language.")
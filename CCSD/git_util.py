@@ -27,6 +27,17 @@ def checkout_repo(
     print("finished checkout_repo")
 
 
+def update_repo(path_to_cache_src_dir: str, branch: str) -> None:
+    """
+    Fetches the remote and fast-forwards the checked out branch to it.
+    """
+    logging.info("Fetch new commits of %s", branch)
+    g = Git(path_to_cache_src_dir)
+    g.fetch("origin")
+    g.merge("--ff-only", f"origin/{branch}")
+    print("finished update_repo")
+
+
 def set_safe_directory(directory):
     # Initialize a Git object
     git_cmd = Git()
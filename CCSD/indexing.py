@@ -68,4 +68,8 @@ def create_file_pkg_table(proj_paths: ProjectPaths) -> None:
         )
 
         cur.executemany('INSERT INTO "file_pkg" VALUES (?, ?, ?, ?, ?)', f_list)
+        # covering index of the import dependency lookups by file name
+        cur.execute(
+            """CREATE INDEX "file_pkg_file_name" ON "file_pkg" ("file_name", "class_pkg", "file_pkg");"""
+        )
         conn.commit()
@@ -0,0 +1,157 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.DataOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Paths;
+import java.security.Permission;
+import java.util.jar.JarFile;
+
+/**
+ * Runs the main class of a jar for every request read from stdin, so that the JVM is started
+ * only once per mining process.
+ *
+ * Usage: java JarMainServer.java parser.jar
+ *
+ * A request is one line with the NUL separated arguments of the main method. The response is
+ * a header line "stdout_length stderr_length" followed by the captured stdout and stderr bytes
+ * of the call.
+ *
+ * Every call loads the jar with a new class loader, so that the static state of a call does not
+ * leak into the next one. Where the JVM still allows a security manager (up to Java 17), a call
+ * of System.exit ends the call instead of the JVM. On newer JVMs it ends the JVM, and the client
+ * runs the call again with a new JVM per call.
+ */
+public class JarMainServer {
+
+    /** Stream that writes into the buffer of the current request. */
+    private static final class SwitchableOutputStream extends OutputStream {
+        private ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+
+        ByteArrayOutputStream swap() {
+            ByteArrayOutputStream previous = buffer;
+            buffer = new ByteArrayOutputStream();
+            return previous;
+        }
+
+        @Override
+        public void write(int b) {
+            buffer.write(b);
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) {
+            buffer.write(b, off, len);
+        }
+    }
+
+    /** Thrown instead of ending the JVM when a call runs System.exit. */
+    private static final class ExitException extends SecurityException {
+        private static final long serialVersionUID = 1L;
+
+        ExitException(int status) {
+            super("System.exit(" + status + ")");
+        }
+    }
+
+    /** Allows everything but ending the JVM while a call runs. */
+    @SuppressWarnings("removal")
+    private static final class ExitGuard extends SecurityManager {
+        private volatile boolean inCall;
+
+        @Override
+        public void checkPermission(Permission perm) {
+        }
+
+        @Override
+        public void checkPermission(Permission perm, Object context) {
+        }
+
+        @Override
+        public void checkExit(int status) {
+            if (inCall) {
+                throw new ExitException(status);
+            }
+        }
+    }
+
+    @SuppressWarnings("removal")
+    private static ExitGuard installExitGuard() {
+        ExitGuard exitGuard = new ExitGuard();
+        try {
+            System.setSecurityManager(exitGuard);
+            return exitGuard;
+        } catch (UnsupportedOperationException | SecurityException e) {
+            return null;
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        String mainClassName;
+        try (JarFile jarFile = new JarFile(args[0])) {
+            mainClassName = jarFile.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+        URL[] jarUrls = {Paths.get(args[0]).toUri().toURL()};
+        // installed before the streams are captured, a deprecation warning goes to the JVM stderr
+        ExitGuard exitGuard = installExitGuard();
+
+        DataOutputStream response = new DataOutputStream(System.out);
+        SwitchableOutputStream capturedOut = new SwitchableOutputStream();
+        SwitchableOutputStream capturedErr = new SwitchableOutputStream();
+        // the parser may keep a reference to System.out, so the streams are set only once
+        System.setOut(new PrintStream(capturedOut, true, StandardCharsets.UTF_8));
+        System.setErr(new PrintStream(capturedErr, true, StandardCharsets.UTF_8));
+
+        BufferedReader requests =
+                new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        String request;
+        while ((request = requests.readLine()) != null) {
+            runMain(jarUrls, mainClassName, request.split("\0", -1), exitGuard);
+            System.out.flush();
+            System.err.flush();
+            writeResponse(response, capturedOut.swap().toByteArray(), capturedErr.swap().toByteArray());
+        }
+    }
+
+    private static void runMain(URL[] jarUrls, String mainClassName, String[] mainArgs,
+            ExitGuard exitGuard) throws IOException {
+        // the jar classes are not on the parent class path, the loader defines them anew
+        try (URLClassLoader loader =
+                new URLClassLoader(jarUrls, ClassLoader.getPlatformClassLoader())) {
+            Thread.currentThread().setContextClassLoader(loader);
+            if (exitGuard != null) {
+                exitGuard.inCall = true;
+            }
+            try {
+                Class.forName(mainClassName, true, loader)
+                        .getMethod("main", String[].class)
+                        .invoke(null, (Object) mainArgs);
+            } catch (InvocationTargetException e) {
+                if (!(e.getCause() instanceof ExitException)) {
+                    e.getCause().printStackTrace();
+                }
+            } catch (ReflectiveOperationException | LinkageError e) {
+                e.printStackTrace();
+            } finally {
+                if (exitGuard != null) {
+                    exitGuard.inCall = false;
+                }
+                Thread.currentThread().setContextClassLoader(JarMainServer.class.getClassLoader());
+            }
+        }
+    }
+
+    private static void writeResponse(DataOutputStream response, byte[] out, byte[] err)
+            throws IOException {
+        response.write((out.length + " " + err.length + "\n").getBytes(StandardCharsets.US_ASCII));
+        response.write(out);
+        response.write(err);
+        response.flush();
+    }
+}
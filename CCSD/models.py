@@ -1,10 +1,12 @@
-# pylint: disable=too-many-instance-attributes,too-many-arguments
+# pylint: disable=too-many-instance-attributes,too-many-arguments,too-many-locals
 
 # %%
 import os
 from datetime import datetime
 from enum import Enum
-from typing import NamedTuple, Optional, List, TypedDict
+from typing import FrozenSet, NamedTuple, Optional, List, TypedDict
+
+from pydriller.domain.commit import ModificationType
 
 
 class ActionClass(Enum):
@@ -44,6 +46,16 @@ ProjectConfig = TypedDict(
         "save_cache_files": Optional[bool],
         "delete_cache_files": Optional[bool],
         "only_in_branch": str,
+        "db_commit_interval": int,
+        "celery_chunk_size": int,
+        "celery_max_chunks_in_flight": int,
+        "command_timeout_s": int,
+        "max_concurrent_commands": int,
+        "cache_max_mb": int,
+        "in_memory_sources": bool,
+        "repo_backend": str,
+        "lizard_workers": int,
+        "db_schema": str,
         "path_to_src_compact_xml_parsing": str,
         "path_to_src_diff_jar": str,
     },
@@ -65,9 +77,23 @@ def build_project_config(
     save_cache_files: Optional[bool] = True,
     delete_cache_files: Optional[bool] = True,
     only_in_branch: Optional[str] = None,
+    db_commit_interval: int = 1,
+    celery_chunk_size: int = 200,
+    celery_max_chunks_in_flight: int = 4,
+    command_timeout_s: int = 300,
+    max_concurrent_commands: int = 0,
+    cache_max_mb: int = 10240,
+    in_memory_sources: bool = False,
+    repo_backend: str = "pydriller",
+    lizard_workers: int = 1,
+    db_schema: str = "text",
 ) -> ProjectConfig:
     if proj_lang not in _DEFAULT_COMMIT_FILE_TYPES:
         raise Exception(f"invalid language {proj_lang}")
+    if repo_backend not in ("pydriller", "git"):
+        raise Exception(f"invalid repo_backend {repo_backend}")
+    if db_schema not in ("text", "compact"):
+        raise Exception(f"invalid db_schema {db_schema}")
     return ProjectConfig(
         proj_name=proj_name,
         proj_lang=proj_lang,
@@ -83,6 +109,16 @@ def build_project_config(
         save_cache_files=save_cache_files,
         delete_cache_files=delete_cache_files,
         only_in_branch=only_in_branch or "master",
+        db_commit_interval=db_commit_interval,
+        celery_chunk_size=celery_chunk_size,
+        celery_max_chunks_in_flight=celery_max_chunks_in_flight,
+        command_timeout_s=command_timeout_s,
+        max_concurrent_commands=max_concurrent_commands,
+        cache_max_mb=cache_max_mb,
+        in_memory_sources=in_memory_sources,
+        repo_backend=repo_backend,
+        lizard_workers=lizard_workers,
+        db_schema=db_schema,
         path_to_src_compact_xml_parsing=_PATH_TO_SRC_COMPACT_XML_PARSING,
         path_to_src_diff_jar=_PATH_TO_SRC_DIFF_JAR[proj_lang],
     )
@@ -587,4 +623,80 @@ ExtendedFunctionCall = NamedTuple(
 )
 
 
+# Plain, picklable results of mining one git commit. They are produced by the extraction
+# of a commit (possibly in a worker process) and consumed by the AnalyticsDbWriter.
+MethodData = NamedTuple(
+    "MethodData",
+    [
+        ("name", str),
+        ("long_name", str),
+        ("parameters", List[str]),
+        ("nloc", int),
+        ("start_line", int),
+        ("end_line", int),
+    ],
+)
+
+# The current and previous source of a modified file, read once per file, with the git blob
+# hashes that key their parse results in the parse cache.
+FileSources = NamedTuple(
+    "FileSources",
+    [
+        ("source_code", Optional[str]),
+        ("source_code_before", Optional[str]),
+        ("blob_sha", Optional[str]),
+        ("blob_sha_before", Optional[str]),
+    ],
+)
+
+# The function long names and import file paths of a file change, split once per file by
+# repository_mining_util.get_file_change_sets for all the table writers.
+FileChangeSets = NamedTuple(
+    "FileChangeSets",
+    [
+        ("previous_functions", FrozenSet[str]),
+        ("added_functions", FrozenSet[str]),
+        ("deleted_functions", FrozenSet[str]),
+        ("changed_functions", FrozenSet[str]),
+        ("unchanged_functions", FrozenSet[str]),
+        ("added_file_imports", FrozenSet[str]),
+        ("deleted_file_imports", FrozenSet[str]),
+        ("unchanged_file_imports", FrozenSet[str]),
+    ],
+)
+
+FileChangeData = NamedTuple(
+    "FileChangeData",
+    [
+        ("filename", str),
+        ("old_path", Optional[str]),
+        ("new_path", Optional[str]),
+        ("change_type", ModificationType),
+        ("methods_before", List[MethodData]),
+        ("methods", List[MethodData]),
+        ("changed_methods", List[MethodData]),
+        ("file_imports", List[FileImport]),
+        ("file_imports_prev", List[FileImport]),
+        ("function_call_rows_curr", List[ExtendedFunctionCall]),
+        ("function_call_rows_deleted", List[ExtendedFunctionCall]),
+        ("change_sets", FileChangeSets),
+    ],
+)
+
+GitCommitData = NamedTuple(
+    "GitCommitData",
+    [
+        ("hash", str),
+        ("committer_date", datetime),
+        ("author_name", str),
+        ("merge", bool),
+        ("nr_modified_files", int),
+        ("nr_deletions", int),
+        ("nr_insertions", int),
+        ("nr_lines", int),
+        ("file_changes", List[FileChangeData]),
+    ],
+)
+
+
 # %%
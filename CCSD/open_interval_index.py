@@ -0,0 +1,62 @@
+"""
+In-process index of the open rows (closed = 0) of the interval tables file_import and
+function_to_file, so that the writer does not query the database for them per file change.
+"""
+import sqlite3
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+class OpenIntervalIndex:
+    """
+    Number of open rows of an interval table per file path and key column value. The index is
+    loaded from the table with one query on first use, afterwards the writer keeps it up to
+    date with the rows it opens and closes.
+    """
+
+    def __init__(self, table: str, key_column: str) -> None:
+        self.table = table
+        self.key_column = key_column
+        self._open_rows: Optional[Dict[str, Counter[str]]] = None
+
+    def load(self, cur: sqlite3.Cursor) -> None:
+        if self._open_rows is not None:
+            return
+        cur.execute(
+            f"""SELECT file_path, {self.key_column}, COUNT(*)
+            FROM {self.table}
+            WHERE closed = 0
+            GROUP BY file_path, {self.key_column}"""
+        )
+        open_rows: Dict[str, Counter[str]] = {}
+        for file_path, key, nr_rows in cur.fetchall():
+            open_rows.setdefault(file_path, Counter())[key] = nr_rows
+        self._open_rows = open_rows
+
+    def get_keys(self, file_path: str) -> List[str]:
+        """
+        The key values with open rows in the file.
+        """
+        return [key for key, nr_rows in self._get_file(file_path).items() if nr_rows > 0]
+
+    def is_open(self, file_path: str, key: str) -> bool:
+        return self._get_file(file_path)[key] > 0
+
+    def open(self, file_path: str, key: str) -> None:
+        self._get_file(file_path)[key] += 1
+
+    def close(self, file_path: str, key: str) -> None:
+        """
+        Records that all open rows of the key in the file were closed.
+        """
+        self._get_file(file_path).pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Drops the index, it is loaded again from the table on the next use.
+        """
+        self._open_rows = None
+
+    def _get_file(self, file_path: str) -> Counter[str]:
+        assert self._open_rows is not None, "load the index first"
+        return self._open_rows.setdefault(file_path, Counter())
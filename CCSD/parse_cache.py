@@ -0,0 +1,178 @@
+"""
+Content addressed cache of the parse results of source files, keyed by the git blob hash of
+the source. The current source of a file in one commit is its previous source in the next
+commit of the traversal, and reverts and cherry-picks repeat sources too.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from xml.sax.saxutils import quoteattr
+
+from .cache_manager import CacheManager, get_cache_manager
+from .models import MethodData, ProjectConfig, ProjectPaths
+
+_SRCML_FILENAME_ATTRIBUTE = re.compile(r'filename="[^"]*"')
+# git's hash of a missing blob, the before side of an added file or the after side of a
+# deleted file
+_NULL_BLOB_SHA = "0" * 40
+# method lists kept decoded in memory, the current source of a file is usually read again as
+# its previous source a few commits later
+_MAX_MEMO_ENTRIES = 4096
+
+
+def get_blob_sha(source_code: str) -> str:
+    """
+    The git blob hash of the utf-8 encoded source code.
+    """
+    data = source_code.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class ParseCache:
+    """
+    Stores the srcml xml, the compact xml and the lizard methods of a source in
+    path_to_cache_dir/parse_cache/<kind>/<blob sha prefix>/<blob sha><file extension>.
+    The file extension is part of the key, as it selects the parsed language. The changed
+    methods of a change are keyed by the blob shas of the previous and the current source.
+    The files are written through the cache manager, compressed and atomically, so the cache
+    can be shared by worker processes.
+    """
+
+    def __init__(self, path_to_cache_dir: str, cache_manager: CacheManager) -> None:
+        self.path_to_parse_cache = os.path.join(path_to_cache_dir, "parse_cache")
+        self.cache_manager = cache_manager
+        self.nr_hits = 0
+        self.nr_misses = 0
+        self._methods_memo: "OrderedDict[str, List[MethodData]]" = OrderedDict()
+
+    def get_methods(self, blob_sha: str, file_name: str) -> Optional[List[MethodData]]:
+        return self._read_methods("methods", blob_sha, file_name)
+
+    def put_methods(
+        self, blob_sha: str, file_name: str, methods: List[MethodData]
+    ) -> None:
+        self._write_methods("methods", blob_sha, file_name, methods)
+
+    def get_changed_methods(
+        self,
+        blob_sha_before: Optional[str],
+        blob_sha: Optional[str],
+        file_name: str,
+    ) -> Optional[List[MethodData]]:
+        return self._read_methods(
+            "changed_methods", _get_pair_key(blob_sha_before, blob_sha), file_name
+        )
+
+    def put_changed_methods(
+        self,
+        blob_sha_before: Optional[str],
+        blob_sha: Optional[str],
+        file_name: str,
+        changed_methods: List[MethodData],
+    ) -> None:
+        self._write_methods(
+            "changed_methods",
+            _get_pair_key(blob_sha_before, blob_sha),
+            file_name,
+            changed_methods,
+        )
+
+    def get_compact_xml(self, blob_sha: str, file_name: str) -> Optional[str]:
+        return self._read("compact_xml", blob_sha, file_name)
+
+    def put_compact_xml(self, blob_sha: str, file_name: str, compact_xml: str) -> None:
+        self._write("compact_xml", blob_sha, file_name, compact_xml)
+
+    def restore_srcml_xml(self, blob_sha: str, file_path: str) -> bool:
+        """
+        Writes {file_path}.xml from the cache, with the filename of the unit set to file_path.
+        """
+        xml = self._read("srcml", blob_sha, file_path)
+        if xml is None:
+            return False
+        xml = _SRCML_FILENAME_ATTRIBUTE.sub(
+            lambda _: f"filename={quoteattr(file_path)}", xml, count=1
+        )
+        with open(f"{file_path}.xml", "w", encoding="utf-8") as f:
+            f.write(xml)
+        return True
+
+    def store_srcml_xml(self, blob_sha: str, file_path: str) -> None:
+        """
+        Stores {file_path}.xml, unless it is the placeholder of a failed conversion.
+        """
+        try:
+            with open(f"{file_path}.xml", "r", encoding="utf-8") as f:
+                xml = f.read()
+        except OSError as err:
+            logging.debug("No srcml xml for %s: %s", file_path, err)
+            return
+        if _SRCML_FILENAME_ATTRIBUTE.search(xml):
+            self._write("srcml", blob_sha, file_path, xml)
+
+    def _path(self, kind: str, blob_sha: str, file_name: str) -> str:
+        return os.path.join(
+            self.path_to_parse_cache,
+            kind,
+            blob_sha[:2],
+            blob_sha + os.path.splitext(file_name)[1],
+        )
+
+    def _read_methods(
+        self, kind: str, blob_sha: str, file_name: str
+    ) -> Optional[List[MethodData]]:
+        path = self._path(kind, blob_sha, file_name)
+        methods = self._methods_memo.get(path)
+        if methods is not None:
+            self._methods_memo.move_to_end(path)
+            self.nr_hits += 1
+            return methods
+        content = self._read(kind, blob_sha, file_name)
+        if content is None:
+            return None
+        methods = [MethodData(*fields) for fields in json.loads(content)]
+        self._memoize_methods(path, methods)
+        return methods
+
+    def _write_methods(
+        self, kind: str, blob_sha: str, file_name: str, methods: List[MethodData]
+    ) -> None:
+        path = self._path(kind, blob_sha, file_name)
+        self._write(kind, blob_sha, file_name, json.dumps(methods))
+        self._memoize_methods(path, methods)
+
+    def _memoize_methods(self, path: str, methods: List[MethodData]) -> None:
+        self._methods_memo[path] = methods
+        if len(self._methods_memo) > _MAX_MEMO_ENTRIES:
+            self._methods_memo.popitem(last=False)
+
+    def _read(self, kind: str, blob_sha: str, file_name: str) -> Optional[str]:
+        content = self.cache_manager.read(self._path(kind, blob_sha, file_name))
+        if content is None:
+            self.nr_misses += 1
+        else:
+            self.nr_hits += 1
+        return content
+
+    def _write(self, kind: str, blob_sha: str, file_name: str, content: str) -> None:
+        self.cache_manager.write(self._path(kind, blob_sha, file_name), content)
+
+
+def _get_pair_key(blob_sha_before: Optional[str], blob_sha: Optional[str]) -> str:
+    return (blob_sha_before or _NULL_BLOB_SHA) + (blob_sha or _NULL_BLOB_SHA)
+
+
+_PARSE_CACHES: Dict[str, ParseCache] = {}
+
+
+def get_parse_cache(proj_config: ProjectConfig, proj_paths: ProjectPaths) -> ParseCache:
+    path_to_cache_dir = proj_paths["path_to_cache_dir"]
+    if path_to_cache_dir not in _PARSE_CACHES:
+        _PARSE_CACHES[path_to_cache_dir] = ParseCache(
+            path_to_cache_dir, get_cache_manager(proj_config, proj_paths)
+        )
+    return _PARSE_CACHES[path_to_cache_dir]
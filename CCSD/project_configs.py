@@ -37,6 +37,16 @@ def execute_project_conf_from_file(  # pylint: disable=too-many-branches,too-man
     repo_url = None
     repo_type = "Git"
     only_in_branch = None
+    db_commit_interval = 1
+    celery_chunk_size = 200
+    celery_max_chunks_in_flight = 4
+    command_timeout_s = 300
+    max_concurrent_commands = 0
+    cache_max_mb = 10240
+    in_memory_sources = False
+    repo_backend = "pydriller"
+    lizard_workers = 1
+    db_schema = "text"
 
     def get_label_content(line: str, label_size: int) -> str:
         return line[label_size : len(line.rstrip())].replace("'", "")
@@ -80,6 +90,38 @@ def execute_project_conf_from_file(  # pylint: disable=too-many-branches,too-man
                 repo_type = get_label_content(line, len("repo_type:"))
             if (line.lstrip()).startswith("only_in_branch:"):
                 only_in_branch = get_label_content(line, len("only_in_branch:"))
+            if (line.lstrip()).startswith("db_commit_interval:"):
+                db_commit_interval = int(
+                    get_label_content(line, len("db_commit_interval:"))
+                )
+            if (line.lstrip()).startswith("celery_chunk_size:"):
+                celery_chunk_size = int(
+                    get_label_content(line, len("celery_chunk_size:"))
+                )
+            if (line.lstrip()).startswith("celery_max_chunks_in_flight:"):
+                celery_max_chunks_in_flight = int(
+                    get_label_content(line, len("celery_max_chunks_in_flight:"))
+                )
+            if (line.lstrip()).startswith("command_timeout_s:"):
+                command_timeout_s = int(
+                    get_label_content(line, len("command_timeout_s:"))
+                )
+            if (line.lstrip()).startswith("max_concurrent_commands:"):
+                max_concurrent_commands = int(
+                    get_label_content(line, len("max_concurrent_commands:"))
+                )
+            if (line.lstrip()).startswith("cache_max_mb:"):
+                cache_max_mb = int(get_label_content(line, len("cache_max_mb:")))
+            if (line.lstrip()).startswith("repo_backend:"):
+                repo_backend = get_label_content(line, len("repo_backend:"))
+            if (line.lstrip()).startswith("in_memory_sources:"):
+                in_memory_sources = (
+                    get_label_content(line, len("in_memory_sources:")) == "True"
+                )
+            if (line.lstrip()).startswith("lizard_workers:"):
+                lizard_workers = int(get_label_content(line, len("lizard_workers:")))
+            if (line.lstrip()).startswith("db_schema:"):
+                db_schema = get_label_content(line, len("db_schema:"))
 
     if proj_name is None:
         raise Exception("proj_name is required")
@@ -102,6 +144,16 @@ def execute_project_conf_from_file(  # pylint: disable=too-many-branches,too-man
         save_cache_files=save_cache_files,
         delete_cache_files=delete_cache_files,
         only_in_branch=only_in_branch,
+        db_commit_interval=db_commit_interval,
+        celery_chunk_size=celery_chunk_size,
+        celery_max_chunks_in_flight=celery_max_chunks_in_flight,
+        command_timeout_s=command_timeout_s,
+        max_concurrent_commands=max_concurrent_commands,
+        cache_max_mb=cache_max_mb,
+        in_memory_sources=in_memory_sources,
+        repo_backend=repo_backend,
+        lizard_workers=lizard_workers,
+        db_schema=db_schema,
     )
     proj_paths = build_project_paths(
         proj_name=proj_config["proj_name"],
@@ -0,0 +1,344 @@
+"""
+Backends the commits of a git repository are read from, picked with the repo_backend config key.
+
+The pydriller backend is the reference. The git backend reads the same commits from one
+streamed git log --raw --numstat process and only diffs a commit once, when its modified
+files are needed. Both return pydriller ModifiedFile objects, whose sources are read through
+the blob reader.
+"""
+import subprocess
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from git.diff import NULL_TREE, Diff
+from git.repo import Repo
+from pydriller.domain.commit import Commit, ModifiedFile
+from pydriller.domain.developer import Developer
+from pydriller.git import Git
+from pydriller.repository import Repository
+
+from .git_blob_reader import get_source_code, get_source_code_before
+from .models import ProjectConfig, ProjectPaths
+
+# every git commit starts with this byte, the fields are separated by NUL bytes
+_COMMIT_MARKER = "\x01"
+_GIT_LOG_FORMAT = "%x01%H%x00%P%x00%an%x00%ae%x00%cI%x00"
+_READ_SIZE = 1 << 16
+_EMPTY_BLOB_SHA = "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+
+
+class GitLogCommit:  # pylint: disable=too-many-instance-attributes
+    """
+    A git commit as it is parsed from the git log output, with the attributes of the pydriller
+    Commit that the mining uses.
+    """
+
+    def __init__(
+        self,
+        path_to_repo: str,
+        commit_hash: str,
+        parents: List[str],
+        author: Developer,
+        committer_date: datetime,
+    ) -> None:
+        self.path_to_repo = path_to_repo
+        self.hash = commit_hash
+        self.parents = parents
+        self.author = author
+        self.committer_date = committer_date
+        # (status, old path, new path) of the --raw entries
+        self.changes: List[Tuple[str, Optional[str], Optional[str]]] = []
+        # the paths of the binary files and the added or deleted empty files, whose diff has no text
+        self.paths_without_text_diff: Set[str] = set()
+        self.insertions = 0
+        self.deletions = 0
+        self._modified_files: Optional[List[ModifiedFile]] = None
+
+    @property
+    def merge(self) -> bool:
+        return len(self.parents) > 1
+
+    @property
+    def lines(self) -> int:
+        return self.insertions + self.deletions
+
+    @property
+    def modified_files(self) -> List[ModifiedFile]:
+        """
+        Same files as Commit.modified_files of pydriller, diffed on the first access only.
+        """
+        if self._modified_files is None:
+            repo = _get_repo(self.path_to_repo)
+            commit = repo.commit(self.hash)
+            diff_index: List[Diff] = []
+            if self.merge:
+                # pydriller has no modified files for merge commits
+                pass
+            elif commit.parents:
+                diff_index = commit.parents[0].diff(commit, create_patch=True)
+            else:
+                diff_index = commit.diff(NULL_TREE, create_patch=True)
+            self._modified_files = [ModifiedFile(diff=diff) for diff in diff_index]
+        return self._modified_files
+
+    def add_numstat(self, insertions: str, deletions: str) -> None:
+        # binary files have no line counts
+        if insertions != "-":
+            self.insertions += int(insertions)
+        if deletions != "-":
+            self.deletions += int(deletions)
+
+
+BackendCommit = Union[Commit, GitLogCommit]
+
+
+class RepositoryBackend(ABC):
+    """
+    The commits of the project repository in traversal order, newest commit first, and the
+    sources of their modified files. One backend is created per traversal, worker or task
+    and passed down to the extraction of its commits.
+    """
+
+    def __init__(self, proj_config: ProjectConfig, proj_paths: ProjectPaths) -> None:
+        self.proj_config = proj_config
+        self.path_to_repo = proj_paths["path_to_cache_src_dir"]
+
+    @abstractmethod
+    def traverse_commits(self) -> Iterator[BackendCommit]:
+        pass
+
+    @abstractmethod
+    def get_commit(self, commit_hash: str) -> BackendCommit:
+        pass
+
+    def get_source_code(self, mod_file: ModifiedFile) -> Optional[str]:
+        return get_source_code(self.path_to_repo, mod_file)
+
+    def get_source_code_before(self, mod_file: ModifiedFile) -> Optional[str]:
+        return get_source_code_before(self.path_to_repo, mod_file)
+
+
+class PydrillerBackend(RepositoryBackend):
+    def traverse_commits(self) -> Iterator[BackendCommit]:
+        return _git_repository_from_config(self.proj_config, self.path_to_repo).traverse_commits()
+
+    def get_commit(self, commit_hash: str) -> BackendCommit:
+        return _get_git(self.path_to_repo).get_commit(commit_hash)
+
+
+class GitBackend(RepositoryBackend):
+    def traverse_commits(self) -> Iterator[BackendCommit]:
+        return self.traverse_git_log_commits()
+
+    def traverse_git_log_commits(self) -> Iterator[GitLogCommit]:
+        """
+        The commits pydriller traverses with _git_repository_from_config, without diffing them.
+        """
+        file_types = tuple(self.proj_config["commit_file_types"])
+        for commit in self._read_git_log(["--no-merges", *_get_rev_args(self.proj_config, self.path_to_repo)]):
+            # the filter of pydriller only_modifications_with_file_types
+            if any(
+                Path(new_path or str(old_path)).name.endswith(file_types)
+                for _, old_path, new_path in commit.changes
+            ):
+                yield commit
+
+    def get_commit(self, commit_hash: str) -> BackendCommit:
+        for commit in self._read_git_log(["-1", commit_hash]):
+            return commit
+        raise ValueError(f"commit {commit_hash} does not exist")
+
+    def _read_git_log(self, log_args: List[str]) -> Iterator[GitLogCommit]:
+        args = [
+            "git", "-C", self.path_to_repo, "log", "-M", "--raw", "--numstat", "-z",
+            # the line counts of a merge commit are those of its diff to the first parent, as in pydriller
+            "--diff-merges=first-parent",
+            "--no-color", "--no-abbrev", f"--format={_GIT_LOG_FORMAT}", *log_args,
+        ]
+        with subprocess.Popen(args, stdout=subprocess.PIPE) as process:
+            assert process.stdout is not None
+            yield from _parse_git_log(self.path_to_repo, process.stdout)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, args)
+
+
+_REPOSITORY_BACKENDS = {
+    "pydriller": PydrillerBackend,
+    "git": GitBackend,
+}
+
+
+def get_repository_backend(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths
+) -> RepositoryBackend:
+    return _REPOSITORY_BACKENDS[proj_config["repo_backend"]](proj_config, proj_paths)
+
+
+def _git_repository_from_config(
+    proj_config: ProjectConfig, path_to_repo: str
+) -> Repository:
+    filters: Dict[str, str | datetime] = {}
+    if (
+        proj_config["start_repo_date"] is not None
+        and proj_config["end_repo_date"] is not None
+    ):
+        filters = dict(
+            since=proj_config["start_repo_date"],
+            to=proj_config["end_repo_date"],
+        )
+    elif proj_config["start_repo_date"] is not None:
+        filters = dict(since=proj_config["start_repo_date"])
+    elif (
+        proj_config["repo_from_tag"] is not None
+        and proj_config["repo_to_tag"] is not None
+    ):
+        filters = dict(
+            from_tag=proj_config["repo_from_tag"],
+            to_tag=proj_config["repo_to_tag"],
+        )
+    elif (
+        proj_config["repo_from_commit"] is not None
+        and proj_config["repo_to_commit"] is not None
+    ):
+        filters = dict(
+            from_commit=proj_config["repo_from_commit"],
+            to_commit=proj_config["repo_to_commit"],
+        )
+
+    r = Repository(
+        path_to_repo=path_to_repo,
+        only_modifications_with_file_types=proj_config["commit_file_types"],
+        order="reverse",
+        only_no_merge=True,
+        only_in_branch=proj_config["only_in_branch"],
+        **filters,  # type: ignore[arg-type]
+    )
+
+    print("_git_repository_from_config r")
+    print(r)
+
+    return r
+
+
+@lru_cache(maxsize=None)
+def _get_git(path_to_repo: str) -> Git:
+    """
+    One pydriller Git per process and repository, to look up commits directly by hash
+    instead of traversing the history.
+    """
+    return Git(path_to_repo)
+
+
+@lru_cache(maxsize=None)
+def _get_repo(path_to_repo: str) -> Repo:
+    return Repo(path_to_repo)
+
+
+def _get_rev_args(proj_config: ProjectConfig, path_to_repo: str) -> List[str]:
+    """
+    The revisions and date limits of _git_repository_from_config, as pydriller passes them
+    to git rev-list.
+    """
+    if proj_config["start_repo_date"] is not None:
+        args = [f"--since={_to_utc_text(proj_config['start_repo_date'])}"]
+        if proj_config["end_repo_date"] is not None:
+            args.append(f"--until={_to_utc_text(proj_config['end_repo_date'])}")
+        return args + [proj_config["only_in_branch"]]
+
+    from_rev, to_rev = None, None
+    if proj_config["repo_from_tag"] is not None and proj_config["repo_to_tag"] is not None:
+        from_rev, to_rev = proj_config["repo_from_tag"], proj_config["repo_to_tag"]
+    elif (
+        proj_config["repo_from_commit"] is not None
+        and proj_config["repo_to_commit"] is not None
+    ):
+        from_rev, to_rev = proj_config["repo_from_commit"], proj_config["repo_to_commit"]
+    if from_rev is None or to_rev is None:
+        return [proj_config["only_in_branch"]]
+
+    from_hash = _rev_parse(path_to_repo, f"{from_rev}^{{commit}}")[0]
+    # from the commit on, including it
+    parents = _rev_parse(path_to_repo, f"{from_hash}^@")
+    return [
+        f"--ancestry-path={from_hash}",
+        *(f"^{parent}" for parent in parents),
+        _rev_parse(path_to_repo, f"{to_rev}^{{commit}}")[0],
+    ]
+
+
+def _rev_parse(path_to_repo: str, rev: str) -> List[str]:
+    output = subprocess.run(
+        ["git", "-C", path_to_repo, "rev-parse", rev],
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+    return output.decode("utf-8").split()
+
+
+def _to_utc_text(date: datetime) -> str:
+    # pydriller takes dates without time zone as utc
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.isoformat()
+
+
+def _read_tokens(stream: IO[bytes]) -> Iterator[str]:
+    """
+    The NUL separated tokens of the stream, read in chunks.
+    """
+    rest = b""
+    for chunk in iter(lambda: stream.read(_READ_SIZE), b""):
+        tokens = (rest + chunk).split(b"\0")
+        rest = tokens.pop()
+        for token in tokens:
+            yield token.decode("utf-8", "replace")
+    if rest:
+        yield rest.decode("utf-8", "replace")
+
+
+def _parse_git_log(path_to_repo: str, stream: IO[bytes]) -> Iterator[GitLogCommit]:
+    """
+    Parses the output of git log -z --raw --numstat with the _GIT_LOG_FORMAT header.
+    The raw entries are ':modes blobs status' followed by one path, or by the old and new
+    path for renames and copies. The numstat entries are 'insertions<TAB>deletions<TAB>path',
+    with an empty path followed by the old and new path for renames.
+    """
+    tokens = _read_tokens(stream)
+    commit: Optional[GitLogCommit] = None
+    for token in tokens:
+        token = token.lstrip("\n")
+        if token.startswith(_COMMIT_MARKER):
+            if commit is not None:
+                yield commit
+            parents = next(tokens, "").split()
+            author = Developer(next(tokens, ""), next(tokens, ""))
+            committer_date = datetime.fromisoformat(next(tokens, ""))
+            commit = GitLogCommit(path_to_repo, token[1:], parents, author, committer_date)
+        elif commit is None or not token:
+            continue
+        elif token.startswith(":"):
+            _, _, old_blob_sha, new_blob_sha, status = token.split(" ")
+            if status[0] in "RC":
+                old_path: Optional[str] = next(tokens, "")
+                new_path: Optional[str] = next(tokens, "")
+            else:
+                path = next(tokens, "")
+                old_path = None if status[0] == "A" else path
+                new_path = None if status[0] == "D" else path
+                if _EMPTY_BLOB_SHA in (old_blob_sha, new_blob_sha):
+                    commit.paths_without_text_diff.add(path)
+            commit.changes.append((status[0], old_path, new_path))
+        else:
+            insertions, deletions, path = token.split("\t", 2)
+            if not path:
+                # the old and new path of a rename
+                next(tokens, "")
+                next(tokens, "")
+            elif insertions == "-":
+                commit.paths_without_text_diff.add(path)
+            commit.add_numstat(insertions, deletions)
+    if commit is not None:
+        yield commit
@@ -1,14 +1,58 @@
+import logging
+
 from .models import ProjectConfig, ProjectPaths
 from .git_repository_mining_util import git_traverse
+from .git_repository_mining_util_pool import git_traverse as git_traverse_pool
+from .git_repository_mining_util_redis import git_traverse as git_traverse_celery
+from .git_repository_mining_util_files import git_traverse as git_traverse_files
+from .repository_backend import get_repository_backend
+from .utils_sql import create_commit_based_tables, get_processed_commit_hashes
 
 
 def analyse_source_repository_data(
-    proj_config: ProjectConfig, proj_paths: ProjectPaths
+    proj_config: ProjectConfig,
+    proj_paths: ProjectPaths,
+    resume: bool = False,
+    nr_workers: int = 1,
+    use_celery: bool = False,
+    mode: str = "full",
 ) -> None:
-    if proj_config["repo_type"] == "Git":
-        git_traverse(proj_config, proj_paths)
+    if resume:
+        prepare_resume(proj_config, proj_paths, mode)
+    if proj_config["repo_type"] == "Git" and mode == "files":
+        git_traverse_files(proj_config, proj_paths, resume=resume)
+    elif proj_config["repo_type"] == "Git" and use_celery:
+        git_traverse_celery(proj_config, proj_paths, resume=resume)
+    elif proj_config["repo_type"] == "Git" and nr_workers > 1:
+        git_traverse_pool(proj_config, proj_paths, nr_workers, resume=resume)
+    elif proj_config["repo_type"] == "Git":
+        git_traverse(proj_config, proj_paths, resume=resume)
     else:
         print(
             f"Alternative repository {proj_config['repo_type']} implementation coming soon. "
         )
     print("finished analyse_source_repository_data")
+
+
+def prepare_resume(proj_config: ProjectConfig, proj_paths: ProjectPaths, mode: str) -> None:
+    """
+    A resumed run continues the traversal of the previous run, newest commit first. If the
+    branch has new commits since, they are newer than the processed history, but the interval
+    tables need the newest commits to be written first. The commit based tables are then written
+    again in traversal order, the commits in the commit data db of the project are not extracted
+    again. The tables of --mode files do not depend on the order, only the new commits are added.
+    """
+    processed_commit_hashes = get_processed_commit_hashes(proj_paths["path_to_project_db"])
+    if not processed_commit_hashes:
+        return
+    newest_commit = next(
+        iter(get_repository_backend(proj_config, proj_paths).traverse_commits()), None
+    )
+    if newest_commit is None or newest_commit.hash in processed_commit_hashes or mode == "files":
+        logging.info("Resume after %d processed commits", len(processed_commit_hashes))
+        return
+    logging.info(
+        "The branch has new commits up to %s, write the commit based tables again",
+        newest_commit.hash,
+    )
+    create_commit_based_tables(proj_paths["path_to_project_db"], drop=True)
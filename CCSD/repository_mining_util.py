@@ -1,19 +1,39 @@
 # %%
+import atexit
+import hashlib
 import os
+import re
 import subprocess
-from subprocess import Popen, PIPE
-from typing import Any, Callable, List, Tuple
+import tempfile
+import threading
+import time
+from subprocess import Popen
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
 import logging
-
-from importlib import reload
-
-from .models import ExtendedFunctionCall, FileData, FileImport, CallCommitInfo, CommitDates, FunctionCall
-from . import utils_py, models, utils_sql
-
-# %%
-reload(utils_sql)
-reload(models)
-
+from xml.parsers import expat
+from xml.sax.saxutils import quoteattr
+
+from .models import (
+    ExtendedFunctionCall,
+    FileChangeSets,
+    FileData,
+    FileImport,
+    CallCommitInfo,
+    CommitDates,
+    FunctionCall,
+    MethodData,
+)
+from . import utils_py
+from .subprocess_util import (
+    CommandResult,
+    LongLivedProcess,
+    command_slot,
+    get_command_timeout,
+    get_process_cpu_time,
+    record_command,
+    run_command,
+    run_command_to_file,
+)
 
 # %%
 # os.environ['COMSPEC']
@@ -25,9 +45,10 @@ reload(models)
 # Functions
 
 
-def save_source_code(file_path: str, source_text: str) -> None:
+def save_source_code(file_path: str, source_text: Optional[str], to_xml: bool = True) -> None:
     """
     Creates the dir and file if not existed.
+    Without to_xml the srcml conversion is left to the caller, see save_source_code_xml_batch.
     """
     if not os.path.exists(os.path.dirname(file_path)):
         os.makedirs(os.path.dirname(file_path))
@@ -55,7 +76,39 @@ def save_source_code(file_path: str, source_text: str) -> None:
         logging.error(file_path)
         logging.exception(err)
     f.close()
-    save_source_code_xml(file_path)
+    if to_xml:
+        save_source_code_xml(file_path)
+
+
+_PATH_TO_TMPFS = '/dev/shm'
+
+
+def get_scratch_dir(path_to_cache_dir: str) -> str:
+    """
+    Scratch directory of the cache directory on tmpfs, or in the temp directory if there is no tmpfs.
+    """
+    scratch_dir = _get_scratch_dir_path(path_to_cache_dir)
+    os.makedirs(scratch_dir, exist_ok=True)
+    return scratch_dir
+
+
+def remove_scratch_dir(path_to_cache_dir: str) -> None:
+    """
+    Removes the empty directories of the scratch area after the mining, the files of a commit
+    another process is still parsing are kept.
+    """
+    scratch_dir = _get_scratch_dir_path(path_to_cache_dir)
+    for dir_path, _, _ in os.walk(scratch_dir, topdown=False):
+        try:
+            os.rmdir(dir_path)
+        except OSError:
+            pass
+
+
+def _get_scratch_dir_path(path_to_cache_dir: str) -> str:
+    name = hashlib.sha1(os.path.abspath(path_to_cache_dir).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(
+        _PATH_TO_TMPFS if os.path.isdir(_PATH_TO_TMPFS) else tempfile.gettempdir(), f'ccsd_{name}')
 
 
 def delete_source_code(file_path: str) -> None:
@@ -78,21 +131,89 @@ def delete_empty_dir(dir_path: str) -> None:
 
 def save_source_code_xml(file_path: str) -> None:
     try:
-        _command_output_to_file(['srcml', file_path], f'{file_path}.xml')
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        logging.warning("srcml not found or failed. Skipping XML conversion. Error: %s", str(e))
+        run_command_to_file(['srcml', file_path], f'{file_path}.xml')
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError) as e:
+        logging.warning("srcml not found, failed or timed out. Skipping XML conversion. Error: %s", str(e))
         # Create an empty XML file as placeholder to prevent repeated attempts
         with open(f'{file_path}.xml', 'w', encoding='utf-8') as f:
             f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<unit/>')
 
 
-def save_source_code_diff_file(arg_prev: str, arg_curr: str, arg_target_file: str) -> None:
-    _command_output_to_file(['gumtree', 'textdiff', arg_prev, arg_curr], arg_target_file)
+def save_source_code_xml_batch(file_paths: List[str]) -> None:
+    """
+    Converts the files with one srcml call to an archive, which is split into the same
+    {file_path}.xml files as save_source_code_xml writes. Falls back to one srcml call per file.
+    """
+    if len(file_paths) > 1:
+        try:
+            result = run_command(['srcml', *file_paths])
+            units = {} if result.returncode or result.timed_out else _split_srcml_archive(result.stdout)
+        except (FileNotFoundError, expat.ExpatError) as e:
+            logging.warning("srcml batch failed. Convert files one by one. Error: %s", str(e))
+            units = {}
+        for file_path, xml in units.items():
+            with open(f'{file_path}.xml', 'w', encoding='utf-8') as f:
+                f.write(xml)
+        file_paths = [file_path for file_path in file_paths if file_path not in units]
+
+    for file_path in file_paths:
+        save_source_code_xml(file_path)
+
 
+_XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_UNIT_START_TAG = re.compile(rb"""<unit(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|'[^']*'))*\s*/?>""")
+_HASH_ATTRIBUTE = re.compile(rb"""\s+hash\s*=\s*(?:"[^"]*"|'[^']*')""")
 
-def _command_output_to_file(args: List[str], target_file: str) -> None:
-    with open(target_file, 'w', encoding='utf-8') as file:
-        subprocess.run(args, check=True, stdout=file)
+
+def _split_srcml_archive(archive: bytes) -> Dict[str, str]:
+    """
+    Returns the xml of every unit of the srcml archive by its file name, as srcml writes it for
+    the single file: the unit is copied from the archive, with the namespace declarations of the
+    archive and without the hash attribute the archive adds.
+    """
+    parser = expat.ParserCreate()
+    archive_namespaces: Dict[str, str] = {}
+    # the attributes and the offsets of the start tag and the end tag of every unit
+    units: List[Tuple[Dict[str, str], int, int]] = []
+    unit_start: Tuple[Dict[str, str], int] = ({}, 0)
+    depth = 0
+
+    def start_element(name: str, attributes: Dict[str, str]) -> None:
+        nonlocal depth, unit_start
+        depth += 1
+        if depth == 1:
+            archive_namespaces.update(
+                (key, value) for key, value in attributes.items() if key.split(':')[0] == 'xmlns')
+        elif depth == 2 and name == 'unit':
+            unit_start = (attributes, parser.CurrentByteIndex)
+
+    def end_element(name: str) -> None:
+        nonlocal depth
+        if depth == 2 and name == 'unit':
+            units.append((*unit_start, parser.CurrentByteIndex))
+        depth -= 1
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.Parse(archive, True)
+
+    unit_xmls = {}
+    for attributes, start, end in units:
+        start_tag = _UNIT_START_TAG.match(archive, start)
+        if start_tag is None:
+            raise expat.ExpatError(f"no unit start tag at byte {start}")
+        unit_xml = _XML_DECLARATION + b'<unit' + b''.join(
+            f' {key}={quoteattr(value)}'.encode('utf-8')
+            for key, value in archive_namespaces.items() if key not in attributes)
+        unit_xml += _HASH_ATTRIBUTE.sub(b'', start_tag.group()[len(b'<unit'):])
+        if not start_tag.group().endswith(b'/>'):
+            unit_xml += archive[start_tag.end():end] + b'</unit>'
+        unit_xmls[attributes.get('filename', 'None')] = (unit_xml + b'\n').decode('utf-8')
+    return unit_xmls
+
+
+def save_source_code_diff_file(arg_prev: str, arg_curr: str, arg_target_file: str) -> None:
+    run_command_to_file(['gumtree', 'textdiff', arg_prev, arg_curr], arg_target_file)
 
 
 def save_compact_xml_parsed_code(path_to_cache_dir: str, relative_file_path: str, source_text: str) -> None:
@@ -147,7 +268,9 @@ def get_file_type_validation_function(proj_lang: str) -> Callable[[str], bool]:
     return _FILE_TYPE_VALIDATION_FUNCTIONS[proj_lang]
 
 
-def get_file_imports(proj_lang: str, path_to_src_files: str, source_code: str, mod_file_data: FileData) -> List[FileImport]:
+def get_file_imports(
+    proj_lang: str, path_to_src_files: str, source_code: Optional[str], mod_file_data: FileData,
+) -> List[FileImport]:
     if source_code is None or len(source_code) == 0:
         logging.warning("sourcecode is empty.")
         return []
@@ -265,19 +388,136 @@ def get_import_file_data_java(path_to_src_files: str, code_line: str) -> Tuple[s
 
 
 def jar_wrapper(*args: str) -> List[bytes]:
-    with Popen(['java', '-jar', *args], stdout=PIPE, stderr=PIPE) as process:
-        assert process.stdout is not None
-        ret = []
-        while process.poll() is None:
-            line = process.stdout.readline()
-            if line != b'' and line.endswith(b'\n'):
-                ret.append(line[:-1])
-        stdout, stderr = process.communicate()
-        ret += stdout.split(b'\n')
-        if stderr != b'':
-            ret += stderr.split(b'\n')
-        ret.remove(b'')
-        return ret
+    """
+    Returns the stdout and then the stderr lines of the jar, a hung jar is killed after the command timeout.
+    """
+    result = run_command(['java', '-jar', *args])
+    return _output_lines(result.stdout, result.stderr)
+
+
+_PATH_TO_JAR_MAIN_SERVER = os.path.join(os.path.dirname(__file__), 'java', 'JarMainServer.java')
+# a jar service whose JVM died in that many calls in a row runs its calls with jar_wrapper
+_MAX_CONSECUTIVE_JAR_SERVICE_FAILURES = 3
+
+
+class JarService:
+    """
+    Client of a long-lived JVM (see java/JarMainServer.java) that runs the main class of a jar for
+    every call, instead of starting a new JVM per call as jar_wrapper does.
+    """
+
+    def __init__(self, path_to_jar: str) -> None:
+        self.path_to_jar = path_to_jar
+        self._process = LongLivedProcess(['java', _PATH_TO_JAR_MAIN_SERVER, path_to_jar])
+        self._lock = threading.Lock()
+        self._nr_consecutive_failures = 0
+
+    def run(self, *args: str) -> List[bytes]:
+        """
+        Returns the same lines as jar_wrapper(path_to_jar, *args), or no lines if the call timed out.
+        If the JVM died, e.g. because the jar called System.exit, the call is run with jar_wrapper and
+        the JVM is restarted on the next call. After a few failed calls in a row, all calls are run
+        with jar_wrapper.
+        """
+        with self._lock:
+            if self._nr_consecutive_failures >= _MAX_CONSECUTIVE_JAR_SERVICE_FAILURES:
+                return jar_wrapper(self.path_to_jar, *args)
+            try:
+                stdout, stderr = self._request(args)
+            except subprocess.TimeoutExpired as err:
+                logging.warning("Jar service %s killed. Error: %s", self.path_to_jar, str(err))
+                self._process.stop()
+                return []
+            except (OSError, ValueError) as err:
+                logging.warning("Jar service %s failed, run jar directly. Error: %s", self.path_to_jar, str(err))
+                self._process.stop()
+                self._nr_consecutive_failures += 1
+                if self._nr_consecutive_failures == _MAX_CONSECUTIVE_JAR_SERVICE_FAILURES:
+                    logging.warning("Jar service %s disabled after %d failed calls in a row",
+                                    self.path_to_jar, self._nr_consecutive_failures)
+                return jar_wrapper(self.path_to_jar, *args)
+            self._nr_consecutive_failures = 0
+        return _output_lines(stdout, stderr)
+
+    def close(self) -> None:
+        with self._lock:
+            self._process.stop()
+
+    def _request(self, args: Tuple[str, ...]) -> Tuple[bytes, bytes]:
+        # a request takes a slot of the concurrent commands and is counted in the java command stats
+        with command_slot():
+            start_time = time.monotonic()
+            process = self._process.get()
+            start_cpu_time_s = get_process_cpu_time(process.pid)
+            stdout, stderr = b'', b''
+            timed_out = threading.Event()
+            try:
+                stdout, stderr = self._read_response(process, args, timed_out)
+            finally:
+                record_command('java', CommandResult(
+                    returncode=process.poll() or 0,
+                    stdout=stdout,
+                    stderr=stderr,
+                    timed_out=timed_out.is_set(),
+                    wall_time_s=time.monotonic() - start_time,
+                    cpu_time_s=max(0.0, get_process_cpu_time(process.pid) - start_cpu_time_s)))
+        return stdout, stderr
+
+    def _read_response(self, process: Popen[bytes], args: Tuple[str, ...],
+                       timed_out: threading.Event) -> Tuple[bytes, bytes]:
+        assert process.stdin is not None and process.stdout is not None
+        # a hung parse kills the JVM, a read that fails after the kill is a timeout, not a failed JVM
+        timer = threading.Timer(get_command_timeout(), _kill_jar_service, (process, timed_out))
+        timer.start()
+        try:
+            process.stdin.write('\0'.join(args).encode('utf-8') + b'\n')
+            process.stdin.flush()
+            header = process.stdout.readline()
+            if header == b'':
+                raise OSError(f"jar service exited with {process.wait()}")
+            stdout_length, stderr_length = (int(length) for length in header.split())
+            return _read_bytes(process.stdout, stdout_length), _read_bytes(process.stdout, stderr_length)
+        except (OSError, ValueError) as err:
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(args, get_command_timeout()) from err
+            raise
+        finally:
+            timer.cancel()
+
+
+_JAR_SERVICES: Dict[str, JarService] = {}
+
+
+def get_jar_service(path_to_jar: str) -> JarService:
+    if path_to_jar not in _JAR_SERVICES:
+        _JAR_SERVICES[path_to_jar] = JarService(path_to_jar)
+    return _JAR_SERVICES[path_to_jar]
+
+
+@atexit.register
+def close_jar_services() -> None:
+    for jar_service in _JAR_SERVICES.values():
+        jar_service.close()
+
+
+def _kill_jar_service(process: Popen[bytes], timed_out: threading.Event) -> None:
+    timed_out.set()
+    process.kill()
+
+
+def _read_bytes(stream: IO[bytes], length: int) -> bytes:
+    data = stream.read(length)
+    if len(data) != length:
+        raise OSError("jar service closed its output")
+    return data
+
+
+def _output_lines(stdout: bytes, stderr: bytes) -> List[bytes]:
+    lines = stdout.split(b'\n')
+    if stderr != b'':
+        lines += stderr.split(b'\n')
+    lines.remove(b'')
+    return lines
 
 
 def read_xml_diffs_from_file(_file_path: str) -> None:
@@ -352,6 +592,44 @@ def get_unqualified_name(base_name: str) -> str:
     return base_name
 
 
+def get_file_change_sets(
+    methods_before: List[MethodData],
+    methods: List[MethodData],
+    changed_methods: List[MethodData],
+    file_imports: List[FileImport],
+    file_imports_prev: List[FileImport],
+) -> FileChangeSets:
+    """
+    Splits the functions and file imports of a file change into added, deleted, changed and
+    unchanged ones, by function long name and import file path.
+    """
+    previous_functions = frozenset(f.long_name for f in methods_before)
+    current_functions = frozenset(f.long_name for f in methods)
+    # get added functions (existing in curr but not prev)
+    added_functions = current_functions - previous_functions
+    # get deleted functions (existing in prev but not in curr)
+    deleted_functions = previous_functions - current_functions
+    # get just changed functions
+    changed_functions = (
+        frozenset(f.long_name for f in changed_methods) - added_functions - deleted_functions
+    )
+
+    curr_file_imports = frozenset(fi.get_import_file_path() for fi in file_imports)
+    prev_file_imports = frozenset(fi.get_import_file_path() for fi in file_imports_prev)
+
+    return FileChangeSets(
+        previous_functions=previous_functions,
+        added_functions=added_functions,
+        deleted_functions=deleted_functions,
+        changed_functions=changed_functions,
+        # get not changed functions
+        unchanged_functions=(previous_functions & current_functions) - changed_functions,
+        added_file_imports=curr_file_imports - prev_file_imports,
+        deleted_file_imports=prev_file_imports - curr_file_imports,
+        unchanged_file_imports=curr_file_imports & prev_file_imports,
+    )
+
+
 def set_hashes_to_function_calls(
     curr_function_calls: List[FunctionCall], prev_function_calls: List[FunctionCall], cm_dates: CommitDates,
 ) -> Tuple[List[ExtendedFunctionCall], List[ExtendedFunctionCall]]:
@@ -403,10 +681,11 @@ def set_hashes_to_function_calls(
     logging.debug("CURR FUNCTION CALLS Qty: %d", len(curr_function_calls))
 
     # Called functions
-    added_calls = list(set(curr_function_calls) - set(prev_function_calls))
-    deleted_calls = list(set(prev_function_calls) - set(curr_function_calls))
-    unchanged_calls = list(
-        set(prev_function_calls).intersection(curr_function_calls))
+    curr_calls = set(curr_function_calls)
+    prev_calls = set(prev_function_calls)
+    added_calls = list(curr_calls - prev_calls)
+    deleted_calls = list(prev_calls - curr_calls)
+    unchanged_calls = list(prev_calls & curr_calls)
 
     rows_curr: List[ExtendedFunctionCall] = []
 
@@ -0,0 +1,241 @@
+"""
+Execution of the external tools (java, srcml, gumtree) with a timeout, a bounded number of
+concurrent processes and wall and cpu time statistics per tool.
+"""
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+_DEFAULT_TIMEOUT_S = 300.0
+
+
+class CommandResult(NamedTuple):
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    timed_out: bool
+    wall_time_s: float
+    cpu_time_s: float
+
+
+class CommandStats:
+    def __init__(self) -> None:
+        self.nr_calls = 0
+        self.nr_timeouts = 0
+        self.wall_time_s = 0.0
+        self.cpu_time_s = 0.0
+        self.max_wall_time_s = 0.0
+
+    def add(self, result: CommandResult) -> None:
+        self.nr_calls += 1
+        self.nr_timeouts += int(result.timed_out)
+        self.wall_time_s += result.wall_time_s
+        self.cpu_time_s += result.cpu_time_s
+        self.max_wall_time_s = max(self.max_wall_time_s, result.wall_time_s)
+
+    def __str__(self) -> str:
+        return (
+            f"CommandStats [nr_calls: {self.nr_calls}, nr_timeouts: {self.nr_timeouts}, "
+            f"wall_time_s: {self.wall_time_s:.1f}, cpu_time_s: {self.cpu_time_s:.1f}, "
+            f"max_wall_time_s: {self.max_wall_time_s:.1f}]"
+        )
+
+
+class _CommandRunner:
+    """
+    Settings and statistics of the commands run by this process.
+    """
+
+    def __init__(self) -> None:
+        self.timeout_s = _DEFAULT_TIMEOUT_S
+        self.slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+        self.stats: Dict[str, CommandStats] = {}
+        self.stats_lock = threading.Lock()
+
+
+_RUNNER = _CommandRunner()
+
+
+def configure_commands(timeout_s: float, max_concurrent_commands: int) -> None:
+    """
+    Sets the timeout of a command and the number of commands that may run at the same time,
+    0 for the number of cpus.
+    """
+    _RUNNER.timeout_s = timeout_s
+    _RUNNER.slots = threading.BoundedSemaphore(
+        max_concurrent_commands if max_concurrent_commands > 0 else os.cpu_count() or 1
+    )
+
+
+def get_command_timeout() -> float:
+    return _RUNNER.timeout_s
+
+
+def run_command(
+    args: List[str],
+    stdout: Optional[IO[str]] = None,
+    timeout_s: Optional[float] = None,
+) -> CommandResult:
+    """
+    Runs the command without polling. On timeout the whole process group of the command is
+    killed. If stdout is given, the output is written to it instead of being returned.
+    """
+    timeout_s = _RUNNER.timeout_s if timeout_s is None else timeout_s
+    with _RUNNER.slots:
+        start_time = time.monotonic()
+        with subprocess.Popen(
+            args,
+            stdout=stdout if stdout is not None else subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        ) as process:
+            timed_out = threading.Event()
+            timer = threading.Timer(timeout_s, _kill, (process, timed_out))
+            timer.start()
+            try:
+                out, err = _read_output(process)
+                # reap the process here to get its resource usage
+                _, status, rusage = os.wait4(process.pid, 0)
+            finally:
+                timer.cancel()
+            process.returncode = os.waitstatus_to_exitcode(status)
+
+    result = CommandResult(
+        returncode=process.returncode,
+        stdout=out,
+        stderr=err,
+        timed_out=timed_out.is_set(),
+        wall_time_s=time.monotonic() - start_time,
+        cpu_time_s=rusage.ru_utime + rusage.ru_stime,
+    )
+    record_command(os.path.basename(args[0]), result)
+    if result.timed_out:
+        logging.warning("Killed after %.0fs: %s", timeout_s, " ".join(args))
+    return result
+
+
+def run_command_to_file(args: List[str], target_file: str) -> None:
+    """
+    Writes the output of the command to target_file, raises like subprocess.run with check=True.
+    """
+    with open(target_file, "w", encoding="utf-8") as file:
+        result = run_command(args, stdout=file)
+    if result.timed_out:
+        raise subprocess.TimeoutExpired(args, _RUNNER.timeout_s, stderr=result.stderr)
+    if result.returncode:
+        raise subprocess.CalledProcessError(result.returncode, args, stderr=result.stderr)
+
+
+@contextmanager
+def command_slot() -> Iterator[None]:
+    """
+    Holds one of the max_concurrent_commands slots, for a request to a long-lived process
+    that is not run with run_command.
+    """
+    with _RUNNER.slots:
+        yield
+
+
+class LongLivedProcess:
+    """
+    A process that serves the requests written to its stdin, on its stdout. It is started on
+    the first use and again after it exited. A forked child process starts its own process
+    instead of sharing the one of its parent.
+    """
+
+    def __init__(self, args: List[str]) -> None:
+        self.args = args
+        self.popen: Optional["subprocess.Popen[bytes]"] = None
+        self._pid = os.getpid()
+
+    def get(self) -> "subprocess.Popen[bytes]":
+        if self._pid != os.getpid():
+            self.popen = None
+            self._pid = os.getpid()
+        if self.popen is None or self.popen.poll() is not None:
+            self.popen = subprocess.Popen(  # pylint: disable=consider-using-with
+                self.args, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+        return self.popen
+
+    def stop(self) -> None:
+        """
+        Closes the stdin of the process and waits for it to exit, it is killed if it does not.
+        """
+        if self.popen is None or self._pid != os.getpid():
+            return
+        if self.popen.stdin is not None:
+            try:
+                self.popen.stdin.close()
+            except OSError:
+                pass
+        try:
+            self.popen.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.popen.kill()
+            self.popen.wait()
+        if self.popen.stdout is not None:
+            self.popen.stdout.close()
+        self.popen = None
+
+
+def get_process_cpu_time(pid: int) -> float:
+    """
+    The user and system cpu time of a running process, 0 if it is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def get_command_stats() -> Dict[str, CommandStats]:
+    with _RUNNER.stats_lock:
+        return dict(_RUNNER.stats)
+
+
+def log_command_stats() -> None:
+    for command, stats in get_command_stats().items():
+        logging.info("%s %s", command, stats)
+
+
+def _read_output(process: "subprocess.Popen[bytes]") -> Tuple[bytes, bytes]:
+    # stderr is read by a thread, so that neither pipe can fill up and block the process
+    err_chunks: List[bytes] = []
+
+    def read_err(stream: IO[bytes]) -> None:
+        err_chunks.append(stream.read())
+
+    assert process.stderr is not None
+    err_reader = threading.Thread(target=read_err, args=(process.stderr,))
+    err_reader.start()
+    out = process.stdout.read() if process.stdout is not None else b""
+    err_reader.join()
+    return out, b"".join(err_chunks)
+
+
+def _kill(process: "subprocess.Popen[bytes]", timed_out: threading.Event) -> None:
+    timed_out.set()
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def record_command(command: str, result: CommandResult) -> None:
+    logging.debug(
+        "%s returned %d, wall %.3fs, cpu %.3fs",
+        command,
+        result.returncode,
+        result.wall_time_s,
+        result.cpu_time_s,
+    )
+    with _RUNNER.stats_lock:
+        _RUNNER.stats.setdefault(command, CommandStats()).add(result)
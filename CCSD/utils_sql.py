@@ -1,10 +1,13 @@
+# pylint: disable=too-many-lines
 import logging
 import os
 import sqlite3
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List
+from typing import Iterator, Optional, List, Set, Tuple
 
-from pydriller.domain.commit import Commit, ModifiedFile, ModificationType
+from pydriller.domain.commit import ModificationType
 
 from .models import (
     ExtendedFunctionCall,
@@ -12,8 +15,13 @@ from .models import (
     CallCommitInfo,
     ActionClass,
     FileData,
+    FileChangeData,
+    FileChangeSets,
+    GitCommitData,
+    MethodData,
     ProjectPaths,
 )
+from .open_interval_index import OpenIntervalIndex
 
 
 def create_db_tables(proj_paths: ProjectPaths, drop: bool = False) -> None:
@@ -33,45 +41,102 @@ def create_db_tables(proj_paths: ProjectPaths, drop: bool = False) -> None:
     create_commit_based_tables(proj_paths["path_to_project_db"], drop)
 
 
+_COMMIT_BASED_TABLES = (
+    "git_commit",
+    "file_commit",
+    "function_commit",
+    "file_import",
+    "call_commit",
+    "function_to_file",
+    "function_call",
+    "raw_function_call",
+    "processed_commit",
+)
+
+
+# partial indexes of the open rows of the interval tables, that the writer looks up per file
+_OPEN_INTERVAL_INDEXES = {
+    "file_import_open": ("file_import", ("file_path", "import_file_path")),
+    "function_to_file_open": ("function_to_file", ("file_path", "function_long_name")),
+    "raw_function_call_open": (
+        "raw_function_call",
+        (
+            "file_path",
+            "calling_function_unqualified_name",
+            "calling_function_nr_parameters",
+            "called_function_unqualified_name",
+        ),
+    ),
+}
+
+# generated calendar columns of a commit datetime column {0}, in utc like date(). The iso week
+# is the week of the thursday of the week, the iso year the year of that thursday.
+CALENDAR_COLUMNS = {
+    "commit_year": "CAST(strftime('%Y', date({0})) AS integer)",
+    "commit_month": "CAST(strftime('%m', date({0})) AS integer)",
+    "commit_iso_year": "CAST(strftime('%Y', date({0}, '-3 days', 'weekday 4')) AS integer)",
+    "commit_iso_week": "(strftime('%j', date({0}, '-3 days', 'weekday 4')) - 1) / 7 + 1",
+}
+
+# change counts of file_commit per key column, year column and period column for the change
+# proneness analyses, the writer adds its new file_commit rows to them before each commit. An
+# iso week is counted in its iso year, e.g. 2021-01-01 is in week 53 of 2020.
+_CHANGE_ROLLUPS = {
+    "file_change_month": ("file_name", "commit_year", "commit_month"),
+    "file_change_week": ("file_name", "commit_iso_year", "commit_iso_week"),
+    "dir_change_month": ("file_dir_path", "commit_year", "commit_month"),
+    "dir_change_week": ("file_dir_path", "commit_iso_year", "commit_iso_week"),
+}
+
+# covering indexes of the analytics and notebook queries, created after the mining
+_ANALYTICS_INDEXES = {
+    "file_commit_commit_hash": ("file_commit", ("commit_hash", "file_name")),
+    "file_commit_file_name_month": ("file_commit", ("file_name", "commit_year", "commit_month")),
+    "file_commit_file_name_week": (
+        "file_commit",
+        ("file_name", "commit_iso_year", "commit_iso_week"),
+    ),
+    "file_commit_file_dir_path_month": (
+        "file_commit",
+        ("file_dir_path", "change_type", "commit_year", "commit_month"),
+    ),
+    "file_commit_file_dir_path_week": (
+        "file_commit",
+        ("file_dir_path", "change_type", "commit_iso_year", "commit_iso_week"),
+    ),
+    "file_commit_month": ("file_commit", ("commit_year", "commit_month", "file_name")),
+    "file_import_file_name": ("file_import", ("file_name", "import_file_pkg")),
+}
+
+# PRAGMA profile of the writer connection, the journal mode is set back on close so that the
+# db stays a single file for the notebooks
+_MINING_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
 def create_commit_based_tables(path_to_project_db: str, drop: bool = False) -> None:
     print("create_commit_based_tables drop", drop)
     con = sqlite3.connect(path_to_project_db)
     cur = con.cursor()
 
     if drop:
-        try:
-            cur.execute("""DROP TABLE git_commit""")
-        except sqlite3.Error as error:
-            logging.debug("git_commit %s", error)
-        try:
-            cur.execute("""DROP TABLE file_commit""")
-        except sqlite3.Error as error:
-            logging.debug("file_commit %s", error)
-        try:
-            cur.execute("""DROP TABLE function_commit""")
-        except sqlite3.Error as error:
-            logging.debug("function_commit %s", error)
-        try:
-            cur.execute("""DROP TABLE file_import""")
-        except sqlite3.Error as error:
-            logging.debug("file_import %s", error)
-        try:
-            cur.execute("""DROP TABLE call_commit""")
-        except sqlite3.Error as error:
-            logging.debug("call_commit %s", error)
-        try:
-            cur.execute("""DROP TABLE function_to_file""")
-        except sqlite3.Error as error:
-            logging.debug("function_to_file %s", error)
-        try:
-            cur.execute("""DROP TABLE function_call""")
-        except sqlite3.Error as error:
-            logging.debug("function_call %s", error)
-        try:
-            cur.execute("""DROP TABLE raw_function_call""")
-        except sqlite3.Error as error:
-            logging.debug("raw_function_call %s", error)
+        for table in (*_COMMIT_BASED_TABLES, *_CHANGE_ROLLUPS):
+            try:
+                cur.execute(f"""DROP TABLE {table}""")
+            except sqlite3.Error as error:
+                logging.debug("%s %s", table, error)
+
+    _create_commit_based_tables(cur)
+    con.commit()
+    cur.close()
+    print("finished create_commit_based_tables")
+
 
+def _create_commit_based_tables(cur: sqlite3.Cursor) -> None:
     cur.execute(
         """CREATE TABLE IF NOT EXISTS git_commit
                 (commit_hash text, commit_commiter_datetime text, author text,
@@ -90,6 +155,7 @@ def create_commit_based_tables(path_to_project_db: str, drop: bool = False) -> N
                 path_change integer,
                 primary key (file_path, commit_hash))"""
     )
+    add_calendar_columns(cur, "file_commit", "commit_commiter_datetime")
 
     cur.execute(
         """CREATE TABLE IF NOT EXISTS function_commit
@@ -160,273 +226,560 @@ def create_commit_based_tables(path_to_project_db: str, drop: bool = False) -> N
                 called_function_unqualified_name, commit_hash_start, commit_hash_oldest, commit_hash_end))"""
     )
 
-    con.commit()
-    cur.close()
-    print("finished create_commit_based_tables")
+    # checkpoint of the git commits whose rows have been completely written
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS processed_commit
+                (commit_hash text, processed_datetime text,
+                primary key (commit_hash))"""
+    )
 
+    for index, (table, columns) in _OPEN_INTERVAL_INDEXES.items():
+        cur.execute(
+            f"""CREATE INDEX IF NOT EXISTS {index}
+            ON {table} ({", ".join(columns)}) WHERE closed = 0"""
+        )
 
-def insert_git_commit(
-    path_to_project_db: str,
-    commit_hash: Optional[str] = None,
-    commit_commiter_datetime: Optional[str] = None,
-    author: Optional[str] = None,
-    in_main_branch: Optional[bool] = None,
-    merge: Optional[bool] = None,
-    nr_modified_files: Optional[int] = None,
-    nr_deletions: Optional[int] = None,
-    nr_insertions: Optional[int] = None,
-    nr_lines: Optional[int] = None,
-) -> None:
-    try:
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
+    _create_change_rollups(cur)
 
-        sql_string = f"""INSERT INTO git_commit
-                    (commit_hash, commit_commiter_datetime, author,
-                    in_main_branch, merge,
-                    nr_modified_files, nr_deletions, nr_insertions, nr_lines)
-                VALUES (
-                    '{commit_hash}','{commit_commiter_datetime}','{author}','{in_main_branch}','{merge}','{nr_modified_files}','{nr_deletions}',
-                    '{nr_insertions}','{nr_lines}'
-                );"""
 
-        cur.execute(sql_string)
-        con_analytics_db.commit()
-        cur.close()
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        print(f"IntegrityError. UNIQUE failed for [{commit_hash}] ")
-        logging.error("[%s] ", commit_hash)
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
+def _create_change_rollups(cur: sqlite3.Cursor) -> None:
+    """
+    Creates the _CHANGE_ROLLUPS tables, a rollup table that is new is filled from the rows
+    already in file_commit, e.g. of a db of an older version.
+    """
+    for table, (key_column, year_column, period_column) in _CHANGE_ROLLUPS.items():
+        columns = {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+        if columns and year_column not in columns:
+            # the week rollups of older versions are counted by calendar year
+            cur.execute(f"DROP TABLE {table}")
+            columns = set()
+        cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table}
+                ({key_column} text, {year_column} integer, {period_column} integer,
+                nr_changes integer, nr_deletions integer,
+                primary key ({key_column}, {year_column}, {period_column})) WITHOUT ROWID"""
         )
+        if not columns:
+            _update_change_rollup(cur, table, 0)
 
 
-def insert_file_commit(
-    path_to_project_db: str,
-    mod_file_data: FileData,
-    commit_hash: str,
-    commit_commiter_datetime: datetime,
-    commit_file_name: str,
-    commit_new_path: Optional[str],
-    commit_old_path: Optional[str],
-    change_type: ModificationType,
-) -> None:
-    try:
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
+def _update_change_rollups(cur: sqlite3.Cursor, from_rowid: int) -> int:
+    """
+    Adds the file_commit rows after from_rowid to the counts of the rollup tables.
+    Returns the rowid of the last file_commit row, to continue from.
+    """
+    for table in _CHANGE_ROLLUPS:
+        _update_change_rollup(cur, table, from_rowid)
+    return int(cur.execute("SELECT IFNULL(MAX(rowid), 0) FROM file_commit").fetchone()[0])
 
-        path_change = 0 if commit_new_path == commit_old_path else 1
 
-        sql_string = f"""INSERT INTO file_commit
-                    (file_name, file_dir_path, file_path,
-                    commit_hash, commit_commiter_datetime, commit_file_name,
-                    commit_new_path, commit_old_path, change_type, path_change)
-                VALUES (
-                    '{mod_file_data.get_file_name()}','{mod_file_data.get_file_dir_path()}','{mod_file_data.get_file_path()}','{commit_hash}',
-                    '{commit_commiter_datetime}','{commit_file_name}','{commit_new_path}','{commit_old_path}','{change_type}','{path_change}'
-                );"""
+def _update_change_rollup(cur: sqlite3.Cursor, table: str, from_rowid: int) -> None:
+    """
+    Rows with a null key, e.g. without a datetime, are not counted.
+    """
+    key_columns = _CHANGE_ROLLUPS[table]
+    key_list = ", ".join(key_columns)
+    cur.execute(
+        f"""INSERT INTO {table} ({key_list}, nr_changes, nr_deletions)
+        SELECT {key_list}, COUNT(*), SUM(change_type = '{ModificationType.DELETE}')
+        FROM file_commit
+        WHERE rowid > ? AND {" AND ".join(f"{column} IS NOT NULL" for column in key_columns)}
+        GROUP BY {key_list}
+        ON CONFLICT ({key_list}) DO UPDATE SET
+            nr_changes = nr_changes + excluded.nr_changes,
+            nr_deletions = nr_deletions + excluded.nr_deletions""",
+        (from_rowid,),
+    )
 
-        cur.execute(sql_string)
-        con_analytics_db.commit()
-        cur.close()
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        print(
-            f"IntegrityError. UNIQUE failed for [{commit_hash},{mod_file_data.get_file_path()}] "
-        )
-        logging.error("[%s,%s] ", commit_hash, mod_file_data.get_file_path())
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
-        )
+
+def add_calendar_columns(cur: sqlite3.Cursor, table: str, datetime_column: str) -> None:
+    """
+    Adds the CALENDAR_COLUMNS of the datetime column that the table does not have yet, as
+    virtual generated columns, so that dbs of older versions get them too.
+    """
+    columns = {row[1] for row in cur.execute(f"PRAGMA table_xinfo({table})").fetchall()}
+    for column, expression in CALENDAR_COLUMNS.items():
+        if column not in columns:
+            cur.execute(
+                f"""ALTER TABLE {table} ADD COLUMN {column} integer
+                GENERATED ALWAYS AS ({expression.format(datetime_column)}) VIRTUAL"""
+            )
 
 
-def get_previous_file_import_long_names(
-    path_to_project_db: str, mod_file_data: FileData
-) -> Optional[List[str]]:
+def create_analytics_indexes(path_to_project_db: str) -> None:
+    """
+    Creates the covering indexes of the analytics queries, they are not maintained during the
+    mining.
+    """
+    con = sqlite3.connect(path_to_project_db)
     try:
+        with con:
+            for index, (table, columns) in _ANALYTICS_INDEXES.items():
+                con.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(columns)})")
+            con.execute("ANALYZE")
+    except sqlite3.Error as err:
+        _log_sqlite_error(err)
+    finally:
+        con.close()
 
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
 
-        sql_string = f"""SELECT import_file_path
-        FROM file_import
-        WHERE file_path = '{mod_file_data.get_file_path()}'
-        AND closed = 0"""
+def get_processed_commit_hashes(path_to_project_db: str) -> Set[str]:
+    with sqlite3.connect(path_to_project_db) as con:
+        return {row[0] for row in con.execute("SELECT commit_hash FROM processed_commit")}
 
-        cur.execute(sql_string)
-        result = cur.fetchall()
 
-        con_analytics_db.commit()
-        cur.close()
-        return result
+class AnalyticsDbWriter:  # pylint: disable=too-many-instance-attributes
+    """
+    Writes the mining results into the analytics database through one connection.
 
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
+    The writer is meant to be owned by the traversal for the whole run. All statements are
+    parameterized, row sets are written with executemany and the transaction is only committed
+    every commit_interval git commits, instead of once per written row set.
+    """
+
+    def __init__(self, path_to_project_db: str, commit_interval: int = 1) -> None:
+        self.path_to_project_db = path_to_project_db
+        self.commit_interval = max(commit_interval, 1)
+        self.con = sqlite3.connect(path_to_project_db)
+        self.cur = self.con.cursor()
+        for pragma in _MINING_PRAGMAS:
+            self.cur.execute(pragma)
+        self._git_commit_hash: Optional[str] = None
+        self._nr_uncommitted_git_commits = 0
+        self._create_staging_tables()
+        # a db of an older version, e.g. mined with --no-init-db, gets its rollups here
+        _create_change_rollups(self.cur)
+        self.con.commit()
+        self._rolled_up_rowid = self.cur.execute(
+            "SELECT IFNULL(MAX(rowid), 0) FROM file_commit"
+        ).fetchone()[0]
+        self._open_file_imports = OpenIntervalIndex("file_import", "import_file_path")
+        self._open_functions = OpenIntervalIndex("function_to_file", "function_long_name")
+
+    def __enter__(self) -> "AnalyticsDbWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Commits all finished git commits and closes the connection.
+        Rows of a git commit that was not ended are discarded.
+        """
+        if self._git_commit_hash is not None:
+            logging.warning(
+                "Discard the rows of unfinished git commit %s.", self._git_commit_hash
+            )
+            self.cur.execute("ROLLBACK TO SAVEPOINT git_commit")
+            self.cur.execute("RELEASE SAVEPOINT git_commit")
+            self._git_commit_hash = None
+            self._open_file_imports.clear()
+            self._open_functions.clear()
+        self._commit()
+        try:
+            self.cur.execute("PRAGMA journal_mode = DELETE")
+        except sqlite3.Error as err:
+            # another connection still reads the db, it stays in WAL mode
+            _log_sqlite_error(err)
+        self.cur.close()
+        self.con.close()
+
+    def begin_git_commit(self, commit_hash: str) -> None:
+        self._begin_transaction()
+        self.cur.execute("SAVEPOINT git_commit")
+        self._git_commit_hash = commit_hash
+
+    def end_git_commit(self) -> None:
+        """
+        Records the git commit in the processed_commit checkpoint, in the same transaction as its rows.
+        """
+        self.cur.execute(
+            """INSERT OR REPLACE INTO processed_commit (commit_hash, processed_datetime)
+            VALUES (?, ?);""",
+            (self._git_commit_hash, str(datetime.now())),
+        )
+        self.cur.execute("RELEASE SAVEPOINT git_commit")
+        self._git_commit_hash = None
+        self._nr_uncommitted_git_commits += 1
+        if self._nr_uncommitted_git_commits >= self.commit_interval:
+            self._commit()
+            self._nr_uncommitted_git_commits = 0
+
+    def _commit(self) -> None:
+        """
+        Adds the file_commit rows of the transaction to the rollups, then commits it.
+        """
+        try:
+            self._rolled_up_rowid = _update_change_rollups(self.cur, self._rolled_up_rowid)
+        except sqlite3.Error as err:
+            # the rows are added with the next commit
+            _log_sqlite_error(err)
+        self.con.commit()
+
+    def _create_staging_tables(self) -> None:
+        """
+        Connection local tables the rows of one file change are loaded into, to update the
+        interval tables with one statement per kind of change instead of one per row.
+        """
+        self.cur.execute(
+            """CREATE TEMP TABLE IF NOT EXISTS staged_function_call
+                (staged_id integer primary key,
+                calling_function_unqualified_name text, calling_function_nr_parameters integer,
+                called_function_unqualified_name text,
+                commit_hash_start text, commit_start_datetime text,
+                commit_hash_oldest text, commit_oldest_datetime text,
+                commit_hash_end text, commit_end_datetime text)"""
+        )
+        # the open raw_function_call rows of the staged function calls
+        self.cur.execute(
+            """CREATE TEMP TABLE IF NOT EXISTS staged_function_call_match
+                (row_id integer, staged_id integer,
+                commit_hash_start text, commit_start_datetime text,
+                commit_hash_oldest text, commit_oldest_datetime text,
+                commit_hash_end text, commit_end_datetime text)"""
+        )
+        self.cur.execute(
+            """CREATE TEMP TABLE IF NOT EXISTS staged_function
+                (function_unqualified_name text, function_name text,
+                function_long_name text, function_parameters text,
+                change text, occurrence integer, last_occurrence integer,
+                matched integer)"""
         )
-        return None
 
+    def _stage_function_calls(
+        self,
+        cur: sqlite3.Cursor,
+        rows: List[ExtendedFunctionCall],
+        mod_file_data: FileData,
+        match_condition: str,
+    ) -> None:
+        """
+        Loads the rows into staged_function_call and their open raw_function_call rows
+        that fulfill match_condition into staged_function_call_match. The index of
+        raw_function_call is searched once per staged row.
+        """
+        cur.execute("DELETE FROM staged_function_call")
+        cur.execute("DELETE FROM staged_function_call_match")
+        cur.executemany(
+            """INSERT INTO staged_function_call
+                (calling_function_unqualified_name, calling_function_nr_parameters,
+                called_function_unqualified_name,
+                commit_hash_start, commit_start_datetime,
+                commit_hash_oldest, commit_oldest_datetime,
+                commit_hash_end, commit_end_datetime)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+            [
+                (
+                    *_function_call_key(fc),
+                    fc.commit_hash_start,
+                    _to_text(fc.commit_start_datetime),
+                    fc.commit_hash_oldest,
+                    _to_text(fc.commit_oldest_datetime),
+                    fc.commit_hash_end,
+                    _to_text(fc.commit_end_datetime),
+                )
+                for fc in rows
+            ],
+        )
+        # the cross join keeps the staged rows as the outer loop
+        cur.execute(
+            f"""INSERT INTO staged_function_call_match
+                SELECT r.rowid, s.staged_id,
+                    s.commit_hash_start, s.commit_start_datetime,
+                    s.commit_hash_oldest, s.commit_oldest_datetime,
+                    s.commit_hash_end, s.commit_end_datetime
+                FROM staged_function_call AS s CROSS JOIN raw_function_call AS r
+                WHERE r.file_path = ?
+                AND r.calling_function_unqualified_name = s.calling_function_unqualified_name
+                AND r.calling_function_nr_parameters = s.calling_function_nr_parameters
+                AND r.called_function_unqualified_name = s.called_function_unqualified_name
+                AND r.closed = 0
+                AND {match_condition};""",
+            (mod_file_data.get_file_path(),),
+        )
 
-def update_file_imports(
-    mod_file_data: FileData,
-    fis: List[FileImport],
-    fis_prev: List[FileImport],
-    path_to_project_db: str,
-    commit_hash: str,
-    commit_datetime: str,
-) -> None:
+    def _begin_transaction(self) -> None:
+        # a savepoint outside of a transaction would commit on release
+        if not self.con.in_transaction:
+            self.cur.execute("BEGIN")
+
+    @contextmanager
+    def _savepoint(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Groups the statements of one writer call, a failing call only discards its own rows.
+        """
+        self._begin_transaction()
+        self.cur.execute("SAVEPOINT writer_call")
+        try:
+            yield self.cur
+        except sqlite3.Error:
+            self.cur.execute("ROLLBACK TO SAVEPOINT writer_call")
+            self.cur.execute("RELEASE SAVEPOINT writer_call")
+            raise
+        self.cur.execute("RELEASE SAVEPOINT writer_call")
+
+    def insert_git_commit(
+        self,
+        commit_hash: Optional[str] = None,
+        commit_commiter_datetime: Optional[str] = None,
+        author: Optional[str] = None,
+        in_main_branch: Optional[bool] = None,
+        merge: Optional[bool] = None,
+        nr_modified_files: Optional[int] = None,
+        nr_deletions: Optional[int] = None,
+        nr_insertions: Optional[int] = None,
+        nr_lines: Optional[int] = None,
+    ) -> None:
+        try:
+            with self._savepoint() as cur:
+                cur.execute(
+                    """INSERT INTO git_commit
+                        (commit_hash, commit_commiter_datetime, author,
+                        in_main_branch, merge,
+                        nr_modified_files, nr_deletions, nr_insertions, nr_lines)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+                    (
+                        commit_hash,
+                        commit_commiter_datetime,
+                        author,
+                        str(in_main_branch),
+                        str(merge),
+                        nr_modified_files,
+                        nr_deletions,
+                        nr_insertions,
+                        nr_lines,
+                    ),
+                )
+        except sqlite3.Error as err:
+            print(f"IntegrityError. UNIQUE failed for [{commit_hash}] ")
+            logging.error("[%s] ", commit_hash)
+            _log_sqlite_error(err)
+
+    def insert_file_commit(
+        self,
+        mod_file_data: FileData,
+        commit_hash: str,
+        commit_commiter_datetime: datetime,
+        commit_file_name: str,
+        commit_new_path: Optional[str],
+        commit_old_path: Optional[str],
+        change_type: ModificationType,
+    ) -> None:
+        path_change = 0 if commit_new_path == commit_old_path else 1
+        try:
+            with self._savepoint() as cur:
+                cur.execute(
+                    """INSERT INTO file_commit
+                        (file_name, file_dir_path, file_path,
+                        commit_hash, commit_commiter_datetime, commit_file_name,
+                        commit_new_path, commit_old_path, change_type, path_change)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+                    (
+                        *_file_data_values(mod_file_data),
+                        commit_hash,
+                        str(commit_commiter_datetime),
+                        commit_file_name,
+                        commit_new_path,
+                        commit_old_path,
+                        str(change_type),
+                        path_change,
+                    ),
+                )
+        except sqlite3.Error as err:
+            print(
+                f"IntegrityError. UNIQUE failed for [{commit_hash},{mod_file_data.get_file_path()}] "
+            )
+            logging.error("[%s,%s] ", commit_hash, mod_file_data.get_file_path())
+            _log_sqlite_error(err)
+
+    def insert_file_commits(
+        self,
+        commit_hash: str,
+        commit_commiter_datetime: datetime,
+        file_changes: List[FileChangeData],
+    ) -> None:
+        """
+        Same rows as insert_file_commit for every file change, with one statement.
+        Rows already in file_commit are skipped.
+        """
+        rows = [
+            (
+                *_file_data_values(FileData(str(fc.new_path))),
+                commit_hash,
+                str(commit_commiter_datetime),
+                fc.filename,
+                fc.new_path,
+                fc.old_path,
+                str(fc.change_type),
+                0 if fc.new_path == fc.old_path else 1,
+            )
+            for fc in file_changes
+        ]
+        try:
+            with self._savepoint() as cur:
+                cur.executemany(
+                    """INSERT OR IGNORE INTO file_commit
+                        (file_name, file_dir_path, file_path,
+                        commit_hash, commit_commiter_datetime, commit_file_name,
+                        commit_new_path, commit_old_path, change_type, path_change)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+                    rows,
+                )
+        except sqlite3.Error as err:
+            logging.error("[%s] ", commit_hash)
+            _log_sqlite_error(err)
 
-    if len(fis) == 0:
-        logging.warning("fis is empty.")
-        return
+    def get_previous_file_import_long_names(
+        self, mod_file_data: FileData
+    ) -> Optional[List[str]]:
+        try:
+            self._open_file_imports.load(self.cur)
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
+            return None
+        return self._open_file_imports.get_keys(mod_file_data.get_file_path())
+
+    def update_file_imports(
+        self,
+        mod_file_data: FileData,
+        fis: List[FileImport],
+        change_sets: FileChangeSets,
+        commit_hash: str,
+        commit_datetime: str,
+    ) -> None:
+
+        if len(fis) == 0:
+            logging.warning("fis is empty.")
+            return
 
-    try:
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
+        try:
+            with self._savepoint() as cur:
+                # TODO change to parsing previous file....
+                previous_file_import_long_names_from_db = (
+                    self.get_previous_file_import_long_names(mod_file_data)
+                )
 
-        # TODO change to parsing previous file....
-        previous_file_import_long_names_from_db = get_previous_file_import_long_names(
-            path_to_project_db, mod_file_data
-        )
-        curr_file_imports_long_names = [f.get_import_file_path() for f in fis]
-        previous_file_import_long_names = [f.get_import_file_path() for f in fis_prev]
-
-        # TODO make absolute empty table
-        # first commit on db
-        if (
-            previous_file_import_long_names_from_db is None
-            or len(previous_file_import_long_names_from_db) == 0
-        ):
-            logging.debug("First commit. Add %d", len(fis))
-            for fi in fis:
-                sql_string = f"""INSERT INTO file_import
+                # TODO make absolute empty table
+                # first commit on db
+                if not previous_file_import_long_names_from_db:
+                    logging.debug("First commit. Add %d", len(fis))
+                    cur.executemany(
+                        """INSERT INTO file_import
                             (file_name, file_dir_path, file_path,
                             import_file_name, import_file_path,
                             import_file_dir_path, import_file_pkg,
                             commit_hash_oldest, commit_oldest_datetime, closed)
-                        VALUES (
-                            '{fi.get_file_name()}','{fi.get_file_dir_path()}','{fi.get_file_path()}','{fi.get_import_file_name()}',
-                            '{fi.get_import_file_path()}','{fi.get_import_file_dir_path()}','{fi.get_import_file_pkg()}',
-                            '{commit_hash}','{commit_datetime}',0
-                        );"""
-                # logging.debug(sql_string)
-                cur.execute(sql_string)
-            con_analytics_db.commit()
-        else:
-
-            # from the commit we have the prev_fis from the previous source code
-            # get existing in prev but not in curr
-            added_file_imports = list(
-                set(curr_file_imports_long_names) - set(previous_file_import_long_names)
-            )
-            # get existing in prev but not in curr
-            deleted_file_imports = list(
-                set(previous_file_import_long_names) - set(curr_file_imports_long_names)
-            )
-            # get intersection
-            unchanged_file_imports = list(
-                set(curr_file_imports_long_names).intersection(
-                    previous_file_import_long_names
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0);""",
+                        [
+                            (*_file_import_values(fi), commit_hash, commit_datetime)
+                            for fi in fis
+                        ],
+                    )
+                    for fi in fis:
+                        self._open_file_imports.open(
+                            mod_file_data.get_file_path(), fi.get_import_file_path()
+                        )
+                    return
+
+                # from the commit we have the prev_fis from the previous source code
+                added_file_imports = change_sets.added_file_imports
+                deleted_file_imports = change_sets.deleted_file_imports
+                unchanged_file_imports = change_sets.unchanged_file_imports
+
+                logging.debug("added_file_imports len %d", len(added_file_imports))
+                logging.debug("deleted_file_imports len %d", len(deleted_file_imports))
+                logging.debug(
+                    "unchanged_file_imports len %d", len(unchanged_file_imports)
                 )
-            )
 
-            logging.debug("added_file_imports len %d", len(added_file_imports))
-            logging.debug("deleted_file_imports len %d", len(deleted_file_imports))
-            logging.debug("unchanged_file_imports len %d", len(unchanged_file_imports))
+                # handle added file_imports
+                cur.executemany(
+                    """INSERT INTO file_import
+                        (file_name, file_dir_path, file_path,
+                        import_file_name, import_file_path,
+                        import_file_dir_path, import_file_pkg,
+                        commit_hash_start, commit_start_datetime,
+                        commit_hash_oldest, commit_oldest_datetime, closed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                    ON CONFLICT (file_path, import_file_path, commit_hash_start, commit_hash_oldest, commit_hash_end)
+                    DO UPDATE SET commit_hash_start = excluded.commit_hash_start,
+                        commit_start_datetime = excluded.commit_start_datetime,
+                        commit_hash_oldest=excluded.commit_hash_oldest,
+                        commit_oldest_datetime=excluded.commit_oldest_datetime;""",
+                    [
+                        (
+                            *_file_import_values(fi),
+                            commit_hash,
+                            commit_datetime,
+                            commit_hash,
+                            commit_datetime,
+                        )
+                        for fi in fis
+                        if fi.get_import_file_path() in added_file_imports
+                    ],
+                )
 
-            # handle added file_imports
-            for fi in [
-                fi for fi in fis if fi.get_import_file_path() in added_file_imports
-            ]:
-                sql_string = f"""INSERT INTO file_import
-                            (file_name, file_dir_path, file_path,
-                            import_file_name, import_file_path,
-                            import_file_dir_path, import_file_pkg,
-                            commit_hash_start, commit_start_datetime,
-                            commit_hash_oldest, commit_oldest_datetime, closed)
-                        VALUES (
-                            '{fi.get_file_name()}','{fi.get_file_dir_path()}','{fi.get_file_path()}','{fi.get_import_file_name()}',
-                            '{fi.get_import_file_path()}','{fi.get_import_file_dir_path()}','{fi.get_import_file_pkg()}',
-                            '{commit_hash}','{commit_datetime}','{commit_hash}','{commit_datetime}',0
+                # handle deleted file_imports
+                cur.executemany(
+                    """UPDATE file_import SET
+                        commit_hash_end = ?, commit_end_datetime = ?,
+                        closed = 1
+                    WHERE file_path = ?
+                    AND import_file_path = ?
+                    AND closed = 0;""",
+                    [
+                        (
+                            commit_hash,
+                            commit_datetime,
+                            mod_file_data.get_file_path(),
+                            file_import,
                         )
-                        ON CONFLICT (file_path, import_file_path, commit_hash_start, commit_hash_oldest, commit_hash_end)
-                        DO UPDATE SET commit_hash_start = excluded.commit_hash_start,
-                            commit_start_datetime = excluded.commit_start_datetime,
-                            commit_hash_oldest=excluded.commit_hash_oldest,
-                            commit_oldest_datetime=excluded.commit_oldest_datetime;"""
-                logging.debug(sql_string)
-                cur.execute(sql_string)
-
-            # handle deleted file_imports
-            for file_import in deleted_file_imports:
-                sql_string = f"""UPDATE file_import SET
-                            commit_hash_end='{commit_hash}', commit_end_datetime='{commit_datetime}',
-                            closed=1
-                            WHERE
-                            file_path='{mod_file_data.get_file_path()}'
-                            AND import_file_path='{file_import[0]}'
-                            closed = 0;"""
-                logging.debug(sql_string)
-                cur.execute(sql_string)
-
-            # handle unchanged file_imports
-            for fi in [
-                f for f in fis if f.get_import_file_path() in unchanged_file_imports
-            ]:
-                sql_string = f"""UPDATE file_import SET
-                            commit_hash_oldest='{commit_hash}', commit_oldest_datetime='{commit_datetime}'
-                            WHERE
-                            file_path='{mod_file_data.get_file_path()}'
-                            AND import_file_path='{fi.get_import_file_path()}'
-                            AND closed=0;"""
-                logging.debug(sql_string)
-                cur.execute(sql_string)
-
-            con_analytics_db.commit()
-
-        cur.close()
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
-        )
+                        for file_import in deleted_file_imports
+                    ],
+                )
 
+                # handle unchanged file_imports
+                cur.executemany(
+                    """UPDATE file_import SET
+                        commit_hash_oldest = ?, commit_oldest_datetime = ?
+                    WHERE file_path = ?
+                    AND import_file_path = ?
+                    AND closed = 0;""",
+                    [
+                        (
+                            commit_hash,
+                            commit_datetime,
+                            mod_file_data.get_file_path(),
+                            fi.get_import_file_path(),
+                        )
+                        for fi in fis
+                        if fi.get_import_file_path() in unchanged_file_imports
+                    ],
+                )
 
-def insert_function_commit(
-    path_to_project_db: str, mod_file: ModifiedFile, commit: Commit
-) -> None:
-    mod_file_data = FileData(str(mod_file.new_path))
-    try:
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
+                # the index is only updated once the rows are written
+                for file_import in deleted_file_imports:
+                    self._open_file_imports.close(mod_file_data.get_file_path(), file_import)
+                for fi in fis:
+                    if fi.get_import_file_path() in added_file_imports:
+                        self._open_file_imports.open(
+                            mod_file_data.get_file_path(), fi.get_import_file_path()
+                        )
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
 
-        commit_previous_functions = [f.long_name for f in mod_file.methods_before]
-        commit_current_functions = [f.long_name for f in mod_file.methods]
+    def insert_function_commit(
+        self, mod_file: FileChangeData, commit: GitCommitData
+    ) -> None:
+        mod_file_data = FileData(str(mod_file.new_path))
 
-        # get added functions (existing in curr but not prev)
-        added_functions = list(
-            set(commit_current_functions) - set(commit_previous_functions)
-        )
-        # get deleted functions (existing in prev but not in curr)
-        deleted_functions = list(
-            set(commit_previous_functions) - set(commit_current_functions)
-        )
+        added_functions = mod_file.change_sets.added_functions
+        deleted_functions = mod_file.change_sets.deleted_functions
+        path_change = 0 if mod_file.new_path == mod_file.old_path else 1
 
         # added, deleted and modified methods appear in changed methods
+        rows = []
         for cm in mod_file.changed_methods:
             if cm.long_name in added_functions:
                 action_class = ActionClass.ADD
@@ -434,219 +787,368 @@ def insert_function_commit(
                 action_class = ActionClass.DELETE
             else:
                 action_class = ActionClass.MODIFIY
-            params = ",".join(cm.parameters)
-            f_unqualified_name = (cm.name).split("::")[len((cm.name).split("::")) - 1]
-            path_change = 0 if mod_file.new_path == mod_file.old_path else 1
+            rows.append(
+                (
+                    *_file_data_values(mod_file_data),
+                    *_function_values(cm),
+                    cm.nloc,
+                    commit.hash,
+                    str(commit.committer_date),
+                    mod_file.filename,
+                    mod_file.new_path,
+                    mod_file.old_path,
+                    path_change,
+                    str(action_class),
+                )
+            )
 
-            sql_string = f"""INSERT INTO function_commit
+        try:
+            with self._savepoint() as cur:
+                cur.executemany(
+                    """INSERT INTO function_commit
                         (file_name, file_dir_path, file_path,
                         function_unqualified_name, function_name, function_long_name, function_parameters, function_nloc,
                         commit_hash, commit_commiter_datetime,
                         commit_file_name, commit_new_path, commit_old_path,
                         path_change, commit_type)
-                    VALUES (
-                        '{mod_file_data.get_file_name()}','{mod_file_data.get_file_dir_path()}','{mod_file_data.get_file_path()}',
-                        '{f_unqualified_name}','{cm.name}','{cm.long_name}','{params}','{cm.nloc}','{commit.hash}','{commit.committer_date}',
-                        '{mod_file.filename}','{mod_file.new_path}','{mod_file.old_path}','{path_change}','{action_class}'
-                    );"""
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+                    rows,
+                )
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
 
-            cur.execute(sql_string)
+    def get_previous_active_functions_in_file(
+        self, mod_file: FileChangeData
+    ) -> Optional[List[str]]:
+        mod_file_data = FileData(str(mod_file.new_path))
+        try:
+            self._open_functions.load(self.cur)
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
+            return None
+        return self._open_functions.get_keys(mod_file_data.get_file_path())
+
+    def update_function_to_file(
+        self, mod_file: FileChangeData, commit: GitCommitData
+    ) -> None:
+        mod_file_data = FileData(str(mod_file.new_path))
+        file_values = _file_data_values(mod_file_data)
+        commit_values = (commit.hash, str(commit.committer_date))
 
-        con_analytics_db.commit()
-        cur.close()
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
+        try:
+            self._open_functions.load(self.cur)
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
+            return
+        staged_functions, closed_functions, opened_functions = self._stage_functions(
+            mod_file, mod_file_data.get_file_path()
         )
 
+        if not staged_functions:
+            return
+        try:
+            with self._savepoint() as cur:
+                cur.execute("DELETE FROM staged_function")
+                cur.executemany(
+                    """INSERT INTO staged_function
+                        (function_unqualified_name, function_name,
+                        function_long_name, function_parameters, change,
+                        occurrence, last_occurrence, matched)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?);""",
+                    staged_functions,
+                )
 
-def get_previous_active_functions_in_file(
-    path_to_project_db: str, mod_file: ModifiedFile
-) -> Optional[List[str]]:
-    mod_file_data = FileData(str(mod_file.new_path))
-    try:
-
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
-
-        sql_string = f"""SELECT function_long_name
-        FROM function_to_file
-        WHERE file_path = '{mod_file_data.get_file_path()}'
-        AND closed = 0"""
-
-        cur.execute(sql_string)
-        result = cur.fetchall()
-
-        con_analytics_db.commit()
-        cur.close()
-        return result
-
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
-        )
-        return None
-
+                # on method added, the commit_hash_start will be set to the current
+                cur.execute(
+                    """INSERT INTO function_to_file
+                        (file_name, file_dir_path, file_path,
+                        function_unqualified_name, function_name,
+                        function_long_name, function_parameters,
+                        commit_hash_start, commit_start_datetime,
+                        commit_hash_oldest, commit_oldest_datetime,
+                        closed)
+                    SELECT ?, ?, ?, s.function_unqualified_name, s.function_name,
+                        s.function_long_name, s.function_parameters, ?, ?, ?, ?, 0
+                    FROM staged_function AS s
+                    WHERE s.change = 'added'
+                    ON CONFLICT (file_path, function_long_name, commit_hash_start, commit_hash_oldest, commit_hash_end)
+                    DO UPDATE SET commit_hash_start = excluded.commit_hash_start,
+                        commit_start_datetime = excluded.commit_start_datetime,
+                        commit_hash_oldest=excluded.commit_hash_oldest,
+                        commit_oldest_datetime=excluded.commit_oldest_datetime;""",
+                    (*file_values, *commit_values, *commit_values),
+                )
 
-def update_function_to_file(
-    path_to_project_db: str, mod_file: ModifiedFile, commit: Commit
-) -> None:
-    mod_file_data = FileData(str(mod_file.new_path))
-    try:
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
+                # on methods previously exisitng, the commit_hash_oldest will be updated to the current
+                # because we work the repository in reverse order
+                cur.execute(
+                    """UPDATE function_to_file AS f SET
+                        commit_hash_oldest = ?, commit_oldest_datetime = ?,
+                        closed = 1
+                    FROM staged_function AS s
+                    WHERE s.change = 'kept'
+                    AND f.file_path = ?
+                    AND f.function_long_name = s.function_long_name AND f.closed = 0;""",
+                    (*commit_values, mod_file_data.get_file_path()),
+                )
+                # every occurrence of a long name closes the open rows left by the previous
+                # one, or inserts an open row if there are none. Without matched rows the odd
+                # occurrences insert, else the even ones, and the next occurrence closes it.
+                cur.execute(
+                    """INSERT INTO function_to_file
+                        (file_name, file_dir_path, file_path,
+                        function_unqualified_name, function_name,
+                        function_long_name, function_parameters,
+                        commit_hash_oldest, commit_oldest_datetime, closed)
+                    SELECT ?, ?, ?, s.function_unqualified_name, s.function_name,
+                        s.function_long_name, s.function_parameters, ?, ?, 1 - s.last_occurrence
+                    FROM staged_function AS s
+                    WHERE s.change = 'kept' AND (s.occurrence + s.matched) % 2 = 1
+                    ON CONFLICT (file_path, function_long_name, commit_hash_start, commit_hash_oldest, commit_hash_end)
+                    DO UPDATE SET commit_hash_oldest = excluded.commit_hash_oldest,
+                        commit_oldest_datetime = excluded.commit_oldest_datetime;""",
+                    (*file_values, *commit_values),
+                )
 
-        commit_previous_functions = [f.long_name for f in mod_file.methods_before]
-        commit_current_functions = [f.long_name for f in mod_file.methods]
-        commit_changed_functions = [f.long_name for f in mod_file.changed_methods]
+                # Deleted functions
+                cur.execute(
+                    """UPDATE function_to_file AS f SET
+                        commit_hash_end = ?, commit_end_datetime = ?,
+                        commit_hash_oldest = ?, commit_oldest_datetime = ?,
+                        closed = 1
+                    FROM staged_function AS s
+                    WHERE s.change = 'deleted'
+                    AND f.file_path = ?
+                    AND f.function_long_name = s.function_long_name AND f.closed = 0;""",
+                    (*commit_values, *commit_values, mod_file_data.get_file_path()),
+                )
 
-        # get added functions (existing in curr but not prev)
-        added_functions = list(
-            set(commit_current_functions) - set(commit_previous_functions)
-        )
-        # get deleted functions (existing in prev but not in curr)
-        deleted_functions = list(
-            set(commit_previous_functions) - set(commit_current_functions)
-        )
-        # get just changed functions
-        changed_functions = list(
-            set(commit_changed_functions)
-            - set(added_functions)
-            - set(deleted_functions)
-        )
-        # get not changed functions
-        unchanged_functions = list(
-            set(commit_previous_functions).intersection(commit_current_functions)
-            - set(changed_functions)
-        )
+                # the index is only updated once the rows are written
+                for long_name in closed_functions:
+                    self._open_functions.close(mod_file_data.get_file_path(), long_name)
+                for long_name in opened_functions:
+                    self._open_functions.open(mod_file_data.get_file_path(), long_name)
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
+
+    def _stage_functions(
+        self, mod_file: FileChangeData, file_path: str
+    ) -> Tuple[List[Tuple[object, ...]], Set[str], List[str]]:
+        """
+        The staged_function rows of the file change, and the long names whose open rows are
+        closed and opened by update_function_to_file.
+        """
+        change_sets = mod_file.change_sets
+        commit_previous_functions = change_sets.previous_functions
+        added_functions = change_sets.added_functions
+        deleted_functions = change_sets.deleted_functions
+        changed_functions = change_sets.changed_functions
+        unchanged_functions = change_sets.unchanged_functions
 
         logging.debug("added_functions len %d", len(added_functions))
         logging.debug("deleted_functions len %d", len(deleted_functions))
         logging.debug("changed_functions len %d", len(changed_functions))
         logging.debug("unchanged_functions len %d", len(unchanged_functions))
 
-        # mod_file.methods include added, changed and unchanged
-        # on method added, the commit_hash_start will be set to the current
-        # on methods previously exisitng, the commit_hash_start will be updated to the current because we work the repository in reverse order
+        # mod_file.methods include added, changed and unchanged. A long name can appear more
+        # than once in a file, every appearance is staged with its occurrence number.
+        nr_occurrences = Counter(cm.long_name for cm in mod_file.methods)
+        occurrences: Counter[str] = Counter()
+        staged_functions: List[Tuple[object, ...]] = []
+        closed_functions: Set[str] = set()
+        opened_functions: List[str] = []
         for cm in mod_file.methods:
-            params = ",".join(cm.parameters)
-
-            f_unqualified_name = (cm.name).split("::")[len((cm.name).split("::")) - 1]
-
-            # Added functions
+            occurrence = occurrences[cm.long_name] + 1
+            last_occurrence = int(occurrence == nr_occurrences[cm.long_name])
+            matched = 0
             if cm.long_name in added_functions:
-                # logging.debug("Added funciton {0}".format(cm.long_name))
-                sql_string = f"""INSERT INTO function_to_file
-                            (file_name, file_dir_path, file_path,
-                            function_unqualified_name, function_name,
-                            function_long_name, function_parameters,
-                            commit_hash_start, commit_start_datetime,
-                            commit_hash_oldest, commit_oldest_datetime,
-                            closed)
-                        VALUES (
-                            '{mod_file_data.get_file_name()}','{mod_file_data.get_file_dir_path()}','{mod_file_data.get_file_path()}',
-                            '{f_unqualified_name}','{cm.name}','{cm.long_name}','{params}','{commit.hash}','{commit.committer_date}',
-                            '{commit.hash}','{commit.committer_date}',0
-                        )
-                        ON CONFLICT (file_path, function_long_name, commit_hash_start, commit_hash_oldest, commit_hash_end)
-                        DO UPDATE SET commit_hash_start = excluded.commit_hash_start,
-                            commit_start_datetime = excluded.commit_start_datetime,
-                            commit_hash_oldest=excluded.commit_hash_oldest,
-                            commit_oldest_datetime=excluded.commit_oldest_datetime;"""
-                cur.execute(sql_string)
-
-            # Changed and unchanged functions
-            if cm.long_name in changed_functions or cm.long_name in unchanged_functions:
-                # logging.debug("Changed or unchanged funciton {0}".format(cm.long_name))
-                sql_string = f"""UPDATE function_to_file SET
-                                commit_hash_oldest='{commit.hash}', commit_oldest_datetime='{commit.committer_date}',
-                                closed = 1
-                                WHERE
-                                file_path='{mod_file_data.get_file_path()}'
-                                AND function_long_name='{cm.long_name}' AND closed = 0;"""
-
-                cur.execute(sql_string)
-                # logging.debug("cur.rowcount {0}".format(cur.rowcount))
-
-                if cur.rowcount <= 0:
-                    # logging.debug("Changed or unchanged funciton {0} didnt exist in db, make insert. ".format(cm.long_name))
-                    sql_string = f"""INSERT INTO function_to_file
-                                (file_name, file_dir_path, file_path,
-                                function_unqualified_name, function_name,
-                                function_long_name, function_parameters,
-                                commit_hash_oldest, commit_oldest_datetime, closed)
-                            VALUES (
-                                '{mod_file_data.get_file_name()}','{mod_file_data.get_file_dir_path()}','{mod_file_data.get_file_path()}',
-                                '{f_unqualified_name}','{cm.name}','{cm.long_name}','{params}','{commit.hash}','{commit.committer_date}',0
-                            )
-                            ON CONFLICT (file_path, function_long_name, commit_hash_start, commit_hash_oldest, commit_hash_end)
-                            DO UPDATE SET commit_hash_oldest = excluded.commit_hash_oldest,
-                                commit_oldest_datetime = excluded.commit_oldest_datetime;"""
-                    cur.execute(sql_string)
-
-        # Deleted functions
+                change = "added"
+                opened_functions.append(cm.long_name)
+            elif cm.long_name in changed_functions or cm.long_name in unchanged_functions:
+                change = "kept"
+                matched = int(self._open_functions.is_open(file_path, cm.long_name))
+                closed_functions.add(cm.long_name)
+                if last_occurrence and (occurrence + matched) % 2 == 1:
+                    opened_functions.append(cm.long_name)
+            else:
+                continue
+            occurrences[cm.long_name] = occurrence
+            staged_functions.append(
+                (*_function_values(cm), change, occurrence, last_occurrence, matched)
+            )
+        deleted_long_names = set()
         for cm in mod_file.changed_methods:
-            if cm.long_name in deleted_functions:
+            # the deleted functions that were active in the file before, once per long name
+            if (
+                cm.long_name in deleted_functions
+                and cm.long_name in commit_previous_functions
+                and cm.long_name not in deleted_long_names
+            ):
                 logging.debug("Deleted function_to_file: %s", cm.long_name)
-                params = ",".join(cm.parameters)
-
-                f_unqualified_name = (cm.name).split("::")[
-                    len((cm.name).split("::")) - 1
-                ]
-
-                # previous_active_functions_in_file:
-                if cm.long_name in commit_previous_functions:
-                    # TODO check if 2 times processing
-                    sql_string = f"""UPDATE function_to_file SET
-                                commit_hash_end='{commit.hash}', commit_end_datetime='{commit.committer_date}',
-                                commit_hash_oldest='{commit.hash}', commit_oldest_datetime='{commit.committer_date}',
-                                closed = 1
-                                WHERE
-                                file_path='{mod_file_data.get_file_path()}'
-                                AND function_long_name='{cm.long_name}' AND closed = 0;"""
-                else:
-                    # because we work from tag to tag it might be that the entry does not exist
-                    logging.debug(
-                        "Deleted funciton %s didnt exist in db, make insert. ",
-                        cm.long_name,
-                    )
-                    sql_string = f"""INSERT INTO function_to_file
-                                (file_name, file_dir_path, file_path,
-                                function_unqualified_name, function_name,
-                                function_long_name, function_parameters,
-                                commit_hash_oldest, commit_oldest_datetime,
-                                commit_hash_end, commit_end_datetime, closed)
-                            VALUES (
-                                '{mod_file_data.get_file_name()}','{mod_file_data.get_file_dir_path()}','{mod_file_data.get_file_path()}',
-                                '{f_unqualified_name}','{cm.name}','{cm.long_name}',{params},'{commit.hash}','{commit.committer_date}',
-                                '{commit.hash}','{commit.committer_date}',1
-                            )
-                            ON CONFLICT (file_path, function_long_name, commit_hash_start, commit_hash_oldest, commit_hash_end)
-                            DO UPDATE SET commit_hash_end = excluded.commit_hash_end,
-                                commit_end_datetime = excluded.commit_end_datetime,
-                                commit_hash_oldest=excluded.commit_hash_oldest,
-                                commit_oldest_datetime=excluded.commit_oldest_datetime,
-                                closed = excluded.closed;"""
-                cur.execute(sql_string)
+                deleted_long_names.add(cm.long_name)
+                closed_functions.add(cm.long_name)
+                staged_functions.append((*_function_values(cm), "deleted", 1, 1, 0))
 
-        con_analytics_db.commit()
-        cur.close()
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
-        )
+        return staged_functions, closed_functions, opened_functions
+
+    def save_raw_function_call_curr_rows(
+        self, rows: List[ExtendedFunctionCall], mod_file_data: FileData
+    ) -> None:
+        """
+        If row already exists then only the hash_start and start_date will be updated, else if not exists insert.
+        Closed is only set if row did not exist previously.
+
+        Parameters:
+        rows (list[ExtendedFunctionCall]): rows of the current function calls, see set_hashes_to_function_calls.
+
+        """
+        if not rows:
+            return
+        try:
+            with self._savepoint() as cur:
+                # update start_hash if raw_function_call already existing and start_hash is not earlier as current hash
+                self._stage_function_calls(
+                    cur,
+                    rows,
+                    mod_file_data,
+                    "DATE(r.commit_start_datetime) >= DATE(s.commit_start_datetime)",
+                )
+                cur.execute(
+                    """UPDATE raw_function_call SET
+                        commit_hash_start = m.commit_hash_start,
+                        commit_start_datetime = m.commit_start_datetime,
+                        commit_hash_oldest = m.commit_hash_oldest,
+                        commit_oldest_datetime = m.commit_oldest_datetime
+                    FROM staged_function_call_match AS m
+                    WHERE raw_function_call.rowid = m.row_id;"""
+                )
+
+                # raw_function_call did not previously exist, then insert only with start hash values
+                cur.execute(
+                    """INSERT INTO raw_function_call
+                        (file_name, file_dir_path, file_path,
+                        calling_function_unqualified_name, calling_function_nr_parameters,
+                        called_function_unqualified_name,
+                        commit_hash_start, commit_start_datetime,
+                        commit_hash_oldest, commit_oldest_datetime,
+                        closed)
+                    SELECT ?, ?, ?, s.calling_function_unqualified_name,
+                        s.calling_function_nr_parameters, s.called_function_unqualified_name,
+                        s.commit_hash_start, s.commit_start_datetime,
+                        s.commit_hash_oldest, s.commit_oldest_datetime, 0
+                    FROM staged_function_call AS s
+                    WHERE s.staged_id NOT IN (SELECT staged_id FROM staged_function_call_match);""",
+                    _file_data_values(mod_file_data),
+                )
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
+
+    def save_raw_function_call_deleted_rows(
+        self, rows: List[ExtendedFunctionCall], mod_file_data: FileData
+    ) -> None:
+        """
+        Closed is only set if row did not exist previously.
+        If row already exists then only the hash_start and start_date will be updated.
+
+        Parameters:
+        rows (list[ExtendedFunctionCall]): rows of the deleted function calls, see set_hashes_to_function_calls.
+
+        """
+        if not rows:
+            return
+        try:
+            with self._savepoint() as cur:
+                self._stage_function_calls(cur, rows, mod_file_data, "1")
+                cur.execute(
+                    """UPDATE raw_function_call SET
+                        commit_hash_end = m.commit_hash_end,
+                        commit_end_datetime = m.commit_end_datetime,
+                        closed = 1
+                    FROM staged_function_call_match AS m
+                    WHERE raw_function_call.rowid = m.row_id;"""
+                )
+
+                # raw_function_call did not previously exist, then insert only with end hash values
+                cur.execute(
+                    """INSERT INTO raw_function_call
+                        (file_name, file_dir_path, file_path,
+                        calling_function_unqualified_name, calling_function_nr_parameters,
+                        called_function_unqualified_name,
+                        commit_hash_oldest, commit_oldest_datetime,
+                        commit_hash_end, commit_end_datetime, closed)
+                    SELECT ?, ?, ?, s.calling_function_unqualified_name,
+                        s.calling_function_nr_parameters, s.called_function_unqualified_name,
+                        s.commit_hash_oldest, s.commit_oldest_datetime,
+                        s.commit_hash_end, s.commit_end_datetime, 1
+                    FROM staged_function_call AS s
+                    WHERE s.staged_id NOT IN (SELECT staged_id FROM staged_function_call_match)
+                    ON CONFLICT (file_path, calling_function_unqualified_name, calling_function_nr_parameters,
+                        called_function_unqualified_name, commit_hash_start, commit_hash_oldest, commit_hash_end)
+                    DO UPDATE SET commit_hash_oldest=excluded.commit_hash_oldest,
+                        commit_oldest_datetime=excluded.commit_oldest_datetime,
+                        commit_hash_end = excluded.commit_hash_end,
+                        commit_end_datetime = excluded.commit_end_datetime,
+                        closed = excluded.closed;""",
+                    _file_data_values(mod_file_data),
+                )
+                logging.debug("Del func_call not previously existing: %d", cur.rowcount)
+        except sqlite3.Error as err:
+            _log_sqlite_error(err)
+
+
+def _log_sqlite_error(err: sqlite3.Error) -> None:
+    logging.error(
+        "An exception of type %s occurred. Arguments:\n%s",
+        type(err).__name__,
+        repr(err.args),
+    )
+
+
+def _to_text(dt: Optional[datetime]) -> Optional[str]:
+    return None if dt is None else str(dt)
+
+
+def _get_unqualified_name(name: str) -> str:
+    return name.split("::")[-1]
+
+
+def _file_data_values(file_data: FileData) -> Tuple[str, str, str]:
+    return (
+        file_data.get_file_name(),
+        file_data.get_file_dir_path(),
+        file_data.get_file_path(),
+    )
+
+
+def _function_values(method: MethodData) -> Tuple[str, str, str, str]:
+    return (
+        _get_unqualified_name(method.name),
+        method.name,
+        method.long_name,
+        ",".join(method.parameters),
+    )
+
+
+def _file_import_values(
+    fi: FileImport,
+) -> Tuple[str, str, str, str, str, str, Optional[str]]:
+    return (
+        fi.get_file_name(),
+        fi.get_file_dir_path(),
+        fi.get_file_path(),
+        fi.get_import_file_name(),
+        fi.get_import_file_path(),
+        fi.get_import_file_dir_path(),
+        fi.get_import_file_pkg(),
+    )
+
+
+def _function_call_key(fc: ExtendedFunctionCall) -> Tuple[str, str, str]:
+    return (
+        fc.calling_function_unqualified_name,
+        fc.calling_function_nr_parameters,
+        fc.called_function_unqualified_name,
+    )
 
 
 def insert_or_update_call_commit_deprecated(
@@ -733,134 +1235,6 @@ def save_funciton_call_rows() -> None:
     print("TODO")
 
 
-def save_raw_function_call_curr_rows(
-    path_to_project_db: str, rows: List[ExtendedFunctionCall], mod_file_data: FileData
-) -> None:
-    """
-    If row already exists then only the hash_start and start_date will be updated, else if not exists insert.
-    Closed is only set if row did not exist previously.
-
-    Parameters:
-    rows (list[tuple[str..]]): Array of form ([calling_function_unqualified_name,calling_function_nr_parameters,called_function_unqualified_name,
-    commit_hash_start,  commit_start_datetime, commit_hash_oldest, commit_oldest_datetime, commit_hash_end, commit_end_datetime, closed],...[])
-
-    """
-    try:
-        con_analytics_db = sqlite3.connect(path_to_project_db)
-        cur = con_analytics_db.cursor()
-
-        for fc in rows:
-            # logging.debug("Updating {0},{1},{2},{3},{4}".format(
-            #    mod_file_data.get_file_path(), fc[0], fc[1], fc[2], fc[4]))
-            # update start_hash if raw_function_call already existing and start_hash is not earlier as current hash
-            sql_string = f"""UPDATE raw_function_call SET
-                        commit_hash_start='{fc[3]}', commit_start_datetime='{fc[4]}',
-                        commit_hash_oldest='{fc[5]}', commit_oldest_datetime='{fc[6]}'
-                        WHERE
-                        file_path='{mod_file_data.get_file_path()}'
-                        AND calling_function_unqualified_name='{fc[0]}'
-                        AND calling_function_nr_parameters = {fc[1]}
-                        AND called_function_unqualified_name = '{fc[2]}'
-                        AND closed = 0
-                        AND DATE(commit_start_datetime) >= DATE('{fc[4]}');"""
-
-            cur.execute(sql_string)
-
-            # raw_function_call did not previously exist, then insert only with start hash values
-            if cur.rowcount <= 0:
-                # logging.debug("No previous record, insert.")
-                sql_string = f"""INSERT INTO raw_function_call
-                            (file_name, file_dir_path, file_path,
-                            calling_function_unqualified_name, calling_function_nr_parameters,
-                            called_function_unqualified_name,
-                            commit_hash_start, commit_start_datetime,
-                            commit_hash_oldest, commit_oldest_datetime,
-                            closed)
-                        VALUES (
-                            '{mod_file_data.get_file_name()}','{mod_file_data.get_file_dir_path()}','{mod_file_data.get_file_path()}',
-                            '{fc[0]}',{fc[1]},'{fc[2]}','{fc[3]}','{fc[4]}','{fc[5]}','{fc[6]}',0
-                        );"""
-                cur.execute(sql_string)
-
-        con_analytics_db.commit()
-        cur.close()
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
-        )
-
-
-def save_raw_function_call_deleted_rows(
-    path_to_project_db: str, rows: List[ExtendedFunctionCall], mod_file_data: FileData
-) -> None:
-    """
-    Closed is only set if row did not exist previously.
-    If row already exists then only the hash_start and start_date will be updated.
-
-    Parameters:
-    rows (list[tuple[str..]]): Array of form ([calling_function_unqualified_name,calling_function_nr_parameters,called_function_unqualified_name,
-    commit_hash_start,  commit_start_datetime, commit_hash_oldest, commit_oldest_datetime, commit_hash_end, commit_end_datetime, closed],...[])
-
-    """
-    con_analytics_db = sqlite3.connect(path_to_project_db)
-    cur = con_analytics_db.cursor()
-    try:
-        for fc in rows:
-            sql_string = f"""UPDATE raw_function_call SET
-                        commit_hash_end='{fc[6]}', commit_end_datetime='{fc[7]}', closed = 1
-                        WHERE
-                        file_path='{mod_file_data.get_file_path()}'
-                        AND calling_function_unqualified_name='{fc[0]}'
-                        AND calling_function_nr_parameters = {fc[1]}
-                        AND called_function_unqualified_name = '{fc[2]}'
-                        AND closed = 0;"""
-            # logging.debug(sql_string)
-            cur.execute(sql_string)
-            logging.debug("cur.rowcount %s", cur.rowcount)
-
-            # raw_function_call did not previously exist, then insert only with end hash values
-            if cur.rowcount <= 0:
-                logging.debug(
-                    "Del func_call not previously existing: %s,%s,%s",
-                    fc[0],
-                    fc[1],
-                    fc[2],
-                )
-                sql_string = f"""INSERT INTO raw_function_call
-                            (file_name, file_dir_path, file_path,
-                            calling_function_unqualified_name, calling_function_nr_parameters,
-                            called_function_unqualified_name,
-                            commit_hash_oldest, commit_oldest_datetime,
-                            commit_hash_end, commit_end_datetime, closed)
-                        VALUES (
-                            '{mod_file_data.get_file_name()}','{mod_file_data.get_file_dir_path()}','{mod_file_data.get_file_path()}',
-                            '{fc[0]}',{fc[1]},'{fc[2]}','{fc[7]}','{fc[6]}','{fc[7]}','{fc[6]}',1)
-                        ON CONFLICT (file_path, calling_function_unqualified_name, calling_function_nr_parameters, called_function_unqualified_name,
-                            commit_hash_start, commit_hash_oldest, commit_hash_end)
-                        DO UPDATE SET commit_hash_oldest=excluded.commit_hash_oldest,
-                            commit_oldest_datetime=excluded.commit_oldest_datetime,
-                            commit_hash_end = excluded.commit_hash_end,
-                            commit_end_datetime = excluded.commit_end_datetime,
-                            closed = excluded.closed;"""
-                # logging.debug(sql_string)
-                cur.execute(sql_string)
-
-        con_analytics_db.commit()
-        cur.close()
-    except sqlite3.Error as err:
-        con_analytics_db.rollback()
-        cur.close()
-        logging.error(
-            "An exception of type %s occurred. Arguments:\n%s",
-            type(err).__name__,
-            repr(err.args),
-        )
-
-
 def complete_function_calls_data(
     _arr_function_calls: List[ExtendedFunctionCall],
 ) -> None:
@@ -0,0 +1,449 @@
+"""
+Compact variant of the commit based tables, selected with the db_schema config key.
+
+The miners write the text tables of create_commit_based_tables. Once the mining is finished,
+compact_project_db moves their rows into tables that reference commits, paths, labels and
+functions by integer ids of dictionary tables, with the commit datetimes as epoch seconds and
+the True/False flags as integers. Every text table is replaced by a view of the same name and
+columns, so the notebooks and analytics queries keep working unchanged. Joins on the compact
+tables should use the ids, e.g. file_commit_compact.commit_id = commit_ref.commit_id.
+
+Before a traversal writes to a compacted db again, expand_project_db restores the text tables.
+"""
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .models import FileData
+from .utils_sql import (
+    CALENDAR_COLUMNS,
+    _CHANGE_ROLLUPS,
+    _create_commit_based_tables,
+    _log_sqlite_error,
+    _update_change_rollups,
+    add_calendar_columns,
+)
+
+
+class _CompactField(NamedTuple):
+    """
+    Columns of a text table that are stored in one column of its compact table.
+
+    kind is plain (copied), flag ('True'/'False' text as 1/0), label, path, file (name, dir
+    path and path as the path id), commit (hash and datetime as the commit id) or function
+    (unqualified name, name, long name and parameters as the function id). The generated
+    calendar columns of a commit (calendar) have no compact column, the view reads them from
+    commit_ref by the commit id of the column.
+    """
+
+    kind: str
+    column: str
+    text_columns: Tuple[str, ...]
+
+
+_FUNCTION_COLUMNS = (
+    "function_unqualified_name",
+    "function_name",
+    "function_long_name",
+    "function_parameters",
+)
+
+
+def _function_field(column: str, prefix: str) -> _CompactField:
+    return _CompactField(
+        "function", column, tuple(f"{prefix}{text_column}" for text_column in _FUNCTION_COLUMNS)
+    )
+
+
+_FILE_FIELD = _CompactField("file", "path_id", ("file_name", "file_dir_path", "file_path"))
+_COMMIT_FIELD = _CompactField("commit", "commit_id", ("commit_hash", "commit_commiter_datetime"))
+# the interval of an interval table row
+_INTERVAL_FIELDS = tuple(
+    _CompactField(
+        "commit",
+        f"commit_id_{position}",
+        (f"commit_hash_{position}", f"commit_{position}_datetime"),
+    )
+    for position in ("start", "oldest", "end")
+) + (_CompactField("plain", "closed", ("closed",)),)
+_COMMIT_PATH_FIELDS = (
+    _CompactField("label", "commit_file_name_id", ("commit_file_name",)),
+    _CompactField("path", "commit_new_path_id", ("commit_new_path",)),
+    _CompactField("path", "commit_old_path_id", ("commit_old_path",)),
+)
+
+# the fields of the compact tables in the column order of the text tables, and their keys
+_COMPACT_TABLES: Dict[str, Tuple[Tuple[_CompactField, ...], Tuple[str, ...]]] = {
+    "git_commit": (
+        (
+            _COMMIT_FIELD,
+            _CompactField("label", "author_id", ("author",)),
+            _CompactField("flag", "in_main_branch", ("in_main_branch",)),
+            _CompactField("flag", "merge", ("merge",)),
+            _CompactField("plain", "nr_modified_files", ("nr_modified_files",)),
+            _CompactField("plain", "nr_deletions", ("nr_deletions",)),
+            _CompactField("plain", "nr_insertions", ("nr_insertions",)),
+            _CompactField("plain", "nr_lines", ("nr_lines",)),
+        ),
+        ("commit_id",),
+    ),
+    "file_commit": (
+        (
+            _FILE_FIELD,
+            _COMMIT_FIELD,
+            *_COMMIT_PATH_FIELDS,
+            _CompactField("label", "change_type_id", ("change_type",)),
+            _CompactField("plain", "path_change", ("path_change",)),
+            _CompactField("calendar", "commit_id", tuple(CALENDAR_COLUMNS)),
+        ),
+        ("path_id", "commit_id"),
+    ),
+    "function_commit": (
+        (
+            _FILE_FIELD,
+            _function_field("function_id", ""),
+            _CompactField("plain", "function_nloc", ("function_nloc",)),
+            _COMMIT_FIELD,
+            *_COMMIT_PATH_FIELDS,
+            _CompactField("plain", "path_change", ("path_change",)),
+            _CompactField("label", "commit_type_id", ("commit_type",)),
+        ),
+        ("path_id", "function_id", "commit_id"),
+    ),
+    "file_import": (
+        (
+            _FILE_FIELD,
+            _CompactField("path", "import_path_id", ("import_file_path",)),
+            _CompactField("label", "import_file_name_id", ("import_file_name",)),
+            _CompactField("path", "import_dir_path_id", ("import_file_dir_path",)),
+            _CompactField("label", "import_file_pkg_id", ("import_file_pkg",)),
+            *_INTERVAL_FIELDS,
+        ),
+        ("path_id", "import_path_id", "commit_id_start", "commit_id_oldest", "commit_id_end"),
+    ),
+    "function_to_file": (
+        (_FILE_FIELD, _function_field("function_id", ""), *_INTERVAL_FIELDS),
+        ("path_id", "function_id", "commit_id_start", "commit_id_oldest", "commit_id_end"),
+    ),
+    "function_call": (
+        (
+            _FILE_FIELD,
+            _function_field("calling_function_id", "calling_"),
+            _function_field("called_function_id", "called_"),
+            *_INTERVAL_FIELDS,
+        ),
+        (
+            "path_id", "calling_function_id", "called_function_id",
+            "commit_id_start", "commit_id_oldest", "commit_id_end",
+        ),
+    ),
+    "raw_function_call": (
+        (
+            _FILE_FIELD,
+            _CompactField(
+                "label", "calling_function_name_id", ("calling_function_unqualified_name",)
+            ),
+            _CompactField(
+                "plain", "calling_function_nr_parameters", ("calling_function_nr_parameters",)
+            ),
+            _CompactField(
+                "label", "called_function_name_id", ("called_function_unqualified_name",)
+            ),
+            _CompactField(
+                "plain", "called_function_nr_parameters", ("called_function_nr_parameters",)
+            ),
+            *_INTERVAL_FIELDS,
+        ),
+        (
+            "path_id", "calling_function_name_id", "calling_function_nr_parameters",
+            "called_function_name_id", "commit_id_start", "commit_id_oldest", "commit_id_end",
+        ),
+    ),
+}
+
+_DICTIONARY_TABLES = {
+    "commit_ref": """(commit_id integer primary key, commit_hash text not null unique,
+        commit_datetime integer, commit_datetime_text text)""",
+    "path_ref": """(path_id integer primary key, path text not null unique,
+        file_name text, file_dir_path text)""",
+    "label_ref": "(label_id integer primary key, label text not null unique)",
+    "function_ref": f"""(function_id integer primary key, {", ".join(_FUNCTION_COLUMNS)},
+        unique ({", ".join(_FUNCTION_COLUMNS)}))""",
+}
+
+# the compact column of a field from its text columns {0}, {1}...
+_ENCODE_TEMPLATES = {
+    "plain": "{0}",
+    "flag": "CASE {0} WHEN 'True' THEN 1 WHEN 'False' THEN 0 END",
+    "label": "(SELECT label_id FROM label_ref WHERE label = {0})",
+    "path": "(SELECT path_id FROM path_ref WHERE path = {0})",
+    "file": "(SELECT path_id FROM path_ref WHERE path = {2})",
+    "commit": "(SELECT commit_id FROM commit_ref WHERE commit_hash = {0})",
+    "function": f"""(SELECT function_id FROM function_ref WHERE {" AND ".join(
+        f"{column} IS {{{i}}}" for i, column in enumerate(_FUNCTION_COLUMNS)
+    )})""",
+}
+
+# the dictionary table, its id column and the text columns of a field
+_DECODE_REFS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "label": ("label_ref", "label_id", ("label",)),
+    "path": ("path_ref", "path_id", ("path",)),
+    "file": ("path_ref", "path_id", ("file_name", "file_dir_path", "path")),
+    "commit": ("commit_ref", "commit_id", ("commit_hash", "commit_datetime_text")),
+    "function": ("function_ref", "function_id", _FUNCTION_COLUMNS),
+    "calendar": ("commit_ref", "commit_id", tuple(CALENDAR_COLUMNS)),
+}
+
+# indexes of the joins on the ids and of the conditions on file names of the views
+_COMPACT_INDEXES = {
+    "file_commit_compact_commit_id": ("file_commit_compact", ("commit_id", "path_id")),
+    "path_ref_file_name": ("path_ref", ("file_name",)),
+    "path_ref_file_dir_path": ("path_ref", ("file_dir_path",)),
+    "commit_ref_month": ("commit_ref", ("commit_year", "commit_month")),
+}
+
+
+def is_compact_db(con: sqlite3.Connection) -> bool:
+    return (
+        con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'git_commit'"
+        ).fetchone()
+        is not None
+    )
+
+
+def compact_project_db(path_to_project_db: str) -> None:
+    """
+    Replaces the text tables by their compact tables and compatibility views, then vacuums
+    the db. Nothing is changed if a text row cannot be restored exactly from the compact
+    tables, e.g. if a commit hash has two datetimes.
+    """
+    con = sqlite3.connect(path_to_project_db, isolation_level=None)
+    con.create_function("to_epoch", 1, _to_epoch, deterministic=True)
+    try:
+        if is_compact_db(con):
+            logging.info("%s is already compact", path_to_project_db)
+            return
+        nr_bytes = os.path.getsize(path_to_project_db)
+        con.execute("BEGIN")
+        try:
+            _create_dictionary_tables(con)
+            for table, (fields, key_columns) in _COMPACT_TABLES.items():
+                _compact_table(con, table, fields, key_columns)
+            for index, (table, columns) in _COMPACT_INDEXES.items():
+                con.execute(f"CREATE INDEX {index} ON {table} ({', '.join(columns)})")
+            con.execute("COMMIT")
+        except ValueError as err:
+            con.execute("ROLLBACK")
+            logging.warning("Keep the text tables of %s: %s", path_to_project_db, err)
+            return
+        except sqlite3.Error:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("VACUUM")
+        con.execute("ANALYZE")
+        logging.info(
+            "Compacted %s from %d to %d bytes",
+            path_to_project_db,
+            nr_bytes,
+            os.path.getsize(path_to_project_db),
+        )
+    except sqlite3.Error as err:
+        _log_sqlite_error(err)
+        raise
+    finally:
+        con.close()
+
+
+def expand_project_db(path_to_project_db: str, keep_rows: bool = True) -> None:
+    """
+    Restores the text tables of a compacted db, with its rows if keep_rows.
+    """
+    if not os.path.exists(path_to_project_db):
+        return
+    con = sqlite3.connect(path_to_project_db, isolation_level=None)
+    try:
+        if not is_compact_db(con):
+            return
+        con.execute("BEGIN")
+        try:
+            for table in _COMPACT_TABLES:
+                con.execute(f"DROP VIEW {table}")
+            # the rollups are counted again from the restored rows
+            for table in _CHANGE_ROLLUPS:
+                con.execute(f"DROP TABLE IF EXISTS {table}")
+            _create_commit_based_tables(con.cursor())
+            for table, (fields, _) in _COMPACT_TABLES.items():
+                if keep_rows:
+                    column_list = ", ".join(
+                        column
+                        for field in fields
+                        if field.kind != "calendar"
+                        for column in field.text_columns
+                    )
+                    con.execute(
+                        f"""INSERT INTO {table} ({column_list})
+                        SELECT {column_list} FROM ({_get_decode_select(table, fields)})"""
+                    )
+                con.execute(f"DROP TABLE {table}_compact")
+            _update_change_rollups(con.cursor(), 0)
+            for table in _DICTIONARY_TABLES:
+                con.execute(f"DROP TABLE {table}")
+            con.execute("COMMIT")
+        except sqlite3.Error:
+            con.execute("ROLLBACK")
+            raise
+        logging.info("Expanded %s, kept rows %s", path_to_project_db, keep_rows)
+    except sqlite3.Error as err:
+        _log_sqlite_error(err)
+        raise
+    finally:
+        con.close()
+
+
+def _create_dictionary_tables(con: sqlite3.Connection) -> None:
+    for table, columns in _DICTIONARY_TABLES.items():
+        con.execute(f"CREATE TABLE {table} {columns}")
+    add_calendar_columns(con.cursor(), "commit_ref", "commit_datetime_text")
+
+    commit_pairs = _get_union("commit", lambda columns: columns)
+    conflicting_hash = con.execute(
+        f"""SELECT c0 FROM ({commit_pairs})
+        GROUP BY c0 HAVING COUNT(*) > 1 OR (c0 IS NULL AND COUNT(c1) > 0)"""
+    ).fetchone()
+    if conflicting_hash is not None:
+        raise ValueError(f"commit {conflicting_hash[0]} has more than one datetime")
+    # the commit ids are in the order of git_commit, the traversal order
+    con.execute(
+        f"""INSERT INTO commit_ref (commit_hash, commit_datetime_text, commit_datetime)
+        SELECT u.c0, u.c1, to_epoch(u.c1) FROM ({commit_pairs}) AS u
+        LEFT JOIN git_commit AS g ON g.commit_hash = u.c0
+        WHERE u.c0 IS NOT NULL
+        ORDER BY g.rowid IS NULL, g.rowid"""
+    )
+
+    # the file name and dir path of a path are the ones of its FileData
+    for file_name, file_dir_path, file_path in con.execute(
+        _get_union("file", lambda columns: columns)
+    ).fetchall():
+        file_data = FileData(str(file_path))
+        if (file_name, file_dir_path) != (
+            file_data.get_file_name(),
+            file_data.get_file_dir_path(),
+        ):
+            raise ValueError(f"file name or dir path of {file_path} differ from the path")
+    paths = con.execute(
+        f"""SELECT c0 FROM ({_get_union("file", lambda columns: columns[2:])})
+        UNION SELECT c0 FROM ({_get_union("path", lambda columns: columns)})"""
+    ).fetchall()
+    file_datas = [FileData(path) for path, in paths if path is not None]
+    con.executemany(
+        "INSERT INTO path_ref (path, file_name, file_dir_path) VALUES (?, ?, ?)",
+        [
+            (file_data.get_file_path(), file_data.get_file_name(), file_data.get_file_dir_path())
+            for file_data in file_datas
+        ],
+    )
+
+    con.execute(
+        f"""INSERT INTO label_ref (label)
+        SELECT c0 FROM ({_get_union("label", lambda columns: columns)}) WHERE c0 IS NOT NULL"""
+    )
+    con.execute(
+        f"""INSERT INTO function_ref ({", ".join(_FUNCTION_COLUMNS)})
+        {_get_union("function", lambda columns: columns)}"""
+    )
+
+
+def _compact_table(
+    con: sqlite3.Connection,
+    table: str,
+    fields: Tuple[_CompactField, ...],
+    key_columns: Tuple[str, ...],
+) -> None:
+    stored_fields = [field for field in fields if field.kind != "calendar"]
+    con.execute(
+        f"""CREATE TABLE {table}_compact
+        ({", ".join(f"{field.column} integer" for field in stored_fields)},
+        primary key ({", ".join(key_columns)}))"""
+    )
+    con.execute(
+        f"""INSERT INTO {table}_compact ({", ".join(field.column for field in stored_fields)})
+        SELECT {", ".join(_get_encode_expression(field) for field in stored_fields)}
+        FROM {table} AS t ORDER BY t.rowid"""
+    )
+    decode_select = _get_decode_select(table, fields)
+    # the compact rows are checked against the text rows before these are dropped
+    nr_differing_rows = con.execute(
+        f"SELECT COUNT(*) FROM (SELECT * FROM {table} EXCEPT {decode_select})"
+    ).fetchone()[0]
+    if nr_differing_rows:
+        raise ValueError(f"{nr_differing_rows} rows of {table} differ in the compact table")
+    con.execute(f"DROP TABLE {table}")
+    con.execute(f"CREATE VIEW {table} AS {decode_select}")
+
+
+def _get_union(
+    kind: str, select_columns: Callable[[Tuple[str, ...]], Tuple[str, ...]]
+) -> str:
+    """
+    The distinct values of the text columns of the fields of the kind, over all tables,
+    with the selected columns named c0, c1...
+    """
+    selects = []
+    for table, (fields, _) in _COMPACT_TABLES.items():
+        for field in fields:
+            if field.kind == kind:
+                columns = select_columns(field.text_columns)
+                selects.append(
+                    f"""SELECT {", ".join(f"{column} AS c{i}" for i, column in enumerate(columns))}
+                    FROM {table}"""
+                )
+    return " UNION ".join(selects)
+
+
+def _get_encode_expression(field: _CompactField) -> str:
+    return _ENCODE_TEMPLATES[field.kind].format(
+        *(f"t.{column}" for column in field.text_columns)
+    )
+
+
+def _get_decode_select(table: str, fields: Tuple[_CompactField, ...]) -> str:
+    """
+    The text rows of the compact table, with the dictionary tables joined, so that the
+    conditions on the text columns of the view can use their indexes.
+    """
+    columns: List[str] = []
+    joins: List[str] = []
+    for i, field in enumerate(fields):
+        column = f"c.{field.column}"
+        if field.kind in _DECODE_REFS:
+            ref_table, id_column, ref_columns = _DECODE_REFS[field.kind]
+            joins.append(f"LEFT JOIN {ref_table} AS r{i} ON r{i}.{id_column} = {column}")
+            expressions = [f"r{i}.{ref_column}" for ref_column in ref_columns]
+        elif field.kind == "flag":
+            expressions = [f"CASE {column} WHEN 1 THEN 'True' WHEN 0 THEN 'False' ELSE 'None' END"]
+        else:
+            expressions = [column]
+        columns.extend(
+            f"{expression} AS {text_column}"
+            for expression, text_column in zip(expressions, field.text_columns)
+        )
+    return f"SELECT {', '.join(columns)} FROM {table}_compact AS c {' '.join(joins)}"
+
+
+def _to_epoch(text: Optional[str]) -> Optional[int]:
+    """
+    Epoch seconds of a str(datetime) text, datetimes without time zone are taken as utc.
+    """
+    if text is None:
+        return None
+    try:
+        date = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
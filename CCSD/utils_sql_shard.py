@@ -0,0 +1,91 @@
+"""
+Commit data dbs, holding the extracted GitCommitData of mined commits:
+- the shard dbs of the distributed mining, each with a chunk of consecutive commits, which are
+  written into the project db in traversal order,
+- the commit data db of the project, with the commits of all runs on the project db, so that
+  a resumed run can write them again after the new commits of the branch.
+
+How the writer updates the interval tables for a commit depends on the open rows the newer
+commits left, e.g. a kept function closes the open row of a newer commit or opens a new one,
+and the oldest hashes of the open rows are overwritten by every older commit. The interval
+rows of a chunk that was written without the rows of the newer chunks can therefore not be
+joined with them afterwards. The extracted commits are merged instead, by writing them
+through the writer of the project db once all newer commits are written.
+"""
+import os
+import pickle
+import sqlite3
+import zlib
+from typing import Iterator, List, Optional, Set
+
+from .models import GitCommitData
+
+
+def get_shard_db_path(path_to_project_db: str, shard_name: str) -> str:
+    db_dir, db_file_name = os.path.split(path_to_project_db)
+    return os.path.join(
+        db_dir, "shards", f"{os.path.splitext(db_file_name)[0]}_{shard_name}.db"
+    )
+
+
+def get_commit_data_db_path(path_to_project_db: str) -> str:
+    db_dir, db_file_name = os.path.split(path_to_project_db)
+    return os.path.join(db_dir, f"{os.path.splitext(db_file_name)[0]}_commit_data.db")
+
+
+class CommitDataDb:
+    """
+    The pickled GitCommitData of commits by hash, in the order they were put.
+    Every put is committed on its own.
+    """
+
+    def __init__(self, path_to_db: str) -> None:
+        self.con = sqlite3.connect(path_to_db)
+        self.con.execute(
+            """CREATE TABLE IF NOT EXISTS commit_data
+                (commit_hash text primary key, data blob)"""
+        )
+        self.con.commit()
+
+    def __enter__(self) -> "CommitDataDb":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.con.close()
+
+    def put(self, commit_data: GitCommitData) -> None:
+        with self.con:
+            self.con.execute(
+                "INSERT OR REPLACE INTO commit_data (commit_hash, data) VALUES (?, ?)",
+                (commit_data.hash, zlib.compress(pickle.dumps(commit_data))),
+            )
+
+    def get(self, commit_hash: str) -> Optional[GitCommitData]:
+        row = self.con.execute(
+            "SELECT data FROM commit_data WHERE commit_hash = ?", (commit_hash,)
+        ).fetchone()
+        return _load_commit_data(row[0]) if row else None
+
+    def get_commit_hashes(self) -> Set[str]:
+        return {row[0] for row in self.con.execute("SELECT commit_hash FROM commit_data")}
+
+    def get_missing_commit_hashes(self, commit_hashes: List[str]) -> List[str]:
+        """
+        The commit hashes that are not in the db, in their order.
+        """
+        commit_hashes_in_db = self.get_commit_hashes()
+        return [
+            commit_hash for commit_hash in commit_hashes if commit_hash not in commit_hashes_in_db
+        ]
+
+    def get_commits(self) -> Iterator[GitCommitData]:
+        for (data,) in self.con.execute("SELECT data FROM commit_data ORDER BY rowid"):
+            yield _load_commit_data(data)
+
+
+def _load_commit_data(data: bytes) -> GitCommitData:
+    commit_data: GitCommitData = pickle.loads(zlib.decompress(data))
+    return commit_data
@@ -0,0 +1,21 @@
+import sqlite3
+
+
+# PRAGMA profile of the analytics reads, the mining writes with its own connection
+ANALYTICS_PRAGMAS = [
+    "PRAGMA query_only = ON",
+    "PRAGMA mmap_size = 1073741824",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+def connect_analytics_db(path_to_analytics_db: str) -> sqlite3.Connection:
+    """
+    Returns a read only connection to the analytics database, with the db file memory mapped
+    and a larger page cache for the aggregations of the notebooks.
+    """
+    con = sqlite3.connect(path_to_analytics_db)
+    for pragma in ANALYTICS_PRAGMAS:
+        con.execute(pragma)
+    return con
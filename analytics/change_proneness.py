@@ -1,10 +1,32 @@
+import json
 import pandas as pd
 import numpy as np
 
-from typing import Optional, List
+from datetime import datetime
+from typing import Optional, List, Tuple
+from scipy import sparse
 from IPython.display import display
 
 
+# year and period column of the rollup tables, column of the period labels and column of the counts per period type,
+# a week is labelled with its iso year
+_PERIODS = {
+    'w': ('week', 'commit_iso_year', 'commit_iso_week', 'yr_wk', 'changes_in_week'),
+    'm': ('month', 'commit_year', 'commit_month', 'yr_m', 'changes_in_month'),
+}
+
+# the year and period columns of a day d, as the generated calendar columns of file_commit
+_DAY_CALENDAR_EXPRESSIONS = {
+    'commit_iso_year': "CAST(strftime('%Y', date(d, '-3 days', 'weekday 4')) AS integer)",
+    'commit_iso_week': "(strftime('%j', date(d, '-3 days', 'weekday 4')) - 1) / 7 + 1",
+    'commit_year': "CAST(strftime('%Y', d) AS integer)",
+    'commit_month': "CAST(strftime('%m', d) AS integer)",
+}
+
+# the displayed heatmap is limited to the files or components with the most changes
+_MAX_DISPLAY_CELLS = 100000
+
+
 def show_file_change_proneness(con, period_type: Optional[str] = None, start_date: Optional[str] = None,
                                end_date: Optional[str] = None, file_name_list: Optional[List[str]] = None) -> pd.DataFrame:
     """
@@ -12,70 +34,51 @@ def show_file_change_proneness(con, period_type: Optional[str] = None, start_dat
 
     Parameters:
       period_type: 'm','w'
-      start_date: date format '12-11-2019'
-      end_date: date format '12-11-2019'
+      start_date: date format '12-11-2019', the whole period of the date is included
+      end_date: date format '12-11-2019', the whole period of the date is included
       file_name_list: Optional[List[str]]
 
     Returns:
-      df: dataframe with 
+      df: sparse dataframe with the number of changes per file and period, NaN if the file did not change
     """
-    if period_type == 'w':
-        sql_statement = """select
-        file_name,
-        strftime('%Y', date(commit_commiter_datetime)) as iso_yr,
-        (strftime('%j', date(commit_commiter_datetime, '-3 days', 'weekday 4')) - 1) / 7 + 1 as iso_week,
-        count(*) as changes_in_week
-        from file_commit
-        group by 
-        file_name,
-        strftime('%Y', date(commit_commiter_datetime)),
-        (strftime('%j', date(commit_commiter_datetime, '-3 days', 'weekday 4')) - 1) / 7 + 1;"""
-        df = pd.read_sql_query(sql_statement, con)
-
-        df['yr_wk'] = df.apply(lambda row: ''.join([str(row.iso_yr),
-                               '-', str(row.iso_week)]), axis=1)
-        pdf = df[['yr_wk', 'file_name', 'changes_in_week']]
-        changes_matrix = pd.pivot_table(pdf, index=['file_name'], values='changes_in_week',
-                                        columns=['yr_wk'], aggfunc=np.sum)
-        changes_matrix_styler = changes_matrix.style.background_gradient(cmap='viridis')\
-            .set_properties(**{'font-size': '5px'})
-        display(changes_matrix_styler)
-        return changes_matrix
+    period, year_column, period_column, label_column, count_column = _PERIODS['w' if period_type == 'w' else 'm']
+    window_cte, window_condition, params = _get_window_filter(
+        f'file_change_{period}', year_column, period_column, start_date, end_date)
+    file_condition = ''
+    if file_name_list is not None:
+        file_condition = 'and file_name in (select value from json_each(?))'
+        params.append(json.dumps(file_name_list))
+    sql_statement = f"""{window_cte}
+    select
+    file_name,
+    {year_column} as iso_yr,
+    {_get_period_label_expression(period_column)} as iso_period,
+    sum(nr_changes) as {count_column}
+    from file_change_{period}
+    where {window_condition}
+    {file_condition}
+    group by
+    file_name,
+    {year_column},
+    {period_column};"""
+    df = pd.read_sql_query(sql_statement, con, params=params)
 
-    else:
-        sql_statement = """select
-        file_name,
-        strftime('%Y', date(commit_commiter_datetime)) as iso_yr,
-        strftime('%m', date(commit_commiter_datetime)) as iso_month,
-        count(*) as changes_in_month
-        from file_commit
-        group by 
-        file_name,
-        strftime('%Y', date(commit_commiter_datetime)),
-        strftime('%m', date(commit_commiter_datetime));"""
-        df_m = pd.read_sql_query(sql_statement, con)
-
-        df_m['yr_m'] = df_m.apply(lambda row: ''.join(
-            [str(row.iso_yr), '-', str(row.iso_month)]), axis=1)
-        changes_matrix_m = pd.pivot_table(df_m, index=['file_name'], values='changes_in_month',
-                                          columns=['yr_m'], aggfunc=np.sum)
-        changes_matrix_m_styler = changes_matrix_m.style.background_gradient(cmap='viridis')\
-            .set_properties(**{'font-size': '5px'})
-        display(changes_matrix_m_styler)
-        return changes_matrix_m
+    changes_matrix = _get_sparse_changes_matrix(df, 'file_name', label_column, count_column)
+    _display_changes_matrix(changes_matrix)
+    return changes_matrix
 
 
 def plot_change_distribution_file(con_analytics_db):
     sql_statement = """select
     file_name,
-    count(*) as nr_changes
-    from file_commit
-    group by 
+    sum(nr_changes) as nr_changes
+    from file_change_month
+    group by
     file_name;"""
     df = pd.read_sql_query(sql_statement, con_analytics_db)
     dd = df.hist()
     display(dd)
-    return df   
+    return df
 
 
 def show_component_change_proneness(con, period_type: Optional[str] = None, start_date: Optional[str] = None,
@@ -85,56 +88,118 @@ def show_component_change_proneness(con, period_type: Optional[str] = None, star
 
     Parameters:
       period_type: 'm','w'
-      start_date: date format '12-11-2019'
-      end_date: date format '12-11-2019'
-      file_name_list: Optional[List[str]]
+      start_date: date format '12-11-2019', the whole period of the date is included
+      end_date: date format '12-11-2019', the whole period of the date is included
+      file_name_list: Optional[List[str]], only the changes of these files are aggregated
 
     Returns:
-      df: dataframe with 
+      df: sparse dataframe with the number of changes per component and period, NaN if the component did not change
     """
-    if period_type == 'w':
-        sql_statement = """select
+    period, year_column, period_column, label_column, count_column = _PERIODS['w' if period_type == 'w' else 'm']
+    if file_name_list is None:
+        window_cte, window_condition, params = _get_window_filter(
+            f'dir_change_{period}', year_column, period_column, start_date, end_date)
+        sql_statement = f"""{window_cte}
+        select
         file_dir_path,
-        strftime('%Y', date(commit_commiter_datetime)) as iso_yr,
-        (strftime('%j', date(commit_commiter_datetime, '-3 days', 'weekday 4')) - 1) / 7 + 1 as iso_week,
-        count(*) as changes_in_week
-        from file_commit
-        where change_type != 'ModificationType.DELETE'
-        group by 
+        {year_column} as iso_yr,
+        {_get_period_label_expression(period_column)} as iso_period,
+        sum(nr_changes - nr_deletions) as {count_column}
+        from dir_change_{period}
+        where {window_condition}
+        group by
         file_dir_path,
-        strftime('%Y', date(commit_commiter_datetime)),
-        (strftime('%j', date(commit_commiter_datetime, '-3 days', 'weekday 4')) - 1) / 7 + 1;"""
-        df = pd.read_sql_query(sql_statement, con)
-
-        df['yr_wk'] = df.apply(lambda row: ''.join([str(row.iso_yr),
-                               '-', str(row.iso_week)]), axis=1)
-        pdf = df[['yr_wk', 'file_dir_path', 'changes_in_week']]
-        changes_matrix = pd.pivot_table(pdf, index=['file_dir_path'], values='changes_in_week',
-                                        columns=['yr_wk'], aggfunc=np.sum)
-        changes_matrix_styler = changes_matrix.style.background_gradient(cmap='viridis')\
-            .set_properties(**{'font-size': '5px'})
-        display(changes_matrix_styler)
-        return changes_matrix
-
+        {year_column},
+        {period_column}
+        having {count_column} > 0;"""
     else:
-        sql_statement = """select
+        # the rollups of the components do not have the files, the changes of the files are counted
+        window_cte, window_condition, params = _get_window_filter(
+            'file_commit', year_column, period_column, start_date, end_date)
+        params.append(json.dumps(file_name_list))
+        sql_statement = f"""{window_cte}
+        select
         file_dir_path,
-        strftime('%Y', date(commit_commiter_datetime)) as iso_yr,
-        strftime('%m', date(commit_commiter_datetime)) as iso_month,
-        count(*) as changes_in_month
+        {year_column} as iso_yr,
+        {_get_period_label_expression(period_column)} as iso_period,
+        count(*) as {count_column}
         from file_commit
-        where change_type != 'ModificationType.DELETE'
-        group by 
+        where {window_condition}
+        and file_name in (select value from json_each(?))
+        and change_type != 'ModificationType.DELETE'
+        and file_dir_path is not null and {year_column} is not null
+        group by
         file_dir_path,
-        strftime('%Y', date(commit_commiter_datetime)),
-        strftime('%m', date(commit_commiter_datetime));"""
-        df_m = pd.read_sql_query(sql_statement, con)
-
-        df_m['yr_m'] = df_m.apply(lambda row: ''.join(
-            [str(row.iso_yr), '-', str(row.iso_month)]), axis=1)
-        changes_matrix_m = pd.pivot_table(df_m, index=['file_dir_path'], values='changes_in_month',
-                                          columns=['yr_m'], aggfunc=np.sum)
-        changes_matrix_m_styler = changes_matrix_m.style.background_gradient(cmap='viridis')\
-            .set_properties(**{'font-size': '5px'})
-        display(changes_matrix_m_styler)
-        return changes_matrix_m
\ No newline at end of file
+        {year_column},
+        {period_column};"""
+    df = pd.read_sql_query(sql_statement, con, params=params)
+
+    changes_matrix = _get_sparse_changes_matrix(df, 'file_dir_path', label_column, count_column)
+    _display_changes_matrix(changes_matrix)
+    return changes_matrix
+
+
+def _get_period_label_expression(period_column: str) -> str:
+    # the month labels are zero padded, the week labels are not
+    return f"printf('%02d', {period_column})" if period_column == 'commit_month' else period_column
+
+
+def _get_window_filter(table: str, year_column: str, period_column: str, start_date: Optional[str],
+                       end_date: Optional[str]) -> Tuple[str, str, List[Optional[str]]]:
+    """
+    Returns the common table expression of the periods of the days from start_date to end_date, the condition on the
+    year_column and period_column of the table and their parameters. A missing date is the first or last day of the
+    years of the table.
+    """
+    if start_date is None and end_date is None:
+        return '', 'true', []
+    window_cte = f"""with recursive window_day(d) as (
+        select date(ifnull(?, (select min({year_column}) from {table}) || '-01-01'))
+        union all
+        select date(d, '+1 day') from window_day
+        where d < date(ifnull(?, (select max({year_column}) from {table}) || '-12-31'))
+    ),
+    window_period(yr, period) as (
+        select distinct {_DAY_CALENDAR_EXPRESSIONS[year_column]}, {_DAY_CALENDAR_EXPRESSIONS[period_column]}
+        from window_day
+    )"""
+    window_condition = f'({year_column}, {period_column}) in (select yr, period from window_period)'
+    return window_cte, window_condition, [_to_sql_date(start_date), _to_sql_date(end_date)]
+
+
+def _to_sql_date(text: Optional[str]) -> Optional[str]:
+    return datetime.strptime(text, '%d-%m-%Y').date().isoformat() if text else None
+
+
+def _get_sparse_changes_matrix(df: pd.DataFrame, index_column: str, label_column: str,
+                               count_column: str) -> pd.DataFrame:
+    """
+    The counts of df as a sparse matrix of index_column x period label, with the labels in sorted order. The cells
+    without changes are NaN, as in the pivot table of the counts.
+    """
+    labels = df['iso_yr'].astype(str) + '-' + df['iso_period'].astype(str)
+    rows = pd.Categorical(df[index_column])
+    columns = pd.Categorical(labels)
+    matrix = sparse.csr_matrix(
+        (df[count_column].to_numpy(dtype=np.float64), (rows.codes, columns.codes)),
+        shape=(len(rows.categories), len(columns.categories)))
+    return pd.DataFrame.sparse.from_spmatrix(
+        matrix,
+        index=pd.Index(rows.categories, name=index_column),
+        columns=pd.Index(columns.categories, name=label_column)).astype(pd.SparseDtype(np.float64, np.nan))
+
+
+def _display_changes_matrix(changes_matrix: pd.DataFrame) -> None:
+    """
+    Displays the heatmap of the rows with the most changes that fit in _MAX_DISPLAY_CELLS, in their order.
+    """
+    nr_rows = max(1, _MAX_DISPLAY_CELLS // max(1, changes_matrix.shape[1]))
+    if changes_matrix.shape[0] > nr_rows:
+        totals = np.asarray(changes_matrix.sparse.to_coo().sum(axis=1)).ravel()
+        shown_rows = np.sort(np.argsort(-totals, kind='stable')[:nr_rows])
+        print(f'Showing the {nr_rows} of {changes_matrix.shape[0]} rows with the most changes')
+        changes_matrix = changes_matrix.iloc[shown_rows]
+    dense_changes_matrix = changes_matrix.sparse.to_dense()
+    changes_matrix_styler = dense_changes_matrix.style.background_gradient(cmap='viridis')\
+        .set_properties(**{'font-size': '5px'})
+    display(changes_matrix_styler)
@@ -1,7 +1,7 @@
 from typing import Callable, Generic, List, Tuple, TypeVar
 
 from .canvas import Signature
-from .result import GroupResult
+from .result import AsyncResult, GroupResult
 
 
 class Task:
@@ -9,11 +9,16 @@ class Task:
 
 
 _T = TypeVar('_T')
+_R = TypeVar('_R')
 
 
-class _GenericTask(Generic[_T], Task):
+class _GenericTask(Generic[_T, _R], Task):
+    def __call__(self, *args: object) -> _R: ...
+
     def signature(self, args: _T) -> Signature: ...
 
+    def apply_async(self, args: _T) -> AsyncResult[_R]: ...
+
 
 _T1 = TypeVar('_T1')
 _T2 = TypeVar('_T2')
@@ -23,7 +28,7 @@ _T3 = TypeVar('_T3')
 class Celery:
     def __init__(self, include: List[str] = ...) -> None: ...
 
-    def task(self) -> Callable[[Callable[[_T1, _T2, _T3], None]], _GenericTask[Tuple[_T1, _T2, _T3]]]: ...
+    def task(self) -> Callable[[Callable[[_T1, _T2, _T3], _R]], _GenericTask[Tuple[_T1, _T2, _T3], _R]]: ...
 
 
 class group(Signature):
@@ -1,6 +1,15 @@
+from typing import Generic, TypeVar
+
+_R = TypeVar('_R')
+
+
 class ResultSet:
     def join(self) -> None: ...
 
 
 class GroupResult(ResultSet):
     pass
+
+
+class AsyncResult(Generic[_R]):
+    def get(self) -> _R: ...
@@ -0,0 +1,21 @@
+from typing import List
+
+
+class FunctionInfo:
+    name: str
+    long_name: str
+    parameters: List[str]
+    nloc: int
+    start_line: int
+    end_line: int
+
+
+class FileInformation:
+    function_list: List[FunctionInfo]
+
+
+class FileAnalyzer:
+    def analyze_source_code(self, filename: str, code: str) -> FileInformation: ...
+
+
+analyze_file: FileAnalyzer
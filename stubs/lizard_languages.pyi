@@ -0,0 +1,7 @@
+from typing import Optional
+
+
+class CodeReader: ...
+
+
+def get_reader_for(filename: str) -> Optional[type[CodeReader]]: ...
@@ -1,6 +1,8 @@
 from enum import Enum
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
+
+from git.diff import Diff
 
 from .developer import Developer
 
@@ -19,9 +21,13 @@ class Method:
     long_name: str
     parameters: List[str]
     nloc: int
+    start_line: int
+    end_line: int
 
 
 class ModifiedFile:
+    _c_diff: Diff
+    def __init__(self, diff: Diff) -> None: ...
     filename: str
     old_path: Optional[str]
     new_path: Optional[str]
@@ -31,10 +37,12 @@ class ModifiedFile:
     change_type: ModificationType
     source_code: str
     source_code_before: str
+    diff_parsed: Dict[str, List[Tuple[int, str]]]
 
 
 class Commit:
     hash: str
+    parents: List[str]
     committer_date: datetime
     author: Developer
     merge: bool
@@ -1,3 +1,4 @@
 class Developer:
+    def __init__(self, name: str, email: str) -> None: ...
     name: str
     email: str
@@ -0,0 +1,7 @@
+from .domain.commit import Commit
+
+
+class Git:
+    def __init__(self, path: str) -> None: ...
+
+    def get_commit(self, commit_id: str) -> Commit: ...
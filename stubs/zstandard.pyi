@@ -0,0 +1,6 @@
+class ZstdCompressor:
+    def compress(self, data: bytes) -> bytes: ...
+
+
+class ZstdDecompressor:
+    def decompress(self, data: bytes) -> bytes: ...
@@ -0,0 +1,60 @@
+import logging
+import os
+import random
+from pathlib import Path
+
+import pytest
+
+from CCSD.cache_manager import CacheManager
+
+
+def _content(seed: int) -> str:
+    # text that does not compress much, so that every file has about the same size
+    return "".join(random.Random(seed).choices("0123456789abcdef", k=4000))
+
+
+def _get_cached_size(tmp_path: Path) -> int:
+    return sum(path.stat().st_size for path in tmp_path.rglob("*") if path.is_file())
+
+
+def test_overwritten_files_are_not_counted_twice(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    cache_manager = CacheManager([str(tmp_path)], 0)
+    cache_manager.write(str(tmp_path / "a" / "0"), _content(0))
+    nr_file_bytes = _get_cached_size(tmp_path)
+    cache_manager = CacheManager([str(tmp_path)], int(nr_file_bytes * 2.5))
+    cache_manager.write(str(tmp_path / "a" / "1"), _content(1))
+
+    with caplog.at_level(logging.INFO):
+        for seed in range(20):
+            cache_manager.write(str(tmp_path / "a" / "0"), _content(seed))
+
+    # the budget is not exceeded, the cache files are not listed for an eviction
+    assert not [record for record in caplog.records if "Evicted" in record.message]
+
+    assert cache_manager.read(str(tmp_path / "a" / "1")) == _content(1)
+    assert cache_manager.read(str(tmp_path / "a" / "0")) == _content(19)
+
+
+def test_least_recently_used_files_are_evicted(tmp_path: Path) -> None:
+    cache_manager = CacheManager([str(tmp_path)], 0)
+    cache_manager.write(str(tmp_path / "0"), _content(0))
+    nr_file_bytes = _get_cached_size(tmp_path)
+    cache_manager = CacheManager([str(tmp_path)], int(nr_file_bytes * 3.5))
+    for seed in range(1, 3):
+        cache_manager.write(str(tmp_path / str(seed)), _content(seed))
+    for seed in range(3):
+        os.utime(tmp_path / f"{seed}{cache_manager.suffix}", (seed, seed))
+    # reading marks the oldest file as recently used
+    assert cache_manager.read(str(tmp_path / "0")) == _content(0)
+
+    cache_manager.write(str(tmp_path / "3"), _content(3))
+
+    assert cache_manager.read(str(tmp_path / "1")) is None
+    assert [cache_manager.read(str(tmp_path / str(seed))) for seed in (0, 2, 3)] == [
+        _content(0),
+        _content(2),
+        _content(3),
+    ]
+    assert _get_cached_size(tmp_path) <= nr_file_bytes * 3.5 * 0.9 + 1
@@ -0,0 +1,139 @@
+import math
+import sqlite3
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import pytest
+from conftest import write_file_commits
+from pydriller.domain.commit import ModificationType
+
+from analytics import change_proneness
+from analytics.change_proneness import show_component_change_proneness, show_file_change_proneness
+
+_Cells = Dict[Tuple[str, str], int]
+
+
+@pytest.fixture(name="con")
+def fixture_con(project_db: str, monkeypatch: pytest.MonkeyPatch) -> Iterator[sqlite3.Connection]:
+    write_file_commits(project_db, 40)
+    monkeypatch.setattr(change_proneness, "_display_changes_matrix", lambda changes_matrix: None)
+    con = sqlite3.connect(project_db)
+    yield con
+    con.close()
+
+
+def _get_label(utc_date: date, period_type: str) -> str:
+    if period_type == "w":
+        iso_year, iso_week, _ = utc_date.isocalendar()
+        return f"{iso_year}-{iso_week}"
+    return f"{utc_date.year}-{utc_date.month:02d}"
+
+
+def _get_window_labels(period_type: str, start_date: str, end_date: str) -> Set[str]:
+    """
+    The labels of the periods that have a day from start_date to end_date.
+    """
+    day = datetime.strptime(start_date, "%d-%m-%Y").date()
+    labels = set()
+    while day <= datetime.strptime(end_date, "%d-%m-%Y").date():
+        labels.add(_get_label(day, period_type))
+        day += timedelta(days=1)
+    return labels
+
+
+def _count_changes(
+    con: sqlite3.Connection,
+    key_column: str,
+    period_type: str,
+    window: Optional[Tuple[str, str]],
+    file_names: Optional[List[str]],
+    with_deletions: bool,
+) -> _Cells:
+    """
+    The changes of the file_commit rows per key and period label, counted in Python.
+    """
+    counts: "Counter[Tuple[str, str]]" = Counter()
+    for key, file_name, commit_datetime, change_type in con.execute(
+        f"SELECT {key_column}, file_name, commit_commiter_datetime, change_type FROM file_commit"
+    ):
+        label = _get_label(datetime.fromisoformat(commit_datetime).astimezone(timezone.utc).date(), period_type)
+        if window is not None and label not in _get_window_labels(period_type, *window):
+            continue
+        if file_names is not None and file_name not in file_names:
+            continue
+        if with_deletions or change_type != str(ModificationType.DELETE):
+            counts[key, label] += 1
+    return {cell: count for cell, count in counts.items() if count > 0}
+
+
+def _get_cells(changes_matrix: object) -> _Cells:
+    dense = changes_matrix.sparse.to_dense()  # type: ignore[attr-defined]
+    return {
+        (key, label): int(count)
+        for key, row in dense.iterrows()
+        for label, count in row.items()
+        # the cells without changes are NaN
+        if not math.isnan(count)
+    }
+
+
+_WINDOWS = [None, ("30-12-2020", "05-01-2021"), ("15-12-2020", "15-12-2020")]
+_FILE_NAMES = [None, ["a.cpp"], ["b.cpp", "c.cpp"]]
+
+
+@pytest.mark.parametrize("period_type", ["m", "w"])
+@pytest.mark.parametrize("window", _WINDOWS)
+@pytest.mark.parametrize("file_names", _FILE_NAMES)
+def test_file_change_proneness_counts_the_changes_of_the_window(
+    con: sqlite3.Connection,
+    period_type: str,
+    window: Optional[Tuple[str, str]],
+    file_names: Optional[List[str]],
+) -> None:
+    start_date, end_date = window or (None, None)
+
+    changes_matrix = show_file_change_proneness(
+        con, period_type=period_type, start_date=start_date, end_date=end_date, file_name_list=file_names
+    )
+
+    _assert_changes_matrix(
+        changes_matrix, _count_changes(con, "file_name", period_type, window, file_names, True)
+    )
+
+
+@pytest.mark.parametrize("period_type", ["m", "w"])
+@pytest.mark.parametrize("window", _WINDOWS)
+@pytest.mark.parametrize("file_names", _FILE_NAMES)
+def test_component_change_proneness_counts_the_changes_of_the_window(
+    con: sqlite3.Connection,
+    period_type: str,
+    window: Optional[Tuple[str, str]],
+    file_names: Optional[List[str]],
+) -> None:
+    start_date, end_date = window or (None, None)
+
+    changes_matrix = show_component_change_proneness(
+        con, period_type=period_type, start_date=start_date, end_date=end_date, file_name_list=file_names
+    )
+
+    # deleted files do not count for their component
+    _assert_changes_matrix(
+        changes_matrix, _count_changes(con, "file_dir_path", period_type, window, file_names, False)
+    )
+
+
+def test_days_of_the_turn_of_the_year_are_in_the_week_of_their_iso_year(con: sqlite3.Connection) -> None:
+    changes_matrix = show_file_change_proneness(con, period_type="w", start_date="01-01-2021", end_date="03-01-2021")
+
+    assert list(changes_matrix.columns) == ["2020-53"]
+
+
+def _assert_changes_matrix(changes_matrix: object, cells: _Cells) -> None:
+    assert cells
+    assert _get_cells(changes_matrix) == cells
+    # only the cells with changes are stored
+    assert changes_matrix.sparse.density == pytest.approx(len(cells) / changes_matrix.size)  # type: ignore[attr-defined]
+    # the keys and labels with changes only, in sorted order
+    assert list(changes_matrix.index) == sorted({key for key, _ in cells})  # type: ignore[attr-defined]
+    assert list(changes_matrix.columns) == sorted({label for _, label in cells})  # type: ignore[attr-defined]
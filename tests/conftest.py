@@ -0,0 +1,291 @@
+import os
+import sqlite3
+import subprocess
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import pytest
+from pydriller.domain.commit import ModificationType
+
+from CCSD.git_repository_mining_util import write_git_commit
+from CCSD.models import (
+    CommitDates,
+    FileChangeData,
+    FileData,
+    FileImport,
+    FunctionCall,
+    GitCommitData,
+    MethodData,
+    ProjectConfig,
+    ProjectPaths,
+    build_project_config,
+    build_project_paths,
+)
+from CCSD.repository_mining_util import get_file_change_sets, set_hashes_to_function_calls
+from CCSD.subprocess_util import configure_commands, get_command_timeout
+from CCSD.utils_sql import AnalyticsDbWriter, create_commit_based_tables
+
+# tables of the full traversal, without the checkpoint that records when a commit was written
+WRITTEN_TABLES = (
+    "git_commit",
+    "file_commit",
+    "function_commit",
+    "file_import",
+    "function_to_file",
+    "raw_function_call",
+)
+
+# commits the new contents of files, None deletes a file, and returns the hash of the commit
+CommitFiles = Callable[[Dict[str, Optional[str]]], str]
+
+# the functions, imports and calls of a file before and after a change, per commit and file,
+# newest commit first as the traversal writes them
+_FileState = Tuple[List[str], List[str], List[Tuple[str, str]]]
+_HISTORY: List[Dict[str, Tuple[_FileState, _FileState, List[str]]]] = [
+    {
+        "src/a.cpp": (
+            (["f", "g"], ["x.h", "y.h"], [("f", "g")]),
+            (["f", "g", "h"], ["x.h", "y.h", "z.h"], [("f", "g"), ("h", "f")]),
+            ["f"],
+        ),
+        "src/b.cpp": (
+            (["k"], ["x.h"], [("k", "f")]),
+            (["k"], [], []),
+            ["k"],
+        ),
+    },
+    {
+        "src/a.cpp": (
+            (["f"], ["x.h"], []),
+            (["f", "g"], ["x.h", "y.h"], [("f", "g")]),
+            [],
+        ),
+    },
+    {
+        "src/a.cpp": (
+            (["f", "k"], ["x.h", "w.h"], [("f", "k")]),
+            (["f"], ["x.h"], []),
+            ["f"],
+        ),
+        "src/b.cpp": (
+            ([], [], []),
+            (["k"], ["x.h"], [("k", "f")]),
+            [],
+        ),
+    },
+    {
+        "src/a.cpp": (
+            ([], [], []),
+            (["f", "k"], ["x.h", "w.h"], [("f", "k")]),
+            [],
+        ),
+    },
+]
+
+
+def _method(name: str) -> MethodData:
+    return MethodData(f"ns::{name}", f"ns::{name}(int)", ["int"], 3, 1, 3)
+
+
+def _file_imports(file_path: str, import_file_paths: Sequence[str]) -> List[FileImport]:
+    return [
+        FileImport(FileData(file_path), path, os.path.basename(path), os.path.dirname(path))
+        for path in import_file_paths
+    ]
+
+
+def _function_calls(calls: Sequence[Tuple[str, str]]) -> List[FunctionCall]:
+    return [FunctionCall(calling, "1", called) for calling, called in calls]
+
+
+def make_file_change(
+    file_path: str,
+    before: _FileState,
+    after: _FileState,
+    changed_functions: Sequence[str],
+    commit_dates: CommitDates,
+) -> FileChangeData:
+    methods_before = [_method(name) for name in before[0]]
+    methods = [_method(name) for name in after[0]]
+    changed_methods = [_method(name) for name in changed_functions]
+    file_imports = _file_imports(file_path, after[1])
+    file_imports_prev = _file_imports(file_path, before[1])
+    function_call_rows_curr, function_call_rows_deleted = set_hashes_to_function_calls(
+        _function_calls(after[2]), _function_calls(before[2]), commit_dates
+    )
+    return FileChangeData(
+        filename=os.path.basename(file_path),
+        old_path=file_path if before[0] else None,
+        new_path=file_path,
+        change_type=ModificationType.MODIFY if before[0] else ModificationType.ADD,
+        methods_before=methods_before,
+        methods=methods,
+        changed_methods=changed_methods,
+        file_imports=file_imports,
+        file_imports_prev=file_imports_prev,
+        function_call_rows_curr=function_call_rows_curr,
+        function_call_rows_deleted=function_call_rows_deleted,
+        change_sets=get_file_change_sets(
+            methods_before, methods, changed_methods, file_imports, file_imports_prev
+        ),
+    )
+
+
+@pytest.fixture(name="history")
+def fixture_history() -> List[GitCommitData]:
+    """
+    Commits that add, change and delete functions, file imports and calls of two files,
+    newest commit first.
+    """
+    committer_date = datetime(2021, 3, 1, 12, tzinfo=timezone(timedelta(hours=1)))
+    commits = []
+    for i, files in enumerate(_HISTORY):
+        commit_hash = f"{len(_HISTORY) - i:040x}"
+        commit_dates = CommitDates(commit_hash, committer_date - timedelta(days=i))
+        file_changes = [
+            make_file_change(file_path, before, after, changed, commit_dates)
+            for file_path, (before, after, changed) in files.items()
+        ]
+        commits.append(
+            GitCommitData(
+                hash=commit_hash,
+                committer_date=commit_dates.get_commiter_datetime(),
+                author_name="dev",
+                merge=False,
+                nr_modified_files=len(file_changes),
+                nr_deletions=1,
+                nr_insertions=2,
+                nr_lines=3,
+                file_changes=file_changes,
+            )
+        )
+    return commits
+
+
+@pytest.fixture(name="project_db")
+def fixture_project_db(tmp_path: Path) -> str:
+    path_to_project_db = str(tmp_path / "analytics.db")
+    create_commit_based_tables(path_to_project_db)
+    return path_to_project_db
+
+
+def write_commits(
+    path_to_project_db: str,
+    commits: Sequence[GitCommitData],
+    skipped_commit_hashes: Optional[Set[str]] = None,
+    db_commit_interval: int = 2,
+) -> None:
+    with AnalyticsDbWriter(path_to_project_db, db_commit_interval) as writer:
+        for commit_data in commits:
+            if commit_data.hash not in (skipped_commit_hashes or set()):
+                write_git_commit(writer, commit_data)
+
+
+def read_tables(
+    path_to_project_db: str, tables: Sequence[str] = WRITTEN_TABLES
+) -> Dict[str, List[Tuple[object, ...]]]:
+    """
+    The sorted rows of the tables.
+    """
+    con = sqlite3.connect(path_to_project_db)
+    try:
+        return {
+            table: sorted(con.execute(f"SELECT * FROM {table}").fetchall(), key=repr)
+            for table in tables
+        }
+    finally:
+        con.close()
+
+
+_CHANGE_TYPES = (ModificationType.ADD, ModificationType.MODIFY, ModificationType.DELETE)
+FILE_PATHS = ("src/a.cpp", "src/b.cpp", "lib/a.cpp", "c.cpp")
+
+
+def write_file_commits(path_to_project_db: str, nr_commits: int, first_nr: int = 0) -> None:
+    """
+    Commits every 31 hours around the turn of the year, in a time zone in which the day of
+    some of them differs from the utc day.
+    """
+    start_datetime = datetime(2020, 12, 1, 0, 30, tzinfo=timezone(timedelta(hours=2)))
+    with AnalyticsDbWriter(path_to_project_db, 3) as writer:
+        for nr in range(first_nr, first_nr + nr_commits):
+            commit_hash = f"{nr:040x}"
+            commit_datetime = start_datetime + timedelta(hours=31 * nr)
+            writer.begin_git_commit(commit_hash)
+            writer.insert_git_commit(commit_hash=commit_hash, commit_commiter_datetime=str(commit_datetime))
+            for file_nr in range(1 + nr % len(FILE_PATHS)):
+                file_path = FILE_PATHS[(nr + file_nr) % len(FILE_PATHS)]
+                writer.insert_file_commit(
+                    FileData(file_path),
+                    commit_hash,
+                    commit_datetime,
+                    Path(file_path).name,
+                    file_path,
+                    file_path,
+                    _CHANGE_TYPES[(nr * file_nr) % len(_CHANGE_TYPES)],
+                )
+            writer.end_git_commit()
+
+
+@pytest.fixture(name="git_repo")
+def fixture_git_repo(tmp_path: Path) -> CommitFiles:
+    """
+    Creates the commits of a git repository at the cache source dir of a project and returns
+    the hash of the commit.
+    """
+    path_to_repo = tmp_path / "repo"
+    path_to_repo.mkdir()
+    run_git(path_to_repo, "init", "-q", "-b", "master")
+    nr_commits = 0
+
+    def commit(files: Dict[str, Optional[str]]) -> str:
+        nonlocal nr_commits
+        for file_path, content in files.items():
+            path = path_to_repo / file_path
+            if content is None:
+                path.unlink()
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content, encoding="utf-8")
+        run_git(path_to_repo, "add", "-A")
+        nr_commits += 1
+        run_git(
+            path_to_repo, "commit", "-q", "-m", "change",
+            env={"GIT_COMMITTER_DATE": f"2021-03-{nr_commits:02d}T12:00:00+01:00"},
+        )
+        return run_git(path_to_repo, "rev-parse", "HEAD").strip()
+
+    return commit
+
+
+def run_git(path_to_repo: Path, *args: str, env: Optional[Dict[str, str]] = None) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=dev", "-c", "user.email=dev@example.com", *args],
+        cwd=path_to_repo,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+    ).stdout
+
+
+@pytest.fixture(name="project")
+def fixture_project(tmp_path: Path) -> Tuple[ProjectConfig, ProjectPaths]:
+    """
+    The config and paths of a cpp project in tmp_path, whose git repository is the git_repo.
+    """
+    proj_paths = build_project_paths("proj", str(tmp_path / "data"))
+    os.rmdir(proj_paths["path_to_cache_src_dir"])
+    os.symlink(tmp_path / "repo", proj_paths["path_to_cache_src_dir"])
+    proj_config = build_project_config("proj", "cpp", str(tmp_path / "repo"), repo_backend="git")
+    create_commit_based_tables(proj_paths["path_to_project_db"])
+    return proj_config, proj_paths
+
+
+@pytest.fixture(name="short_command_timeout")
+def fixture_short_command_timeout() -> Iterator[float]:
+    timeout_s = get_command_timeout()
+    configure_commands(0.5, 0)
+    yield 0.5
+    configure_commands(timeout_s, 0)
@@ -0,0 +1,46 @@
+from pathlib import Path
+from typing import Tuple
+
+import pytest
+from conftest import CommitFiles, read_tables
+
+from CCSD import git_repository_mining_util
+from CCSD.git_repository_mining_util import git_traverse
+from CCSD.git_repository_mining_util_files import git_traverse as git_traverse_files
+from CCSD.models import ProjectConfig, ProjectPaths
+from CCSD.utils_sql import create_commit_based_tables
+
+
+@pytest.mark.parametrize("repo_backend", ["pydriller", "git"])
+def test_files_mode_rows_equal_the_full_traversal(
+    tmp_path: Path,
+    git_repo: CommitFiles,
+    project: Tuple[ProjectConfig, ProjectPaths],
+    monkeypatch: pytest.MonkeyPatch,
+    repo_backend: str,
+) -> None:
+    proj_config, proj_paths = project
+    proj_config["repo_backend"] = repo_backend
+    git_repo({"src/a.cpp": "int f();\n", "src/b.cpp": "int g();\n", "src/e.cpp": "", "README.md": "a\n"})
+    git_repo({"src/a.cpp": "int f();\nint h();\n", "src/b.cpp": None, "README.md": "b\n"})
+    # a rename, which the full traversal skips, and a binary file without line counts
+    git_repo({"src/a.cpp": None, "lib/a.cpp": "int f();\nint h();\n"})
+    (tmp_path / "repo" / "lib" / "c.cpp").write_bytes(b"\x00\x01\x02")
+    git_repo({"lib/a.cpp": "int h();\n", "src/e.cpp": None})
+    git_repo({"README.md": "c\n"})
+    git_repo({"lib/c.cpp": None})
+    # the function calls of the full traversal are parsed by a jar
+    monkeypatch.setattr(
+        git_repository_mining_util, "get_function_call_rows", lambda *args: ([], [])
+    )
+    git_traverse(proj_config, proj_paths)
+    files_paths = proj_paths.copy()
+    files_paths["path_to_project_db"] = str(tmp_path / "files.db")
+    create_commit_based_tables(files_paths["path_to_project_db"])
+
+    git_traverse_files(proj_config, files_paths)
+
+    tables = ("git_commit", "file_commit")
+    full_tables = read_tables(proj_paths["path_to_project_db"], tables)
+    assert len(full_tables["git_commit"]) == 5
+    assert read_tables(files_paths["path_to_project_db"], tables) == full_tables
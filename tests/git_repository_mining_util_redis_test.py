@@ -0,0 +1,95 @@
+import os
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+import pytest
+from conftest import CommitFiles
+
+from CCSD import git_repository_mining_util_redis
+from CCSD.git_repository_mining_util_redis import _mine_chunks, _process_git_commits_task
+from CCSD.models import GitCommitData, ProjectConfig, ProjectPaths
+from CCSD.repository_backend import BackendCommit, GitBackend, PydrillerBackend, RepositoryBackend
+from CCSD.utils_sql_shard import CommitDataDb, get_shard_db_path
+
+
+def _extract_git_commit(
+    _proj_config: ProjectConfig,
+    _proj_paths: ProjectPaths,
+    _backend: RepositoryBackend,
+    commit: BackendCommit,
+    _is_valid_file_type: Callable[[str], bool],
+) -> GitCommitData:
+    return GitCommitData(commit.hash, commit.committer_date, "dev", False, 0, 0, 0, 0, [])
+
+
+def _fail_traverse_commits(*_args: object) -> None:
+    raise AssertionError("the commits of a task are traversed")
+
+
+@pytest.mark.parametrize("repo_backend", ["pydriller", "git"])
+def test_task_reads_its_commits_by_hash(
+    git_repo: CommitFiles,
+    project: Tuple[ProjectConfig, ProjectPaths],
+    monkeypatch: pytest.MonkeyPatch,
+    repo_backend: str,
+) -> None:
+    proj_config, proj_paths = project
+    proj_config["repo_backend"] = repo_backend
+    commit_hashes = [git_repo({"a.cpp": f"int f{nr}();\n"}) for nr in range(4)]
+    chunk = commit_hashes[2:0:-1]
+    monkeypatch.setattr(git_repository_mining_util_redis, "extract_git_commit", _extract_git_commit)
+    for backend_class in (PydrillerBackend, GitBackend):
+        monkeypatch.setattr(backend_class, "traverse_commits", _fail_traverse_commits)
+
+    assert _process_git_commits_task(proj_config, proj_paths, chunk) == len(chunk)
+
+    with CommitDataDb(get_shard_db_path(proj_paths["path_to_project_db"], chunk[0])) as shard:
+        assert [commit_data.hash for commit_data in shard.get_commits()] == chunk
+
+
+class _ChunkTasks:
+    """
+    Fake celery results of the chunk tasks, whose shard db is written when they are submitted.
+    """
+
+    def __init__(self, proj_paths: ProjectPaths) -> None:
+        self.proj_paths = proj_paths
+        self.nr_chunks_in_flight = 0
+        # the number of unfinished chunks after every submit
+        self.nr_chunks_in_flight_at_submit: List[int] = []
+
+    def apply_async(self, args: Tuple[ProjectConfig, ProjectPaths, List[str]]) -> "_ChunkTasks":
+        chunk = args[2]
+        path_to_shard_db = get_shard_db_path(self.proj_paths["path_to_project_db"], chunk[0])
+        os.makedirs(os.path.dirname(path_to_shard_db), exist_ok=True)
+        with CommitDataDb(path_to_shard_db) as shard:
+            for commit_hash in chunk:
+                shard.put(GitCommitData(commit_hash, datetime(2021, 3, 1), "dev", False, 0, 0, 0, 0, []))
+        self.nr_chunks_in_flight += 1
+        self.nr_chunks_in_flight_at_submit.append(self.nr_chunks_in_flight)
+        return self
+
+    def get(self) -> int:
+        self.nr_chunks_in_flight -= 1
+        return 0
+
+
+@pytest.mark.parametrize("max_chunks_in_flight", [1, 2, 3, 10])
+def test_chunks_in_flight_are_bounded(
+    project: Tuple[ProjectConfig, ProjectPaths], monkeypatch: pytest.MonkeyPatch, max_chunks_in_flight: int
+) -> None:
+    proj_config, proj_paths = project
+    proj_config["celery_chunk_size"] = 2
+    proj_config["celery_max_chunks_in_flight"] = max_chunks_in_flight
+    commit_hashes = [f"{nr:040x}" for nr in range(9, 0, -1)]
+    chunk_tasks = _ChunkTasks(proj_paths)
+    monkeypatch.setattr(_process_git_commits_task, "apply_async", chunk_tasks.apply_async)
+
+    mined_commits = _mine_chunks(proj_config, proj_paths, commit_hashes)
+
+    assert [commit_data.hash for commit_data in mined_commits] == commit_hashes
+    # the 5 chunks are submitted while less than max_chunks_in_flight are unfinished
+    assert chunk_tasks.nr_chunks_in_flight_at_submit == [
+        min(nr, max_chunks_in_flight) for nr in range(1, 6)
+    ]
+    assert not os.listdir(os.path.dirname(get_shard_db_path(proj_paths["path_to_project_db"], "")))
@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+from conftest import CommitFiles
+
+from CCSD import git_repository_mining_util
+from CCSD.git_repository_mining_util import extract_git_commit
+from CCSD.models import MethodData, ProjectConfig, ProjectPaths
+from CCSD.repository_backend import get_repository_backend
+from CCSD.repository_mining_util import get_file_type_validation_function
+
+_NR_FILES = 40
+
+
+def _extract_methods(
+    proj_config: ProjectConfig, proj_paths: ProjectPaths, commit_hash: str
+) -> List[Tuple[List[MethodData], List[MethodData], List[MethodData]]]:
+    backend = get_repository_backend(proj_config, proj_paths)
+    commit_data = extract_git_commit(
+        proj_config,
+        proj_paths,
+        backend,
+        backend.get_commit(commit_hash),
+        get_file_type_validation_function(proj_config["proj_lang"]),
+    )
+    return [
+        (file_change.methods, file_change.methods_before, file_change.changed_methods)
+        for file_change in commit_data.file_changes
+    ]
+
+
+def test_pooled_lizard_methods_equal_the_serial_ones(
+    tmp_path: Path,
+    git_repo: CommitFiles,
+    project: Tuple[ProjectConfig, ProjectPaths],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    proj_config, proj_paths = project
+    git_repo({f"src/f{nr}.cpp": f"int f{nr}(int a) {{\n    return a;\n}}\n" for nr in range(_NR_FILES)})
+    commit_hash = git_repo(
+        {
+            f"src/f{nr}.cpp": f"int f{nr}(int a) {{\n    return a + {nr};\n}}\nint g{nr}() {{\n    return 0;\n}}\n"
+            for nr in range(_NR_FILES)
+        }
+    )
+    # the function calls are parsed by a jar
+    monkeypatch.setattr(git_repository_mining_util, "get_function_call_rows", lambda *args: ([], []))
+    lizard_executors: Dict[int, ProcessPoolExecutor] = {}
+    monkeypatch.setattr(git_repository_mining_util, "_LIZARD_EXECUTORS", lizard_executors)
+    proj_config["lizard_workers"] = 1
+    # a parse cache of its own, so that the pooled extraction parses the sources again
+    serial_paths = proj_paths.copy()
+    serial_paths["path_to_cache_dir"] = str(tmp_path / "serial_cache")
+    serial_methods = _extract_methods(proj_config, serial_paths, commit_hash)
+    assert not lizard_executors
+
+    proj_config["lizard_workers"] = 2
+    try:
+        pooled_methods = _extract_methods(proj_config, proj_paths, commit_hash)
+    finally:
+        for executor in lizard_executors.values():
+            executor.shutdown()
+
+    assert list(lizard_executors) == [2]
+    assert len(pooled_methods) == _NR_FILES
+    assert all(changed_methods for _, _, changed_methods in pooled_methods)
+    assert pooled_methods == serial_methods
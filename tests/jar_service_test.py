@@ -0,0 +1,122 @@
+import shutil
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+from subprocess import Popen
+from typing import List
+
+import pytest
+
+from CCSD import repository_mining_util
+from CCSD.repository_mining_util import JarService
+from CCSD.subprocess_util import CommandStats, LongLivedProcess, get_command_stats
+
+# a jar service that answers a request with the header of 10 bytes of output, some of them, or none
+_HUNG_SERVER = """
+import sys, time
+sys.stdin.readline()
+sys.stdout.write({answer!r})
+sys.stdout.flush()
+time.sleep(60)
+"""
+
+
+def _get_java_stats() -> CommandStats:
+    return get_command_stats().get("java", CommandStats())
+
+
+def _fail_jar_wrapper(*args: str) -> List[bytes]:
+    raise AssertionError(f"jar run again after a timeout: {args}")
+
+
+# a parser that counts its calls in a static field and ends the JVM for the argument "exit"
+_EXITING_PARSER = """
+public class Parser {
+    private static int nrCalls = 0;
+
+    public static void main(String[] args) {
+        nrCalls++;
+        System.out.println(args[0] + " " + nrCalls);
+        if (args[0].equals("exit")) {
+            System.exit(1);
+        }
+    }
+}
+"""
+
+
+@pytest.fixture(name="exiting_parser_jar")
+def fixture_exiting_parser_jar(tmp_path: Path) -> str:
+    (tmp_path / "Parser.java").write_text(_EXITING_PARSER)
+    subprocess.run(["javac", "-d", str(tmp_path), str(tmp_path / "Parser.java")], check=True)
+    path_to_jar = tmp_path / "parser.jar"
+    with zipfile.ZipFile(path_to_jar, "w") as jar:
+        jar.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\nMain-Class: Parser\n")
+        jar.write(tmp_path / "Parser.class", "Parser.class")
+    return str(path_to_jar)
+
+
+@pytest.mark.parametrize("answer", ["", "10 0\n", "10 0\nabc"])
+@pytest.mark.usefixtures("short_command_timeout")
+def test_hung_jar_service_call_times_out(answer: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(repository_mining_util, "jar_wrapper", _fail_jar_wrapper)
+    jar_service = JarService("parser.jar")
+    # pylint: disable=protected-access
+    jar_service._process = LongLivedProcess([sys.executable, "-c", _HUNG_SERVER.format(answer=answer)])
+    nr_timeouts = _get_java_stats().nr_timeouts
+
+    assert not jar_service.run("file.cpp")
+    assert jar_service._process.popen is None
+    assert _get_java_stats().nr_timeouts == nr_timeouts + 1
+
+
+def test_jar_service_returns_the_output_lines() -> None:
+    jar_service = JarService("parser.jar")
+    jar_service._process = LongLivedProcess(  # pylint: disable=protected-access
+        [
+            sys.executable,
+            "-c",
+            "import sys; sys.stdin.readline(); sys.stdout.write('6 4\\na\\nb\\nc\\nerr\\n'); sys.stdout.flush()",
+        ]
+    )
+    nr_calls = _get_java_stats().nr_calls
+
+    # the same lines as jar_wrapper
+    assert jar_service.run("file.cpp") == [b"a", b"b", b"c", b"err", b""]
+    assert _get_java_stats().nr_calls == nr_calls + 1
+    jar_service.close()
+
+
+@pytest.mark.skipif(shutil.which("javac") is None, reason="needs a JDK")
+def test_jar_service_calls_do_not_share_state_or_exit(exiting_parser_jar: str) -> None:
+    jar_service = JarService(exiting_parser_jar)
+
+    # every call sees fresh static fields, an exiting call returns its output like a jar run
+    assert jar_service.run("a") == [b"a 1"]
+    assert jar_service.run("exit") == [b"exit 1"]
+    assert jar_service.run("b") == [b"b 1"]
+    jar_service.close()
+
+
+class _CountedProcess(LongLivedProcess):
+    def __init__(self, args: List[str]) -> None:
+        super().__init__(args)
+        self.nr_starts = 0
+
+    def get(self) -> "Popen[bytes]":
+        if self.popen is None:
+            self.nr_starts += 1
+        return super().get()
+
+
+def test_jar_service_is_disabled_after_failed_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(repository_mining_util, "jar_wrapper", lambda *args: [b"jar run directly"])
+    jar_service = JarService("parser.jar")
+    # a JVM that exits in every call
+    process = _CountedProcess([sys.executable, "-c", "pass"])
+    jar_service._process = process  # pylint: disable=protected-access
+
+    for _ in range(5):
+        assert jar_service.run("file.cpp") == [b"jar run directly"]
+    assert process.nr_starts == 3
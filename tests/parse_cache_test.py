@@ -0,0 +1,159 @@
+import subprocess
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pytest
+from conftest import CommitFiles, run_git
+
+from CCSD import git_repository_mining_util
+from CCSD.cache_manager import CacheManager
+from CCSD.git_repository_mining_util import _get_file_methods, read_file_sources
+from CCSD.models import MethodData, ProjectConfig, ProjectPaths
+from CCSD.parse_cache import ParseCache, get_blob_sha
+from CCSD.repository_backend import PydrillerBackend, get_repository_backend
+
+_SOURCE = "int f(int a) {\n    return a;\n}\n"
+_METHODS = [MethodData("f", "f(int a)", ["int a"], 3, 1, 3)]
+
+
+def _parse_cache(tmp_path: Path) -> ParseCache:
+    # a new parse cache reads from the files, without the decoded methods of the previous one
+    return ParseCache(str(tmp_path), CacheManager([str(tmp_path / "parse_cache")], 0))
+
+
+def test_blob_sha_is_the_git_blob_hash() -> None:
+    git_blob_sha = subprocess.run(
+        ["git", "hash-object", "--stdin"], input=_SOURCE, stdout=subprocess.PIPE, text=True, check=True
+    ).stdout.strip()
+
+    assert get_blob_sha(_SOURCE) == git_blob_sha
+
+
+@pytest.mark.parametrize("repo_backend", ["pydriller", "git"])
+def test_file_sources_are_keyed_by_the_blob_sha_of_the_diff(
+    tmp_path: Path,
+    git_repo: CommitFiles,
+    project: Tuple[ProjectConfig, ProjectPaths],
+    monkeypatch: pytest.MonkeyPatch,
+    repo_backend: str,
+) -> None:
+    proj_config, proj_paths = project
+    proj_config["repo_backend"] = repo_backend
+    git_repo({"a.cpp": _SOURCE})
+    # the decoded source of a blob that is not utf-8 has another hash than the blob
+    (tmp_path / "repo" / "a.cpp").write_bytes(_SOURCE.encode("utf-8") + b"// \xff\n")
+    commit_hash = git_repo({})
+    backend = get_repository_backend(proj_config, proj_paths)
+    (mod_file,) = backend.get_commit(commit_hash).modified_files
+
+    file_sources = read_file_sources(backend, mod_file)
+    assert file_sources.blob_sha == run_git(tmp_path / "repo", "rev-parse", f"{commit_hash}:a.cpp").strip()
+    assert file_sources.blob_sha != get_blob_sha(str(file_sources.source_code))
+    assert file_sources.blob_sha_before == get_blob_sha(_SOURCE)
+
+    # without the blobs of the diff, the sources are hashed
+    monkeypatch.setattr(git_repository_mining_util, "get_diff_blob_shas", lambda mod_file: (None, None))
+    file_sources = read_file_sources(backend, mod_file)
+    assert file_sources.blob_sha == get_blob_sha(str(file_sources.source_code))
+    assert file_sources.blob_sha_before == get_blob_sha(_SOURCE)
+
+
+def test_methods_are_cached_by_blob_sha_and_file_extension(tmp_path: Path) -> None:
+    blob_sha = get_blob_sha(_SOURCE)
+    parse_cache = _parse_cache(tmp_path)
+    assert parse_cache.get_methods(blob_sha, "a.cpp") is None
+    parse_cache.put_methods(blob_sha, "a.cpp", _METHODS)
+
+    parse_cache = _parse_cache(tmp_path)
+    # the same source under another path of the same language
+    assert parse_cache.get_methods(blob_sha, "src/b.cpp") == _METHODS
+    assert parse_cache.get_methods(blob_sha, "a.java") is None
+    assert parse_cache.get_methods(get_blob_sha(_SOURCE + "\n"), "a.cpp") is None
+    assert (parse_cache.nr_hits, parse_cache.nr_misses) == (1, 2)
+
+
+def test_changed_methods_are_cached_by_blob_pair(tmp_path: Path) -> None:
+    blob_sha_before, blob_sha = get_blob_sha(""), get_blob_sha(_SOURCE)
+    parse_cache = _parse_cache(tmp_path)
+    parse_cache.put_changed_methods(None, blob_sha, "a.cpp", _METHODS)
+    parse_cache.put_changed_methods(blob_sha_before, blob_sha, "a.cpp", [])
+
+    parse_cache = _parse_cache(tmp_path)
+    assert parse_cache.get_changed_methods(None, blob_sha, "a.cpp") == _METHODS
+    assert parse_cache.get_changed_methods(blob_sha_before, blob_sha, "a.cpp") == []
+    assert parse_cache.get_changed_methods(blob_sha, None, "a.cpp") is None
+
+
+def test_srcml_xml_is_restored_with_the_file_path(tmp_path: Path) -> None:
+    blob_sha = get_blob_sha(_SOURCE)
+    parse_cache = _parse_cache(tmp_path)
+    path_to_source = tmp_path / "current" / "a.cpp"
+    path_to_source.parent.mkdir()
+    Path(f"{path_to_source}.xml").write_text(
+        f'<unit revision="1.0.0" language="C++" filename="{path_to_source}"><function/></unit>\n',
+        encoding="utf-8",
+    )
+    parse_cache.store_srcml_xml(blob_sha, str(path_to_source))
+    path_to_moved_source = tmp_path / "previous" / "b.cpp"
+    path_to_moved_source.parent.mkdir()
+
+    assert not parse_cache.restore_srcml_xml(get_blob_sha(""), str(path_to_moved_source))
+    assert parse_cache.restore_srcml_xml(blob_sha, str(path_to_moved_source))
+    assert Path(f"{path_to_moved_source}.xml").read_text(encoding="utf-8") == (
+        f'<unit revision="1.0.0" language="C++" filename="{path_to_moved_source}"><function/></unit>\n'
+    )
+
+
+def test_failed_srcml_conversion_is_not_cached(tmp_path: Path) -> None:
+    parse_cache = _parse_cache(tmp_path)
+    path_to_source = tmp_path / "a.cpp"
+    Path(f"{path_to_source}.xml").write_text(
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<unit/>', encoding="utf-8"
+    )
+    parse_cache.store_srcml_xml(get_blob_sha(_SOURCE), str(path_to_source))
+
+    assert not parse_cache.restore_srcml_xml(get_blob_sha(_SOURCE), str(path_to_source))
+
+
+def _count_calls(monkeypatch: pytest.MonkeyPatch, name: str, calls: Dict[str, int]) -> None:
+    function = getattr(git_repository_mining_util, name)
+
+    def _counted(*args: object) -> object:
+        calls[name] += 1
+        return function(*args)
+
+    monkeypatch.setattr(git_repository_mining_util, name, _counted)
+
+
+@pytest.mark.parametrize("repo_backend", ["pydriller", "git"])
+def test_changed_methods_of_a_repeated_blob_pair_are_not_recomputed(
+    tmp_path: Path,
+    git_repo: CommitFiles,
+    project: Tuple[ProjectConfig, ProjectPaths],
+    monkeypatch: pytest.MonkeyPatch,
+    repo_backend: str,
+) -> None:
+    proj_config, proj_paths = project
+    proj_config["repo_backend"] = repo_backend
+    source_after = _SOURCE.replace("return a;", "return a + 1;") + "int g() {\n    return 0;\n}\n"
+    # a change, its revert and the revert of the revert repeat the blob pairs
+    commit_hashes = [git_repo({"a.cpp": source}) for source in (_SOURCE, source_after, _SOURCE, source_after)]
+    calls = {"_analyze_methods": 0, "_get_changed_methods": 0}
+    for name in calls:
+        _count_calls(monkeypatch, name, calls)
+    # the changed methods of pydriller are the reference
+    pydriller_backend = PydrillerBackend(proj_config, proj_paths)
+    backend = get_repository_backend(proj_config, proj_paths)
+    parse_cache = _parse_cache(tmp_path / "cache")
+
+    for commit_hash in commit_hashes:
+        (mod_file,) = backend.get_commit(commit_hash).modified_files
+        _, _, changed_methods = _get_file_methods(parse_cache, mod_file, read_file_sources(backend, mod_file))
+        pydriller_commit = pydriller_backend.get_commit(commit_hash)
+        assert changed_methods
+        assert sorted(m.long_name for m in changed_methods) == sorted(
+            m.long_name for m in pydriller_commit.modified_files[0].changed_methods
+        )
+
+    # lizard runs once per source and the changed methods are computed once per blob pair
+    assert calls == {"_analyze_methods": 2, "_get_changed_methods": 3}
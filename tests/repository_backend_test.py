@@ -0,0 +1,126 @@
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+from conftest import CommitFiles, run_git
+
+from CCSD import git_repository_mining_util
+from CCSD.git_repository_mining_util import git_traverse
+from CCSD.models import ProjectConfig, ProjectPaths
+from CCSD.repository_backend import (
+    BackendCommit,
+    GitBackend,
+    GitLogCommit,
+    PydrillerBackend,
+    RepositoryBackend,
+    get_repository_backend,
+)
+
+_SOURCE = "".join(f"int f{nr}(int a) {{ return a + {nr}; }}\n" for nr in range(20))
+
+
+def _summary(commit: BackendCommit) -> Tuple[object, ...]:
+    return (
+        commit.hash,
+        commit.parents,
+        commit.author.name,
+        commit.committer_date,
+        commit.merge,
+        commit.insertions,
+        commit.deletions,
+        commit.lines,
+        sorted(
+            (mod_file.change_type.name, mod_file.old_path, mod_file.new_path)
+            for mod_file in commit.modified_files
+        ),
+    )
+
+
+def _make_history(git_repo: CommitFiles, path_to_repo: Path) -> List[str]:
+    commit_hashes = [
+        git_repo({"src/a.cpp": _SOURCE, "src/b.cpp": "int g();\n"}),
+        # a binary file has no line counts in the numstat
+        git_repo({"src/b.cpp": "int g();\nint h();\n", "logo.png": "\0\1\2\3"}),
+        # a rename with a change, the numstat has the old and the new path
+        git_repo({"src/a.cpp": None, "src/c.cpp": _SOURCE.replace("a + 3", "a + 4")}),
+    ]
+    run_git(path_to_repo, "checkout", "-q", "-b", "feature")
+    commit_hashes.append(git_repo({"src/d.cpp": "int d();\n"}))
+    run_git(path_to_repo, "checkout", "-q", "master")
+    commit_hashes.append(git_repo({"src/b.cpp": None}))
+    run_git(path_to_repo, "merge", "-q", "--no-ff", "-m", "merge", "feature")
+    commit_hashes.append(run_git(path_to_repo, "rev-parse", "HEAD").strip())
+    return commit_hashes
+
+
+def test_git_backend_reads_the_commits_of_pydriller(
+    git_repo: CommitFiles, project: Tuple[ProjectConfig, ProjectPaths], tmp_path: Path
+) -> None:
+    proj_config, proj_paths = project
+    commit_hashes = _make_history(git_repo, tmp_path / "repo")
+    git_backend = GitBackend(proj_config, proj_paths)
+    pydriller_backend = PydrillerBackend(proj_config, proj_paths)
+
+    git_commits = list(git_backend.traverse_git_log_commits())
+
+    # newest first, without the merge commit
+    assert [commit.hash for commit in git_commits] == list(reversed(commit_hashes[:5]))
+    assert [_summary(commit) for commit in git_commits] == [
+        _summary(commit) for commit in pydriller_backend.traverse_commits()
+    ]
+    rename = git_commits[2]
+    assert rename.changes == [("R", "src/a.cpp", "src/c.cpp")]
+    assert (rename.insertions, rename.deletions) == (1, 1)
+    binary = git_commits[3]
+    assert sorted(binary.changes) == [("A", None, "logo.png"), ("M", "src/b.cpp", "src/b.cpp")]
+    assert (binary.insertions, binary.deletions) == (1, 0)
+
+
+def test_git_backend_reads_a_merge_commit_by_hash(
+    git_repo: CommitFiles, project: Tuple[ProjectConfig, ProjectPaths], tmp_path: Path
+) -> None:
+    proj_config, proj_paths = project
+    commit_hashes = _make_history(git_repo, tmp_path / "repo")
+
+    merge = GitBackend(proj_config, proj_paths).get_commit(commit_hashes[-1])
+
+    assert isinstance(merge, GitLogCommit)
+    assert _summary(merge) == _summary(
+        PydrillerBackend(proj_config, proj_paths).get_commit(commit_hashes[-1])
+    )
+    assert merge.merge
+    assert merge.parents == [commit_hashes[4], commit_hashes[3]]
+    assert not merge.modified_files
+
+
+def test_repository_backend_is_abstract(project: Tuple[ProjectConfig, ProjectPaths]) -> None:
+    with pytest.raises(TypeError):
+        RepositoryBackend(*project)  # type: ignore[abstract]  # pylint: disable=abstract-class-instantiated
+
+
+@pytest.mark.parametrize("repo_backend", ["pydriller", "git"])
+def test_traversal_passes_its_backend_down(
+    git_repo: CommitFiles,
+    project: Tuple[ProjectConfig, ProjectPaths],
+    monkeypatch: pytest.MonkeyPatch,
+    repo_backend: str,
+) -> None:
+    proj_config, proj_paths = project
+    proj_config["repo_backend"] = repo_backend
+    git_repo({"src/a.cpp": _SOURCE, "src/b.cpp": "int g();\n"})
+    git_repo({"src/a.cpp": _SOURCE + "int h();\n", "src/b.cpp": None})
+    backends: List[RepositoryBackend] = []
+
+    def _get_repository_backend(*args: object) -> RepositoryBackend:
+        backends.append(get_repository_backend(*args))  # type: ignore[arg-type]
+        return backends[-1]
+
+    monkeypatch.setattr(git_repository_mining_util, "get_repository_backend", _get_repository_backend)
+    # the function calls are parsed by a jar
+    monkeypatch.setattr(
+        git_repository_mining_util, "get_function_call_rows", lambda *args: ([], [])
+    )
+
+    git_traverse(proj_config, proj_paths)
+
+    assert len(backends) == 1
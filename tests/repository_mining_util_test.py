@@ -0,0 +1,157 @@
+import os
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+from conftest import CommitFiles
+
+from CCSD import git_repository_mining_util
+from CCSD.git_repository_mining_util import extract_git_commit, write_git_commit
+from CCSD.models import FileChangeSets, ProjectConfig, ProjectPaths
+from CCSD.repository_backend import get_repository_backend
+from CCSD.repository_mining_util import (
+    _split_srcml_archive,
+    get_file_change_sets,
+    get_file_type_validation_function,
+    get_scratch_dir,
+    remove_scratch_dir,
+    save_source_code_xml_batch,
+)
+from CCSD.utils_sql import AnalyticsDbWriter
+
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_SRC_NAMESPACE = 'xmlns="http://www.srcML.org/srcML/src"'
+_CPP_NAMESPACE = 'xmlns:cpp="http://www.srcML.org/srcML/cpp"'
+_FUNCTION = (
+    "<function><type><name>int</name></type> <name>f</name><parameter_list>()</parameter_list> "
+    '<block>{<block_content> <return>return <expr><literal type="number">1</literal></expr>;</return> '
+    "</block_content>}</block></function>"
+)
+_CLASS = '<class><specifier>public</specifier> class <name>Main</name> <block>{ }</block></class>'
+_INCLUDE = "<cpp:include>#<cpp:directive>include</cpp:directive> <cpp:file>&lt;x.h&gt;</cpp:file></cpp:include>"
+
+
+def test_remove_scratch_dir_keeps_the_files_of_a_running_parse(tmp_path: Path) -> None:
+    path_to_cache_dir = str(tmp_path / "astparsing")
+    scratch_dir = get_scratch_dir(path_to_cache_dir)
+    os.makedirs(os.path.join(scratch_dir, "current", "worker_1", "src"))
+    os.makedirs(os.path.join(scratch_dir, "previous", "worker_2", "src"))
+    path_to_source = os.path.join(scratch_dir, "previous", "worker_2", "src", "a.cpp")
+    Path(path_to_source).write_text("int f();\n", encoding="utf-8")
+
+    remove_scratch_dir(path_to_cache_dir)
+    assert os.listdir(scratch_dir) == ["previous"]
+    assert os.path.isfile(path_to_source)
+
+    os.remove(path_to_source)
+    remove_scratch_dir(path_to_cache_dir)
+    assert not os.path.exists(scratch_dir)
+
+
+def test_split_srcml_archive_returns_the_xml_of_a_single_file_call() -> None:
+    # the archive of srcml src/a.cpp src/b.h Main.java, whose units have a hash attribute and
+    # declare the namespaces the archive does not
+    archive = (
+        f"{_XML_DECLARATION}<unit {_SRC_NAMESPACE} revision=\"1.0.0\">\n\n"
+        f'<unit {_CPP_NAMESPACE} revision="1.0.0" language="C++" filename="src/a.cpp" hash="1f">{_FUNCTION}\n</unit>\n\n'
+        f'<unit {_CPP_NAMESPACE} revision="1.0.0" language="C++" filename="src/b.h" hash="2e">{_INCLUDE}\n</unit>\n\n'
+        f'<unit revision="1.0.0" language="Java" filename="Main.java" hash="3d">{_CLASS}\n</unit>\n\n'
+        "</unit>\n"
+    )
+
+    # the output of srcml src/a.cpp, srcml src/b.h and srcml Main.java
+    assert _split_srcml_archive(archive.encode("utf-8")) == {
+        "src/a.cpp": (
+            f'{_XML_DECLARATION}<unit {_SRC_NAMESPACE} {_CPP_NAMESPACE} revision="1.0.0" language="C++" '
+            f'filename="src/a.cpp">{_FUNCTION}\n</unit>\n'
+        ),
+        "src/b.h": (
+            f'{_XML_DECLARATION}<unit {_SRC_NAMESPACE} {_CPP_NAMESPACE} revision="1.0.0" language="C++" '
+            f'filename="src/b.h">{_INCLUDE}\n</unit>\n'
+        ),
+        "Main.java": (
+            f'{_XML_DECLARATION}<unit {_SRC_NAMESPACE} revision="1.0.0" language="Java" '
+            f'filename="Main.java">{_CLASS}\n</unit>\n'
+        ),
+    }
+
+
+# srcml writes an archive of units for several files, and a single unit for one file,
+# the unit of a file named skip.cpp is left out of an archive
+_FAKE_SRCML = """#!{python}
+import sys
+from xml.sax.saxutils import quoteattr
+unit = '<unit xmlns="http://www.srcML.org/srcML/src" revision="1.0.0" language="C++" filename={{}}>{{}}</unit>'
+units = [unit.format(quoteattr(path), open(path).read()) for path in sys.argv[1:]]
+print('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')
+if len(units) == 1:
+    print(units[0])
+else:
+    print('<unit xmlns="http://www.srcML.org/srcML/src" revision="1.0.0">')
+    print("\\n\\n".join(u for u, path in zip(units, sys.argv[1:]) if not path.endswith("skip.cpp")))
+    print("</unit>")
+"""
+
+
+def test_save_source_code_xml_batch_writes_the_xml_of_every_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path_to_bin = tmp_path / "bin"
+    path_to_bin.mkdir()
+    (path_to_bin / "srcml").write_text(_FAKE_SRCML.format(python=sys.executable), encoding="utf-8")
+    (path_to_bin / "srcml").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{path_to_bin}{os.pathsep}{os.environ['PATH']}")
+    file_paths = [str(tmp_path / name) for name in ("a.cpp", "skip.cpp", "c.cpp")]
+    for file_path in file_paths:
+        Path(file_path).write_text(os.path.basename(file_path), encoding="utf-8")
+
+    save_source_code_xml_batch(file_paths)
+
+    for file_path in file_paths:
+        assert Path(f"{file_path}.xml").read_text(encoding="utf-8") == (
+            f'{_XML_DECLARATION}<unit {_SRC_NAMESPACE} revision="1.0.0" language="C++" filename="{file_path}">'
+            f"{os.path.basename(file_path)}</unit>\n"
+        )
+
+
+def test_change_sets_of_a_file_are_split_once(
+    git_repo: CommitFiles, project: Tuple[ProjectConfig, ProjectPaths], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    proj_config, proj_paths = project
+    functions = {
+        name: f"int {name} {{\n    return {nr};\n}}\n" for nr, name in enumerate(("f(int a)", "g()", "h()", "k()"))
+    }
+    git_repo({"a.cpp": functions["f(int a)"] + functions["g()"] + functions["h()"]})
+    commit_hash = git_repo(
+        {"a.cpp": functions["f(int a)"].replace("0", "a") + functions["h()"] + functions["k()"]}
+    )
+    split_change_sets: List[FileChangeSets] = []
+
+    def _get_file_change_sets(*args: List[object]) -> FileChangeSets:
+        split_change_sets.append(get_file_change_sets(*args))  # type: ignore[arg-type]
+        return split_change_sets[-1]
+
+    monkeypatch.setattr(git_repository_mining_util, "get_file_change_sets", _get_file_change_sets)
+    # the function calls are parsed by a jar
+    monkeypatch.setattr(git_repository_mining_util, "get_function_call_rows", lambda *args: ([], []))
+    backend = get_repository_backend(proj_config, proj_paths)
+
+    commit_data = extract_git_commit(
+        proj_config,
+        proj_paths,
+        backend,
+        backend.get_commit(commit_hash),
+        get_file_type_validation_function(proj_config["proj_lang"]),
+    )
+    with AnalyticsDbWriter(proj_paths["path_to_project_db"], 1) as writer:
+        write_git_commit(writer, commit_data)
+
+    # split by the extraction only, the table writers use the change sets of the file change
+    assert len(split_change_sets) == 1
+    change_sets = split_change_sets[0]
+    assert commit_data.file_changes[0].change_sets is change_sets
+    assert change_sets.added_functions == {"k()"}
+    assert change_sets.deleted_functions == {"g()"}
+    assert change_sets.changed_functions == {"f( int a)"}
+    assert change_sets.unchanged_functions == {"h()"}
@@ -0,0 +1,75 @@
+from pathlib import Path
+from typing import List, Tuple
+
+from conftest import CommitFiles, read_tables, write_commits
+
+from CCSD.git_repository_mining_util import write_git_commit, write_git_commits
+from CCSD.models import GitCommitData, ProjectConfig, ProjectPaths
+from CCSD.repository_mining import prepare_resume
+from CCSD.utils_sql import AnalyticsDbWriter, create_commit_based_tables, get_processed_commit_hashes
+from CCSD.utils_sql_shard import CommitDataDb, get_commit_data_db_path
+
+
+def test_resumed_run_equals_full_run(
+    history: List[GitCommitData], project_db: str, tmp_path: Path
+) -> None:
+    path_to_full_db = str(tmp_path / "full.db")
+    create_commit_based_tables(path_to_full_db)
+    write_commits(path_to_full_db, history)
+
+    # the run is interrupted while it writes the third commit
+    with AnalyticsDbWriter(project_db, 2) as writer:
+        for commit_data in history[:2]:
+            write_git_commit(writer, commit_data)
+        writer.begin_git_commit(history[2].hash)
+        writer.insert_git_commit(commit_hash=history[2].hash)
+    processed_commit_hashes = get_processed_commit_hashes(project_db)
+    assert processed_commit_hashes == {commit_data.hash for commit_data in history[:2]}
+
+    write_commits(project_db, history, processed_commit_hashes)
+
+    assert read_tables(project_db) == read_tables(path_to_full_db)
+
+
+def test_appended_run_equals_full_run(
+    history: List[GitCommitData], project_db: str, tmp_path: Path
+) -> None:
+    path_to_full_db = str(tmp_path / "full.db")
+    create_commit_based_tables(path_to_full_db)
+    write_commits(path_to_full_db, history)
+
+    # the previous run, before the newest commit was fetched
+    commit_hashes = [commit_data.hash for commit_data in history]
+    with AnalyticsDbWriter(project_db) as writer, CommitDataDb(
+        get_commit_data_db_path(project_db)
+    ) as commit_data_db:
+        write_git_commits(writer, commit_data_db, commit_hashes[1:], iter(history[1:]))
+    # the resumed run writes the tables again and only extracts the new commit
+    create_commit_based_tables(project_db, drop=True)
+    with AnalyticsDbWriter(project_db) as writer, CommitDataDb(
+        get_commit_data_db_path(project_db)
+    ) as commit_data_db:
+        write_git_commits(writer, commit_data_db, commit_hashes, iter(history[:1]))
+        assert commit_data_db.get_commit_hashes() == set(commit_hashes)
+
+    assert read_tables(project_db) == read_tables(path_to_full_db)
+
+
+def test_resume_writes_the_tables_again_when_the_branch_moved(
+    git_repo: CommitFiles, project: Tuple[ProjectConfig, ProjectPaths]
+) -> None:
+    proj_config, proj_paths = project
+    commit_hashes = [git_repo({"a.cpp": "int f();\n"}), git_repo({"a.cpp": "int g();\n"})]
+    with AnalyticsDbWriter(proj_paths["path_to_project_db"]) as writer:
+        for commit_hash in reversed(commit_hashes):
+            writer.begin_git_commit(commit_hash)
+            writer.end_git_commit()
+    prepare_resume(proj_config, proj_paths, "full")
+    assert get_processed_commit_hashes(proj_paths["path_to_project_db"]) == set(commit_hashes)
+
+    git_repo({"a.cpp": "int h();\n"})
+    # the files mode only adds the new commits
+    prepare_resume(proj_config, proj_paths, "files")
+    assert get_processed_commit_hashes(proj_paths["path_to_project_db"]) == set(commit_hashes)
+    prepare_resume(proj_config, proj_paths, "full")
+    assert not get_processed_commit_hashes(proj_paths["path_to_project_db"])
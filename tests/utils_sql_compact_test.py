@@ -0,0 +1,65 @@
+import sqlite3
+from typing import List
+
+from conftest import WRITTEN_TABLES, read_tables, write_commits
+
+from CCSD.models import GitCommitData
+from CCSD.utils_sql import _CHANGE_ROLLUPS
+from CCSD.utils_sql_compact import compact_project_db, expand_project_db, is_compact_db
+
+_TABLES = (*WRITTEN_TABLES, "processed_commit", *_CHANGE_ROLLUPS)
+
+
+def _is_compact_db(path_to_project_db: str) -> bool:
+    con = sqlite3.connect(path_to_project_db)
+    try:
+        return is_compact_db(con)
+    finally:
+        con.close()
+
+
+def test_compact_and_expand_keep_the_rows(history: List[GitCommitData], project_db: str) -> None:
+    write_commits(project_db, history)
+    rows = read_tables(project_db, _TABLES)
+
+    compact_project_db(project_db)
+
+    assert _is_compact_db(project_db)
+    # the views of the compact tables have the columns and rows of the text tables
+    assert read_tables(project_db, _TABLES) == rows
+
+    expand_project_db(project_db)
+
+    assert not _is_compact_db(project_db)
+    assert read_tables(project_db, _TABLES) == rows
+
+
+def test_expand_without_rows(history: List[GitCommitData], project_db: str) -> None:
+    write_commits(project_db, history)
+    compact_project_db(project_db)
+
+    expand_project_db(project_db, keep_rows=False)
+
+    assert not _is_compact_db(project_db)
+    # the checkpoint is not compacted
+    assert not any(read_tables(project_db, (*WRITTEN_TABLES, *_CHANGE_ROLLUPS)).values())
+
+
+def test_compact_keeps_the_text_tables_if_a_row_cannot_be_restored(
+    history: List[GitCommitData], project_db: str
+) -> None:
+    write_commits(project_db, history)
+    con = sqlite3.connect(project_db)
+    with con:
+        # a commit hash with a second datetime cannot be encoded by one commit id
+        con.execute(
+            "UPDATE file_commit SET commit_commiter_datetime = '2021-03-02 12:00:00+01:00' "
+            "WHERE rowid = (SELECT min(rowid) FROM file_commit)"
+        )
+    con.close()
+    rows = read_tables(project_db, _TABLES)
+
+    compact_project_db(project_db)
+
+    assert not _is_compact_db(project_db)
+    assert read_tables(project_db, _TABLES) == rows
@@ -0,0 +1,340 @@
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import pytest
+from conftest import FILE_PATHS, WRITTEN_TABLES, read_tables, write_commits, write_file_commits
+from pydriller.domain.commit import ModificationType
+
+from analytics.analytics_db import connect_analytics_db
+from CCSD.git_repository_mining_util import write_git_commit, write_git_commits
+from CCSD.models import GitCommitData
+from CCSD.utils_sql import (
+    _ANALYTICS_INDEXES,
+    _CHANGE_ROLLUPS,
+    _OPEN_INTERVAL_INDEXES,
+    AnalyticsDbWriter,
+    create_analytics_indexes,
+    create_commit_based_tables,
+)
+from CCSD.utils_sql_shard import CommitDataDb, get_commit_data_db_path
+
+_NO_COMMIT = (None, None)
+
+
+def _commit(nr: int) -> Tuple[str, str]:
+    """
+    The hash and datetime of the nr-th commit of the history.
+    """
+    committer_date = datetime(2021, 3, 1, 12, tzinfo=timezone(timedelta(hours=1)))
+    return f"{nr:040x}", str(committer_date - timedelta(days=4 - nr))
+
+
+# the rows of the history written by the per-row interval updates of the writer, before the
+# staged temp tables and the open interval index
+_PER_ROW_INTERVAL_ROWS: Dict[str, List[Tuple[object, ...]]] = {
+    "file_import": [
+        ("a.cpp", "src", "src/a.cpp", "w.h", "w.h", "", None, *_commit(1), *_commit(1), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "x.h", "x.h", "", None, *_commit(1), *_commit(1), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "x.h", "x.h", "", None, *_NO_COMMIT, *_commit(2), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "y.h", "y.h", "", None, *_commit(3), *_commit(3), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "y.h", "y.h", "", None, *_NO_COMMIT, *_commit(4), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "z.h", "z.h", "", None, *_NO_COMMIT, *_commit(4), *_NO_COMMIT, 0),
+        ("b.cpp", "src", "src/b.cpp", "x.h", "x.h", "", None, *_NO_COMMIT, *_commit(2), *_NO_COMMIT, 0),
+    ],
+    "function_to_file": [
+        ("a.cpp", "src", "src/a.cpp", "f", "ns::f", "ns::f(int)", "int", *_commit(1), *_commit(1), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "f", "ns::f", "ns::f(int)", "int", *_NO_COMMIT, *_commit(2), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "f", "ns::f", "ns::f(int)", "int", *_NO_COMMIT, *_commit(3), *_NO_COMMIT, 1),
+        ("a.cpp", "src", "src/a.cpp", "g", "ns::g", "ns::g(int)", "int", *_commit(3), *_commit(3), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "g", "ns::g", "ns::g(int)", "int", *_NO_COMMIT, *_commit(4), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "h", "ns::h", "ns::h(int)", "int", *_commit(4), *_commit(4), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "k", "ns::k", "ns::k(int)", "int", *_commit(1), *_commit(1), *_NO_COMMIT, 0),
+        ("b.cpp", "src", "src/b.cpp", "k", "ns::k", "ns::k(int)", "int", *_commit(2), *_commit(2), *_NO_COMMIT, 0),
+        ("b.cpp", "src", "src/b.cpp", "k", "ns::k", "ns::k(int)", "int", *_NO_COMMIT, *_commit(4), *_NO_COMMIT, 0),
+    ],
+    "raw_function_call": [
+        ("a.cpp", "src", "src/a.cpp", "f", 1, "g", None, *_commit(3), *_commit(3), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "f", 1, "g", None, *_NO_COMMIT, *_commit(4), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "f", 1, "k", None, *_commit(1), *_commit(1), *_NO_COMMIT, 0),
+        ("a.cpp", "src", "src/a.cpp", "f", 1, "k", None, *_NO_COMMIT, *_commit(2), *_commit(2), 1),
+        ("a.cpp", "src", "src/a.cpp", "h", 1, "f", None, *_commit(4), *_commit(4), *_NO_COMMIT, 0),
+        ("b.cpp", "src", "src/b.cpp", "k", 1, "f", None, *_commit(2), *_commit(2), *_NO_COMMIT, 0),
+        ("b.cpp", "src", "src/b.cpp", "k", 1, "f", None, *_NO_COMMIT, *_commit(4), *_commit(4), 1),
+    ],
+}
+
+
+@pytest.mark.parametrize("db_commit_interval", [1, 2, 100])
+def test_interval_rows_equal_the_per_row_updates(
+    history: List[GitCommitData], project_db: str, db_commit_interval: int
+) -> None:
+    write_commits(project_db, history, db_commit_interval=db_commit_interval)
+
+    assert read_tables(project_db, tuple(_PER_ROW_INTERVAL_ROWS)) == {
+        table: sorted(rows, key=repr) for table, rows in _PER_ROW_INTERVAL_ROWS.items()
+    }
+
+
+def _get_open_keys(cur: sqlite3.Cursor, table: str, key_column: str) -> Dict[str, List[str]]:
+    open_keys: Dict[str, List[str]] = {}
+    for file_path, key in cur.execute(
+        f"SELECT DISTINCT file_path, {key_column} FROM {table} WHERE closed = 0 ORDER BY 1, 2"
+    ):
+        open_keys.setdefault(file_path, []).append(key)
+    return open_keys
+
+
+def test_open_intervals_are_looked_up_in_the_index(
+    history: List[GitCommitData], project_db: str
+) -> None:
+    statements: List[str] = []
+    with AnalyticsDbWriter(project_db, 2) as writer:
+        writer.con.set_trace_callback(statements.append)
+        for commit_data in history:
+            write_git_commit(writer, commit_data)
+            writer.con.set_trace_callback(None)
+            # the index is up to date with the open rows of the tables
+            for index in (writer._open_file_imports, writer._open_functions):  # pylint: disable=protected-access
+                open_keys = _get_open_keys(writer.cur, index.table, index.key_column)
+                for file_path in ("src/a.cpp", "src/b.cpp"):
+                    assert sorted(index.get_keys(file_path)) == open_keys.get(file_path, [])
+            writer.con.set_trace_callback(statements.append)
+
+    # the open rows are only read once per index, when it is loaded
+    read_interval_tables = [
+        re.findall(r"FROM (file_import|function_to_file)\b", statement)
+        for statement in statements
+        if statement.startswith("SELECT")
+    ]
+    assert [tables for tables in read_interval_tables if tables] == [["file_import"], ["function_to_file"]]
+
+
+def _get_processed_commit_hashes(path_to_project_db: str) -> List[str]:
+    con = sqlite3.connect(path_to_project_db)
+    try:
+        return sorted(row[0] for row in con.execute("SELECT commit_hash FROM processed_commit"))
+    finally:
+        con.close()
+
+
+def test_failed_commit_is_rolled_back(
+    history: List[GitCommitData], project_db: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path_to_full_db = str(tmp_path / "full.db")
+    create_commit_based_tables(path_to_full_db)
+    write_commits(path_to_full_db, history)
+
+    def fail(*_args: object) -> None:
+        raise RuntimeError("mining failed")
+
+    with pytest.raises(RuntimeError):
+        with AnalyticsDbWriter(project_db, 100) as writer:
+            write_git_commit(writer, history[0])
+            # the commit fails after its git_commit, file_commit and interval rows are written
+            monkeypatch.setattr(writer, "insert_function_commit", fail)
+            write_git_commit(writer, history[1])
+
+    # the finished commit is kept, a run that writes the others equals a single run
+    assert _get_processed_commit_hashes(project_db) == [history[0].hash]
+    write_commits(project_db, history[1:])
+    assert read_tables(project_db) == read_tables(path_to_full_db)
+
+
+def test_commits_are_committed_every_commit_interval(
+    history: List[GitCommitData], project_db: str
+) -> None:
+    nr_committed_commits = []
+    with AnalyticsDbWriter(project_db, 3) as writer:
+        for commit_data in history:
+            write_git_commit(writer, commit_data)
+            # read through another connection, which only sees committed rows
+            nr_committed_commits.append(len(_get_processed_commit_hashes(project_db)))
+
+    assert nr_committed_commits == [0, 0, 3, 3]
+    assert len(_get_processed_commit_hashes(project_db)) == 4
+
+
+def _get_change_counts(path_to_project_db: str) -> Dict[str, List[Tuple[object, ...]]]:
+    """
+    The rollups counted with a group by over file_commit.
+    """
+    con = sqlite3.connect(path_to_project_db)
+    try:
+        return {
+            table: sorted(
+                con.execute(
+                    f"""SELECT {", ".join(key_columns)},
+                    COUNT(*), SUM(change_type = '{ModificationType.DELETE}')
+                    FROM file_commit
+                    GROUP BY {", ".join(key_columns)}"""
+                ).fetchall(),
+                key=repr,
+            )
+            for table, key_columns in _CHANGE_ROLLUPS.items()
+        }
+    finally:
+        con.close()
+
+
+def _get_query_plan(con: sqlite3.Connection, query: str) -> str:
+    return "\n".join(row[-1] for row in con.execute(f"EXPLAIN QUERY PLAN {query}"))
+
+
+@pytest.mark.parametrize(
+    "index, query",
+    [
+        (
+            "file_import_open",
+            "SELECT rowid FROM file_import WHERE file_path = 'src/a.cpp' AND import_file_path = 'x.h' AND closed = 0",
+        ),
+        (
+            "function_to_file_open",
+            """SELECT rowid FROM function_to_file
+            WHERE file_path = 'src/a.cpp' AND function_long_name = 'ns::f(int)' AND closed = 0""",
+        ),
+        (
+            "raw_function_call_open",
+            """SELECT rowid FROM raw_function_call
+            WHERE file_path = 'src/a.cpp' AND calling_function_unqualified_name = 'f'
+            AND calling_function_nr_parameters = 1 AND called_function_unqualified_name = 'g'
+            AND closed = 0""",
+        ),
+        ("file_import_file_name", "SELECT import_file_pkg FROM file_import WHERE file_name = 'a.cpp'"),
+    ],
+)
+def test_lookups_use_the_indexes(
+    history: List[GitCommitData], project_db: str, index: str, query: str
+) -> None:
+    write_commits(project_db, history)
+    create_analytics_indexes(project_db)
+
+    con = sqlite3.connect(project_db)
+    try:
+        assert f"INDEX {index} " in _get_query_plan(con, query)
+    finally:
+        con.close()
+
+
+def test_analytics_indexes_are_created_with_their_statistics(
+    history: List[GitCommitData], project_db: str
+) -> None:
+    write_commits(project_db, history)
+
+    create_analytics_indexes(project_db)
+
+    con = sqlite3.connect(project_db)
+    try:
+        indexes = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert set(_ANALYTICS_INDEXES) | set(_OPEN_INTERVAL_INDEXES) <= indexes
+        assert set(_ANALYTICS_INDEXES) <= {row[0] for row in con.execute("SELECT idx FROM sqlite_stat1")}
+    finally:
+        con.close()
+
+
+def test_writer_and_analytics_connections_use_their_pragma_profiles(
+    history: List[GitCommitData], project_db: str
+) -> None:
+    with AnalyticsDbWriter(project_db, 2) as writer:
+        write_git_commit(writer, history[0])
+        assert writer.cur.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert writer.cur.execute("PRAGMA synchronous").fetchone() == (1,)
+    con = sqlite3.connect(project_db)
+    try:
+        # the closed writer leaves a single db file
+        assert con.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    finally:
+        con.close()
+
+    con = connect_analytics_db(project_db)
+    try:
+        assert con.execute("SELECT COUNT(*) FROM git_commit").fetchone() == (1,)
+        assert con.execute("PRAGMA query_only").fetchone() == (1,)
+        with pytest.raises(sqlite3.OperationalError):
+            con.execute("DELETE FROM git_commit")
+    finally:
+        con.close()
+
+
+def test_calendar_columns_are_the_utc_date_of_the_commit(project_db: str) -> None:
+    write_file_commits(project_db, 40)
+
+    con = sqlite3.connect(project_db)
+    rows = con.execute(
+        """SELECT commit_commiter_datetime, commit_year, commit_month, commit_iso_year, commit_iso_week
+        FROM file_commit"""
+    ).fetchall()
+    con.close()
+
+    for commit_datetime, *calendar in rows:
+        utc_date = datetime.fromisoformat(commit_datetime).astimezone(timezone.utc).date()
+        iso_year, iso_week, _ = utc_date.isocalendar()
+        assert calendar == [utc_date.year, utc_date.month, iso_year, iso_week]
+
+
+def test_rollups_equal_the_group_by_over_file_commit(project_db: str) -> None:
+    write_file_commits(project_db, 40)
+
+    assert read_tables(project_db, tuple(_CHANGE_ROLLUPS)) == _get_change_counts(project_db)
+    # every change is counted once
+    con = sqlite3.connect(project_db)
+    nr_changes = [
+        con.execute(f"SELECT SUM(nr_changes) FROM {table}").fetchone()[0] for table in _CHANGE_ROLLUPS
+    ]
+    # the days of the turn of the year are in the last iso week of 2020
+    weeks = set(con.execute("SELECT commit_iso_year, commit_iso_week FROM file_change_week").fetchall())
+    con.close()
+    assert nr_changes == [sum(1 + nr % len(FILE_PATHS) for nr in range(40))] * len(_CHANGE_ROLLUPS)
+    assert (2020, 53) in weeks
+    assert not {(2021, 53), (2020, 1)} & weeks
+
+
+def test_week_rollups_of_an_older_version_are_counted_again_by_iso_year(project_db: str) -> None:
+    write_file_commits(project_db, 40)
+    con = sqlite3.connect(project_db)
+    with con:
+        for table in ("file_change_week", "dir_change_week"):
+            key_column = _CHANGE_ROLLUPS[table][0]
+            con.execute(f"DROP TABLE {table}")
+            con.execute(
+                f"""CREATE TABLE {table} ({key_column} text, commit_year integer, commit_iso_week integer,
+                nr_changes integer, nr_deletions integer)"""
+            )
+    con.close()
+
+    with AnalyticsDbWriter(project_db, 1):
+        pass
+
+    assert read_tables(project_db, tuple(_CHANGE_ROLLUPS)) == _get_change_counts(project_db)
+
+
+@pytest.mark.parametrize("nr_newer_commits", [1, 2, 3])
+def test_merged_shards_equal_a_single_run(
+    history: List[GitCommitData], project_db: str, tmp_path: Path, nr_newer_commits: int
+) -> None:
+    path_to_full_db = str(tmp_path / "full.db")
+    create_commit_based_tables(path_to_full_db)
+    write_commits(path_to_full_db, history)
+    # the shards are mined in any order and merged newest first
+    shards = (history[:nr_newer_commits], history[nr_newer_commits:])
+    for nr, commits in reversed(list(enumerate(shards))):
+        with CommitDataDb(str(tmp_path / f"shard_{nr}.db")) as shard:
+            for commit_data in commits:
+                shard.put(commit_data)
+
+    def read_shards() -> Iterator[GitCommitData]:
+        for nr in range(len(shards)):
+            with CommitDataDb(str(tmp_path / f"shard_{nr}.db")) as shard:
+                yield from shard.get_commits()
+
+    with AnalyticsDbWriter(project_db, 2) as writer, CommitDataDb(
+        get_commit_data_db_path(project_db)
+    ) as commit_data_db:
+        write_git_commits(
+            writer, commit_data_db, [commit_data.hash for commit_data in history], read_shards()
+        )
+
+    tables = (*WRITTEN_TABLES, *_CHANGE_ROLLUPS)
+    assert read_tables(project_db, tables) == read_tables(path_to_full_db, tables)